@@ -1,5 +1,13 @@
-from  githubapi import  get_repo_tree, create_branch, get_file_content, commit_test_changes, print_tree_structure, print_repository_structure
-from model import model, generate_code, ResponseFormatter
+from  githubapi import  get_repo_tree, print_tree_structure, get_repository_blobs_async, get_head_commit
+from commitstage import CommitStage
+from incremental import plan_incremental_run, save_processed_commit, get_test_file_name
+from model import model, ResponseFormatter
+from planner import GenerationBudget, prioritize_files, get_recent_churn
+from context import ContextBuilder
+from retrieval import RetrievalIndex
+from treerender import render_tree
+from depgraph import load_dependency_graph
+from generation import generate_all, PartialTestWriter, STREAM_RESPONSES
 import os
 from dotenv import load_dotenv
 load_dotenv('.env')
@@ -7,48 +15,81 @@ load_dotenv('.env')
 async def main():
     # Initialize llm
     llm = await model()
+    
+    # The deadline covers the whole run, fetching included
+    budget = GenerationBudget()
      
     # Example usage
     # repo_url = "https://github.com/Hanif-adedotun/semra-website"
     repo_url = ""
     repo_name = repo_url.split('/')[-1]
     
+    # Pin the run to the current head commit
+    head_sha = get_head_commit(repo_url)
+    
     # Get and print the tree structure
     print("\nRepository Tree Structure:")
-    tree_data = get_repo_tree(repo_url)
+    tree_data = get_repo_tree(repo_url, ref=head_sha)
     print_tree_structure(tree_data)
     
     # folder = "src/app"
     folder = ""
     
+    # Only files added or modified since the last processed commit get new tests
+    changed_paths, removed_files = plan_incremental_run(repo_url, head_sha, tree_data, folder)
+    
+    # Every file is fetched for the prompt context, unchanged ones come from the blob cache
     # print("\nRepository Structure with Content:")
-    full_context, all_files = [], []
-    full_context,all_files = print_repository_structure(repo_url, full_context,all_files, folder)
+    full_context, all_files, file_contents = [], [], {}
+    full_context,all_files = await get_repository_blobs_async(repo_url, tree_data, full_context,all_files, folder, file_contents)
     print("\nAll files Acquired:")
     print(all_files)
     
-    # Join all content with newlines
-    full_context_str = "\n".join(full_context)
+    # Which fetched files import which, cached per tree
+    graph = load_dependency_graph(tree_data['sha'], file_contents)
     
-    for path in all_files:
-        user_prompt = "Generate a test function for this file"
-        
-        file_content = get_file_content(repo_url, f"{path}")
-        
-        file_ext = path.split(".")[-1]
+    # Each prompt gets the code chunks most relevant to its target, within the token budget
+    context_builder = ContextBuilder(file_contents, render_tree(tree_data), graph=graph, index=RetrievalIndex())
     
-        generated_code = await generate_code(llm, str(tree_data), full_context_str, file_content, user_prompt)
-        
-        response = generated_code.tool_calls[0]["args"]
+    test_files_folder = f'server/hiro-tests/{repo_name}'
+    metadata_file_path = os.path.join(test_files_folder, 'metadata.md')
+    generated_files = []
+    
+    # Push finished tests in batches while generation continues
+    committer = CommitStage(repo_url, extra_files=[metadata_file_path])
+    await committer.start()
+    
+    # Drop the tests of files deleted since the last run
+    for path in removed_files:
+        test_file_name = get_test_file_name(path)
+        test_file_path = os.path.join(test_files_folder, test_file_name)
+        if os.path.exists(test_file_path):
+            os.remove(test_file_path)
+        committer.delete(test_file_name)
+    
+    # Most valuable files first, within the run's time and token budget
+    churn = get_recent_churn(repo_url, head_sha)
+    
+    user_prompt = "Generate a test function for this file"
+    failed_files = []
+    
+    # Test files fill up while their responses stream in, an interrupted run keeps what was generated
+    partial_writer = PartialTestWriter(test_files_folder, on_update=lambda path, code: print(f"Streaming tests for {path}: {len(code)} characters")) if STREAM_RESPONSES else None
+    
+    # Requests run concurrently, each finished test is written as soon as it arrives
+    target_files = [path for path in prioritize_files(file_contents, tree_data, churn, graph) if path in changed_paths]
+    async for path, response, error in generate_all(llm, target_files, context_builder, user_prompt, budget, on_partial=partial_writer):
+        if error:
+            print(f"Failed to generate tests for {path}: {error}")
+            failed_files.append(path)
+            continue
         
         #  print("Generated Code:", response['code'])
         print("\nMetadata:", response['metadata'])
         print("\nRequired Packages:", response['packages'])
         
-        test_files_folder = f'server/hiro-tests/{repo_name}'
-        
         # Create test file with appropriate extension
-        test_file_name = f"test_{path.split('/')[-1].split('.')[0]}.test.{file_ext}"
+        test_file_name = get_test_file_name(path)
         test_file_path = os.path.join(test_files_folder, test_file_name)
         
         # Create tests directory if it doesn't exist
@@ -57,10 +98,12 @@ async def main():
         # Write generated test code to file
         with open(test_file_path, 'w') as f:
             f.write(response['code'])
+        if partial_writer:
+            partial_writer.finish(path)
+        generated_files.append(test_file_path)
         print(f"Test file created at: {test_file_path}")
             
         # Write metadata to markdown file
-        metadata_file_path = os.path.join(test_files_folder, 'metadata.md')
         mode = 'a' if os.path.exists(metadata_file_path) else 'w'
         with open(metadata_file_path, mode) as f:
             f.write(response['metadata'])
@@ -68,15 +111,23 @@ async def main():
             for package in response['packages']:
                 f.write(f"- {package}\n")
             print(f"Metadata file added at: {metadata_file_path}")
+        
+        # Queue the finished test for the next batch commit
+        committer.add(test_file_path)
             
-    create_branch(repo_url, "hiro-tests")
-     
-     # Loop through all files in the test folder and commit each one
-    for filename in os.listdir(test_files_folder):
-         file_path = os.path.join(test_files_folder, filename)
-         if os.path.isfile(file_path):
-                 commit_test_changes(repo_url, f"generated test cases for {filename}", file_path)
-     
+    # Commit whatever is still queued
+    commit_results = await committer.close()
+    
+    report = budget.report()
+    print(f"\nGenerated tests for {len(report['processed'])} files using {report['tokens_used']} tokens in {report['elapsed_seconds']}s, {len(failed_files)} failed")
+    for entry in report['skipped']:
+        print(f"Skipped {entry['path']}: {entry['reason']}")
+    for entry in llm.stats():
+        print(f"{entry['name']}: {entry['requests']} requests, {entry['errors']} errors, {entry['hedges_won']} hedges won, {entry['hedges_lost']} lost, p50 {entry['p50_seconds']}s, p95 {entry['p95_seconds']}s")
+    
+    # Skipped and failed files must be picked up again by the next run
+    if not report['skipped'] and not failed_files and not any(result.startswith("Failed") for result in commit_results):
+        save_processed_commit(repo_url, head_sha, folder)
     print(f"Done! Commited changes to github")
              
 if __name__ == "__main__":
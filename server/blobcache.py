@@ -0,0 +1,99 @@
+import os
+import hashlib
+from pathlib import Path
+
+from diskstore import DiskStore
+
+# Where cached blobs are stored and how large the cache may grow before the
+# least recently used blobs are evicted
+BLOB_CACHE_DIR = os.getenv('HIRO_BLOB_CACHE_DIR', os.path.join(Path.home(), '.cache', 'hiro', 'blobs'))
+BLOB_CACHE_MAX_BYTES = int(os.getenv('HIRO_BLOB_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+def git_blob_sha(data: bytes):
+    """
+    Compute the git blob SHA of some content.
+
+    Args:
+        data (bytes): The raw blob content
+
+    Returns:
+        str: The hex SHA-1 git uses to address the blob
+    """
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+class BlobCache:
+    """
+    On-disk cache of file contents keyed by git blob SHA.
+
+    A blob SHA identifies the content itself, so an entry never goes stale and
+    unchanged files can be reused across runs and repositories without any
+    network call. Entries are verified against their SHA on read, storage and
+    eviction are left to a diskstore.DiskStore.
+    """
+
+    def __init__(self, directory: str = BLOB_CACHE_DIR, max_bytes: int = BLOB_CACHE_MAX_BYTES):
+        """
+        Args:
+            directory (str): Directory the blobs are stored in
+            max_bytes (int): Size the cache is trimmed back to after a write
+        """
+        self.store = DiskStore(directory, max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sha: str):
+        """
+        Get a cached blob.
+
+        Args:
+            sha (str): The git blob SHA
+
+        Returns:
+            str: The blob content, or None if it is not cached
+        """
+        data = self.store.read(sha)
+        if data is None:
+            self.misses += 1
+            return None
+
+        if git_blob_sha(data) != sha:
+            # Corrupt or partially written entry
+            self.store.discard(sha)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return data.decode('utf-8')
+
+    def put(self, sha: str, content: str):
+        """
+        Store a blob in the cache.
+
+        Args:
+            sha (str): The git blob SHA
+            content (str): The blob content
+        """
+        data = content.encode('utf-8')
+        if git_blob_sha(data) != sha:
+            # Content was altered on the way (e.g. line endings), it can't be addressed by this SHA
+            return
+
+        if self.store.exists(sha):
+            return
+
+        try:
+            self.store.write(sha, data)
+        except OSError as e:
+            print(f"Could not cache blob {sha}: {str(e)}")
+
+    def stats(self):
+        """
+        Get the cache hit/miss counters.
+
+        Returns:
+            dict: Hits, misses and the cache location
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'directory': str(self.store.directory)}
+
+# Cache shared by every fetch in the process
+blob_cache = BlobCache()
@@ -0,0 +1,184 @@
+import fnmatch
+from typing import Optional
+
+# Extensions of files that are never worth testing: assets, docs, config, lockfiles, binaries
+SKIP_SUFFIXES = {
+    '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.pdf', '.avif', '.webp', '.bmp', '.tiff',
+    '.mp3', '.mp4', '.wav', '.webm', '.mov', '.ttf', '.otf', '.woff', '.woff2', '.eot',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.tar', '.jar', '.war', '.whl', '.egg',
+    '.exe', '.dll', '.so', '.dylib', '.a', '.o', '.class', '.pyc', '.pyo', '.wasm', '.bin',
+    '.lock', '.lockb', '.sum', '.map', '.snap', '.log', '.csv', '.tsv', '.parquet', '.db', '.sqlite',
+    '.md', '.mdx', '.rst', '.txt', '.yml', '.yaml', '.toml', '.ini', '.cfg', '.env', '.gitignore',
+    '.gitattributes', '.dockerignore', '.editorconfig', '.prettierrc', '.eslintignore', '.npmrc',
+    '.ipynb', '.pbxproj', '.xcworkspacedata', '.plist', '.iml',
+}
+
+# Compound suffixes of minified, bundled or generated code
+SKIP_COMPOUND_SUFFIXES = {
+    '.min.js', '.min.css', '.min.mjs', '.bundle.js', '.chunk.js', '.pb.go', '.pb.cc', '.pb.h',
+    '.g.dart', '.freezed.dart', '.designer.cs', '.generated.ts', '.generated.js', '.d.ts',
+}
+
+# Exact file names that are lockfiles, manifests or tooling config
+SKIP_NAMES = {
+    'Dockerfile', 'Makefile', 'LICENSE', 'LICENCE', 'NOTICE', 'CODEOWNERS', 'Procfile',
+    'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml', 'bun.lockb',
+    'poetry.lock', 'Pipfile.lock', 'composer.lock', 'Gemfile.lock', 'Cargo.lock', 'go.sum',
+    'mix.lock', 'pubspec.lock', 'Podfile.lock', 'flake.lock', '.DS_Store',
+    'package.json', 'tsconfig.json', 'jsconfig.json', 'components.json', 'vercel.json',
+}
+
+# Directories holding vendored, built or generated code
+VENDOR_DIRS = {
+    'node_modules', 'bower_components', 'jspm_packages', 'vendor', 'third_party', 'third-party',
+    'external', 'dist', 'build', 'out', 'target', '.next', '.nuxt', '.svelte-kit', '.turbo',
+    '.cache', 'coverage', '__pycache__', '.venv', 'venv', 'site-packages', '.tox', '.git',
+    '.idea', '.vscode', '.gradle', 'Pods', 'DerivedData', '__generated__', 'generated',
+}
+
+# Suffixes of generated python code
+SKIP_NAME_ENDINGS = ('_pb2.py', '_pb2_grpc.py', '_pb2.pyi')
+
+def parse_gitattributes(text: str):
+    """
+    Parse the linguist-vendored / linguist-generated markers of a .gitattributes file.
+
+    Args:
+        text (str): Content of the .gitattributes file
+
+    Returns:
+        list: (pattern, excluded) pairs in file order, later lines take precedence
+    """
+    rules = []
+    for line in text.splitlines():
+        parts = line.split()
+        if not parts or parts[0].startswith('#'):
+            continue
+
+        pattern = parts[0]
+        for attribute in parts[1:]:
+            name, _, value = attribute.partition('=')
+            unset = name.startswith('-') or name.startswith('!') or value == 'false'
+            name = name.lstrip('-!')
+            if name in ('linguist-vendored', 'linguist-generated'):
+                rules.append((pattern, not unset))
+    return rules
+
+def gitattributes_match(pattern: str, path: str):
+    """Match a .gitattributes pattern against a repository path."""
+    pattern = pattern.lstrip('/')
+    if pattern.endswith('/'):
+        pattern += '**'
+
+    # Patterns without a slash match the file name at any depth
+    if '/' not in pattern:
+        return fnmatch.fnmatchcase(path.rsplit('/', 1)[-1], pattern)
+
+    if fnmatch.fnmatchcase(path, pattern):
+        return True
+    # "dir/**" also matches the directory itself and "**/x" matches at the root
+    if pattern.endswith('/**') and path.startswith(pattern[:-3] + '/'):
+        return True
+    return pattern.startswith('**/') and fnmatch.fnmatchcase(path, pattern[3:])
+
+class FileClassifier:
+    """
+    Decides from a path and size alone whether a file is source code worth fetching.
+
+    Combines O(1) suffix and exact-name lookups, well-known vendor directories,
+    size thresholds and the linguist-vendored / linguist-generated markers of
+    the repository's .gitattributes, so non-source files are dropped from the
+    tree listing before any content request or LLM token is spent on them.
+    """
+
+    def __init__(self, gitattributes: str = '', min_bytes: int = 1, max_bytes: Optional[int] = None):
+        """
+        Args:
+            gitattributes (str): Content of the repository's .gitattributes, if any
+            min_bytes (int): Files smaller than this are skipped (empty files have nothing to test)
+            max_bytes (int): Files larger than this are skipped, None for no limit
+        """
+        self.rules = parse_gitattributes(gitattributes)
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+
+    def is_vendored_dir(self, path: str):
+        """
+        Check whether a directory, or any directory above it, holds vendored or built code.
+
+        Args:
+            path (str): Directory path within the repository
+
+        Returns:
+            bool: True if nothing under the directory should be fetched
+        """
+        path = path.strip('/')
+        if any(part in VENDOR_DIRS for part in path.split('/')):
+            return True
+        # A directory is excluded when a rule covers everything inside it
+        return bool(self.rules) and self.gitattributes_excluded(f"{path}/_")
+
+    def gitattributes_excluded(self, path: str):
+        excluded = False
+        for pattern, value in self.rules:
+            if gitattributes_match(pattern, path):
+                excluded = value
+        return excluded
+
+    def skip_reason(self, path: str, size: Optional[int] = None):
+        """
+        Get why a file should not be fetched.
+
+        Args:
+            path (str): File path within the repository
+            size (int): File size in bytes, if known
+
+        Returns:
+            str: The reason the file is skipped, or None if it is source code worth fetching
+        """
+        parts = path.split('/')
+        name = parts[-1]
+
+        if name in SKIP_NAMES:
+            return 'non-source name'
+
+        lower_name = name.lower()
+        pieces = lower_name.split('.')
+        if len(pieces) > 1 and '.' + pieces[-1] in SKIP_SUFFIXES:
+            return 'non-source extension'
+        if len(pieces) > 2 and '.' + '.'.join(pieces[-2:]) in SKIP_COMPOUND_SUFFIXES:
+            return 'minified or generated'
+        if len(pieces) == 2 and not pieces[0]:
+            return 'dotfile'
+        if lower_name.endswith(SKIP_NAME_ENDINGS):
+            return 'generated'
+
+        if any(part in VENDOR_DIRS for part in parts[:-1]):
+            return 'vendored directory'
+
+        if size is not None:
+            if size < self.min_bytes:
+                return 'empty'
+            if self.max_bytes and size > self.max_bytes:
+                return 'too large'
+
+        if self.rules and self.gitattributes_excluded(path):
+            return 'vendored or generated in .gitattributes'
+
+        return None
+
+    def is_source(self, path: str, size: Optional[int] = None):
+        """
+        Check whether a file is source code worth fetching.
+
+        Args:
+            path (str): File path within the repository
+            size (int): File size in bytes, if known
+
+        Returns:
+            bool: True if the file should be fetched
+        """
+        return self.skip_reason(path, size) is None
+
+# Classifier used when a repository's .gitattributes is not known
+default_classifier = FileClassifier()
@@ -0,0 +1,145 @@
+import os
+import time
+import asyncio
+from typing import List
+
+from githubapi import create_branch, commit_test_files
+
+# A batch of finished tests is pushed once it reaches this many files,
+# or once the oldest unpushed test has waited this many seconds
+COMMIT_BATCH_SIZE = 10
+COMMIT_FLUSH_SECONDS = 60
+
+class CommitStage:
+    """
+    Pushes generated tests to the branch in batches while generation continues.
+
+    Tests are queued as soon as they are written and committed in the
+    background with commit_test_files whenever a size or time threshold is
+    reached, so upload time overlaps LLM time and finished work is already
+    upstream if the run dies.
+    """
+
+    def __init__(self, github_url: str, branch: str = "hiro-tests", batch_size: int = COMMIT_BATCH_SIZE, flush_seconds: float = COMMIT_FLUSH_SECONDS, extra_files: List[str] = None):
+        """
+        Args:
+            github_url (str): The GitHub repository URL
+            branch (str): Branch the tests are committed to
+            batch_size (int): Number of queued files that triggers a commit
+            flush_seconds (float): Maximum time a queued file waits before it is committed
+            extra_files (List[str]): Files re-committed with every batch when they exist, e.g. metadata.md
+        """
+        self.github_url = github_url
+        self.branch = branch
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.extra_files = extra_files or []
+        self.pending = []
+        self.pending_deletes = []
+        self.oldest_pending = None
+        self.results = []
+        self.committed_files = 0
+        self.wakeup = asyncio.Event()
+        self.closing = False
+        self.task = None
+
+    async def start(self):
+        """
+        Create the branch and start the background commit loop.
+        """
+        print(await asyncio.to_thread(create_branch, self.github_url, self.branch))
+        self.task = asyncio.create_task(self.run())
+
+    def add(self, file_path: str):
+        """
+        Queue a finished test file for the next commit.
+
+        Args:
+            file_path (str): Local path of the test file
+        """
+        if file_path not in self.pending:
+            self.pending.append(file_path)
+        self.mark_pending()
+
+    def delete(self, filename: str):
+        """
+        Queue the removal of a test file from the hiro-tests folder.
+
+        Args:
+            filename (str): Name of the test file
+        """
+        self.pending_deletes.append(filename)
+        self.mark_pending()
+
+    def mark_pending(self):
+        # The first queued change arms the loop's flush timer, a full batch flushes right away
+        if self.oldest_pending is None:
+            self.oldest_pending = time.monotonic()
+            self.wakeup.set()
+        if len(self.pending) + len(self.pending_deletes) >= self.batch_size:
+            self.wakeup.set()
+
+    def flush_due(self):
+        """Whether the queued changes should be committed now."""
+        if not self.pending and not self.pending_deletes:
+            return False
+        if self.closing or len(self.pending) + len(self.pending_deletes) >= self.batch_size:
+            return True
+        return time.monotonic() - self.oldest_pending >= self.flush_seconds
+
+    async def run(self):
+        while True:
+            timeout = None
+            if self.oldest_pending is not None:
+                timeout = max(self.oldest_pending + self.flush_seconds - time.monotonic(), 0)
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+            if self.flush_due():
+                await self.flush()
+
+            if self.closing and not self.pending and not self.pending_deletes:
+                return
+
+    async def flush(self):
+        """
+        Commit everything queued so far in a single commit.
+        """
+        files, deletes = self.pending, self.pending_deletes
+        self.pending, self.pending_deletes, self.oldest_pending = [], [], None
+
+        commit_files = files + [path for path in self.extra_files if os.path.exists(path) and path not in files]
+        try:
+            result = await asyncio.to_thread(commit_test_files, self.github_url, f"generated test cases for {len(files)} files", commit_files, deletes, self.branch)
+        except Exception as e:
+            result = f"Failed to commit changes: {str(e)}"
+
+        self.results.append(result)
+        print(result)
+
+        if result.startswith("Failed"):
+            # Keep the batch for the next flush, unless we are shutting down
+            if not self.closing:
+                self.pending = files + self.pending
+                self.pending_deletes = deletes + self.pending_deletes
+                self.mark_pending()
+            return
+
+        self.committed_files += len(files)
+
+    async def close(self):
+        """
+        Commit whatever is still queued and stop the commit loop.
+
+        Returns:
+            List[str]: The result message of every commit made
+        """
+        self.closing = True
+        self.wakeup.set()
+        if self.task:
+            await self.task
+        return self.results
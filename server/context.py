@@ -0,0 +1,300 @@
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Any
+
+from depgraph import DependencyGraph
+from retrieval import RetrievalIndex, RETRIEVAL_TOP_K
+
+# Token budgets of the prompt parts assembled around the file under test
+CONTEXT_TOKEN_BUDGET = int(os.getenv('HIRO_CONTEXT_TOKENS', 6000))
+TREE_TOKEN_BUDGET = int(os.getenv('HIRO_TREE_TOKENS', 1000))
+
+# Encoding used to count tokens. Llama 3 uses a tiktoken BPE of the same
+# family, so counts are close to what the provider bills
+TOKENIZER_ENCODING = os.getenv('HIRO_TOKENIZER', 'cl100k_base')
+
+# Files shorter than this many tokens are not worth including as a fragment
+MIN_FRAGMENT_TOKENS = 200
+
+TRUNCATED_NOTE = "\n...[truncated]"
+
+@lru_cache(maxsize=1)
+def get_tokenizer():
+    """
+    Get the tokenizer used to count prompt tokens.
+
+    Returns:
+        The tiktoken encoding, or None if tiktoken or its encoding file is not available
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        print(f"Tokenizer unavailable, estimating token counts: {str(e)}")
+        return None
+
+def count_tokens(text: str):
+    """
+    Count the tokens of a text.
+
+    Args:
+        text (str): The text
+
+    Returns:
+        int: Number of tokens (estimated at 4 characters per token without a tokenizer)
+    """
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return (len(text) + 3) // 4
+    return len(tokenizer.encode(text, disallowed_special=()))
+
+def fit_tokens(text: str, max_tokens: int):
+    """
+    Cut a text down to a number of tokens.
+
+    Args:
+        text (str): The text
+        max_tokens (int): Maximum number of tokens to keep, the truncation note included
+
+    Returns:
+        str: The text, with a truncation note if it was cut
+    """
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        if len(text) <= max_tokens * 4:
+            return text
+        keep = max_tokens - count_tokens(TRUNCATED_NOTE)
+        return text[:keep * 4] + TRUNCATED_NOTE if keep > 0 else ''
+
+    tokens = tokenizer.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    keep = max_tokens - count_tokens(TRUNCATED_NOTE)
+    return tokenizer.decode(tokens[:keep]) + TRUNCATED_NOTE if keep > 0 else ''
+
+def file_stem(path: str):
+    return path.rsplit('/', 1)[-1].split('.')[0]
+
+def relevance(target_path: str, target_content: str, path: str, content: str):
+    """
+    Score how relevant a file is as context for the file under test. Higher is better.
+
+    Args:
+        target_path (str): Path of the file under test
+        target_content (str): Content of the file under test
+        path (str): Path of the candidate file
+        content (str): Content of the candidate file
+
+    Returns:
+        float: The score
+    """
+    score = 0.0
+
+    # Files next to each other usually work together
+    target_dirs, dirs = target_path.split('/')[:-1], path.split('/')[:-1]
+    if target_dirs == dirs:
+        score += 3
+    for a, b in zip(target_dirs, dirs):
+        if a != b:
+            break
+        score += 1
+
+    # The file under test names the candidate, e.g. in an import
+    stem = file_stem(path)
+    if len(stem) > 2 and stem != 'index' and re.search(rf"\b{re.escape(stem)}\b", target_content):
+        score += 5
+
+    # The candidate names the file under test, e.g. it is a caller
+    target_stem = file_stem(target_path)
+    if len(target_stem) > 2 and target_stem != 'index' and re.search(rf"\b{re.escape(target_stem)}\b", content):
+        score += 2
+
+    return score
+
+class ContextBuilder:
+    """
+    Assembles the prompt context for each file under test within a token budget.
+
+    With a retrieval index the context is made of the function and class
+    chunks that best match the target file. Without one, the repository files
+    most relevant to the target are added whole, best first, until the budget
+    runs out; the last one that doesn't fit is included as a truncated
+    fragment if enough budget is left. Every build reports how many tokens
+    went to the tree, the target and each piece of context.
+    """
+
+    def __init__(self, file_contents: Dict[str, str], file_tree: str, context_budget: int = CONTEXT_TOKEN_BUDGET, tree_budget: int = TREE_TOKEN_BUDGET, graph: DependencyGraph = None, index: RetrievalIndex = None, top_k: int = RETRIEVAL_TOP_K):
+        """
+        Args:
+            file_contents (Dict[str, str]): Path -> content of the repository files
+            file_tree (str): Repository file structure
+            context_budget (int): Tokens for the repository context of each prompt
+            tree_budget (int): Tokens for the file tree
+            graph (DependencyGraph): Optional import graph, the target's direct dependencies come first
+            index (RetrievalIndex): Optional chunk index, files not indexed yet are added on each build
+            top_k (int): Number of chunks retrieved from the index
+        """
+        self.file_contents = file_contents
+        self.graph = graph
+        self.index = index
+        self.top_k = top_k
+        self.context_budget = context_budget
+        self.tree = fit_tokens(file_tree, tree_budget)
+        self.tree_tokens = count_tokens(self.tree)
+        self.token_counts = {}
+
+    def file_tokens(self, path: str):
+        if path not in self.token_counts:
+            self.token_counts[path] = count_tokens(self.format_file(path, self.file_contents[path]))
+        return self.token_counts[path]
+
+    def format_file(self, path: str, content: str):
+        return f"\n=== File: {path} ===\n{content}"
+
+    def rank(self, target_path: str):
+        """
+        Order the other repository files by relevance to the file under test.
+
+        Args:
+            target_path (str): Path of the file under test
+
+        Returns:
+            List[str]: Paths of the other files, most relevant first
+        """
+        target_content = self.file_contents.get(target_path, '')
+        scores = {
+            path: relevance(target_path, target_content, path, content)
+            for path, content in self.file_contents.items() if path != target_path
+        }
+
+        # What the file imports is needed to understand it, its importers show how it is used
+        if self.graph:
+            for path in self.graph.dependencies(target_path):
+                if path in scores:
+                    scores[path] += 10
+            for path in self.graph.dependents(target_path):
+                if path in scores:
+                    scores[path] += 4
+
+        # Among equally relevant files prefer small ones, more of them fit
+        return sorted(scores, key=lambda path: (-scores[path], len(self.file_contents[path])))
+
+    def retrieve(self, target_paths: List[str]):
+        """
+        Fill the budget with the indexed chunks that best match the files under test.
+
+        Args:
+            target_paths (List[str]): Paths of the files under test
+
+        Returns:
+            tuple: The context parts, the report entries and the tokens left
+        """
+        self.index.sync(self.file_contents)
+
+        boost = {}
+        if self.graph:
+            for target_path in target_paths:
+                boost.update((path, 1.3) for path in self.graph.dependents(target_path))
+            for target_path in target_paths:
+                boost.update((path, 2.0) for path in self.graph.dependencies(target_path))
+
+        query = '\n'.join(self.file_contents.get(path, '') for path in target_paths)
+
+        parts = []
+        included = []
+        remaining = self.context_budget
+        for chunk in self.index.search(query, self.top_k, target_paths, boost):
+            text = f"\n=== File: {chunk['path']} ({chunk['name']}, line {chunk['start']}) ===\n{chunk['text']}"
+            tokens = count_tokens(text)
+            # Chunks vary in size, a smaller one further down may still fit
+            if tokens > remaining:
+                continue
+            parts.append(text)
+            included.append({'path': chunk['path'], 'line': chunk['start'], 'tokens': tokens})
+            remaining -= tokens
+
+        return parts, included, remaining
+
+    def build(self, target_path: str):
+        """
+        Assemble the context for a file under test.
+
+        Args:
+            target_path (str): Path of the file under test
+
+        Returns:
+            tuple: The file tree, the repository context and a report of the token usage
+        """
+        return self.build_batch([target_path])
+
+    def build_batch(self, target_paths: List[str]):
+        """
+        Assemble one shared context for several files under test.
+
+        Args:
+            target_paths (List[str]): Paths of the files under test
+
+        Returns:
+            tuple: The file tree, the repository context and a report of the token usage
+        """
+        if self.index is not None:
+            parts, included, remaining = self.retrieve(target_paths)
+            return self.tree, ''.join(parts), self.report(target_paths, included, remaining)
+
+        parts = []
+        included = []
+        remaining = self.context_budget
+
+        # Without an index, rank by the first file, the others are usually related to it
+        for path in self.rank(target_paths[0]):
+            if path in target_paths:
+                continue
+            tokens = self.file_tokens(path)
+            if tokens <= remaining:
+                parts.append(self.format_file(path, self.file_contents[path]))
+                included.append({'path': path, 'tokens': tokens})
+                remaining -= tokens
+                continue
+
+            # Fill what is left with the start of the next best file, then stop
+            if remaining >= MIN_FRAGMENT_TOKENS:
+                fragment = fit_tokens(self.format_file(path, self.file_contents[path]), remaining)
+                tokens = count_tokens(fragment)
+                parts.append(fragment)
+                included.append({'path': path, 'tokens': tokens, 'truncated': True})
+                remaining -= tokens
+            break
+
+        return self.tree, ''.join(parts), self.report(target_paths, included, remaining)
+
+    def report(self, target_paths: List[str], included: list, remaining: int):
+        return {
+            'budget': self.context_budget,
+            'tree': self.tree_tokens,
+            'target': sum(count_tokens(self.file_contents.get(path, '')) for path in target_paths),
+            'context': self.context_budget - remaining,
+            'files': included,
+            'left_out': len(self.file_contents) - len(target_paths) - len({entry['path'] for entry in included}),
+        }
+
+def format_report(path: str, report: Dict[str, Any]):
+    """
+    Summarize a context report in one line.
+
+    Args:
+        path (str): Path of the file under test
+        report (Dict[str, Any]): Report returned by ContextBuilder.build
+
+    Returns:
+        str: The summary
+    """
+    files = ', '.join(
+        f"{entry['path']}{':' + str(entry['line']) if 'line' in entry else ''} ({entry['tokens']}{', truncated' if entry.get('truncated') else ''})"
+        for entry in report['files']
+    )
+    return (
+        f"Context for {path}: {report['context']}/{report['budget']} tokens in {len(report['files'])} parts, "
+        f"tree {report['tree']}, target {report['target']}, {report['left_out']} files left out"
+        + (f"\n  {files}" if files else '')
+    )
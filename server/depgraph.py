@@ -0,0 +1,301 @@
+import os
+import re
+import ast
+import json
+import hashlib
+import posixpath
+from pathlib import Path
+from typing import Dict, List, Iterable
+
+# Where dependency graphs are cached, one file per repository snapshot
+GRAPH_CACHE_DIR = os.getenv('HIRO_GRAPH_CACHE_DIR', os.path.join(Path.home(), '.cache', 'hiro', 'graphs'))
+
+PYTHON_EXTENSIONS = ('.py', '.pyi')
+JS_EXTENSIONS = ('.ts', '.tsx', '.js', '.jsx', '.mjs', '.cjs', '.vue', '.svelte')
+
+JS_IMPORT_PATTERN = re.compile(
+    r"""(?:\bimport\s+(?:[\w*{}\s,]+\s+from\s+)?|\bexport\s+[\w*{}\s,]+\s+from\s+|\brequire\s*\(\s*|\bimport\s*\(\s*)['"]([^'"]+)['"]"""
+)
+PYTHON_IMPORT_PATTERN = re.compile(r'^\s*(?:from\s+(\.*[\w.]*)\s+import\s+([\w*,\s()]+)|import\s+([\w.,\s]+))', re.MULTILINE)
+GO_IMPORT_BLOCK_PATTERN = re.compile(r'^import\s*\(([^)]*)\)', re.MULTILINE)
+GO_IMPORT_PATTERN = re.compile(r'^import\s+(?:[\w.]+\s+)?"([^"]+)"', re.MULTILINE)
+GO_MODULE_PATTERN = re.compile(r'^module\s+(\S+)', re.MULTILINE)
+# Kotlin uses the same statements without the semicolon
+JAVA_IMPORT_PATTERN = re.compile(r'^\s*import\s+(static\s+)?([\w.]+(?:\.\*)?)\s*;?\s*$', re.MULTILINE)
+JAVA_PACKAGE_PATTERN = re.compile(r'^\s*package\s+([\w.]+)\s*;?\s*$', re.MULTILINE)
+
+def python_imports(content: str):
+    """
+    Get the modules a Python file imports.
+
+    Args:
+        content (str): Content of the file
+
+    Returns:
+        List[tuple]: (module, names, level) for every import, level being the number of leading dots
+    """
+    found = []
+    try:
+        for node in ast.walk(ast.parse(content)):
+            if isinstance(node, ast.Import):
+                found.extend((alias.name, [], 0) for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                found.append((node.module or '', [alias.name for alias in node.names], node.level))
+        return found
+    except (SyntaxError, ValueError):
+        pass
+
+    # Files that don't parse, e.g. Python 2 or templated sources
+    for match in PYTHON_IMPORT_PATTERN.finditer(content):
+        if match.group(3):
+            found.extend((name.strip().split()[0], [], 0) for name in match.group(3).split(',') if name.strip())
+        else:
+            module = match.group(1)
+            names = [name.strip().split()[0] for name in match.group(2).strip('()').split(',') if name.strip()]
+            found.append((module.lstrip('.'), names, len(module) - len(module.lstrip('.'))))
+    return found
+
+def go_imports(content: str):
+    """Get the import paths of a Go file."""
+    found = GO_IMPORT_PATTERN.findall(content)
+    for block in GO_IMPORT_BLOCK_PATTERN.findall(content):
+        found.extend(re.findall(r'"([^"]+)"', block))
+    return found
+
+class DependencyGraph:
+    """
+    Which repository files import which, for one repository snapshot.
+
+    Only imports that resolve to files of the snapshot are kept, so third
+    party packages and the standard library never show up. Built once from
+    the file contents and cached by tree SHA.
+    """
+
+    def __init__(self, imports: Dict[str, List[str]] = None):
+        """
+        Args:
+            imports (Dict[str, List[str]]): Path -> paths of the repository files it imports
+        """
+        self.imports = imports or {}
+        self.importers = {}
+        for path, dependencies in self.imports.items():
+            for dependency in dependencies:
+                self.importers.setdefault(dependency, []).append(path)
+
+    def dependencies(self, path: str):
+        """Paths of the files a file imports."""
+        return self.imports.get(path, [])
+
+    def dependents(self, path: str):
+        """Paths of the files that import a file."""
+        return self.importers.get(path, [])
+
+    def neighbours(self, path: str):
+        """Paths of the files directly connected to a file, dependencies first."""
+        return list(dict.fromkeys(self.dependencies(path) + self.dependents(path)))
+
+    def to_dict(self):
+        return {'imports': self.imports}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Dict[str, List[str]]]):
+        return cls(data.get('imports', {}))
+
+class ImportResolver:
+    """
+    Maps import specifiers of Python, JS/TS, Go and Java files to repository paths.
+    """
+
+    def __init__(self, paths: Iterable[str], file_contents: Dict[str, str]):
+        """
+        Args:
+            paths (Iterable[str]): Paths of the repository files
+            file_contents (Dict[str, str]): Path -> content, used for go.mod and Java packages
+        """
+        self.paths = set(paths)
+
+        # Dotted module name suffixes -> Python files, so "pkg.mod" finds src/pkg/mod.py
+        self.python_modules = {}
+        for path in self.paths:
+            if not path.endswith(PYTHON_EXTENSIONS):
+                continue
+            parts = path.rsplit('.', 1)[0].split('/')
+            if parts[-1] == '__init__':
+                parts = parts[:-1]
+            for start in range(len(parts)):
+                self.python_modules.setdefault('.'.join(parts[start:]), []).append(path)
+
+        # Directories -> source files, for Go packages and Java wildcard imports
+        self.directories = {}
+        for path in self.paths:
+            self.directories.setdefault(posixpath.dirname(path), []).append(path)
+
+        # Go module paths declared in go.mod files -> the directory they live in
+        self.go_modules = {}
+        for path, content in file_contents.items():
+            if posixpath.basename(path) == 'go.mod':
+                match = GO_MODULE_PATTERN.search(content)
+                if match:
+                    self.go_modules[match.group(1)] = posixpath.dirname(path)
+
+        # Fully qualified Java classes -> files, from the package declarations
+        self.java_classes = {}
+        for path, content in file_contents.items():
+            if path.endswith(('.java', '.kt')):
+                match = JAVA_PACKAGE_PATTERN.search(content)
+                name = posixpath.basename(path).rsplit('.', 1)[0]
+                self.java_classes[f"{match.group(1)}.{name}" if match else name] = path
+
+    def closest(self, importer: str, candidates: List[str]):
+        """Pick the candidate sharing the longest directory prefix with the importing file."""
+        if len(candidates) == 1:
+            return candidates[0]
+        return max(candidates, key=lambda path: (len(posixpath.commonprefix([importer, path])), -len(path)))
+
+    def resolve_python(self, importer: str, module: str, names: List[str], level: int):
+        if level:
+            # Relative import, walk up from the importing file's package
+            base = posixpath.dirname(importer).split('/') if posixpath.dirname(importer) else []
+            base = base[:len(base) - (level - 1)] if level > 1 else base
+            prefix = '/'.join(base + (module.split('.') if module else []))
+            targets = []
+            for candidate in [f"{prefix}/{name}" for name in names] + [prefix]:
+                candidate = candidate.strip('/')
+                for suffix in ('.py', '.pyi', '/__init__.py'):
+                    if candidate + suffix in self.paths:
+                        targets.append(candidate + suffix)
+                        break
+            return targets
+
+        # "from pkg import mod" may name a submodule rather than an attribute
+        targets = []
+        for name in names:
+            candidates = self.python_modules.get(f"{module}.{name}" if module else name)
+            if candidates:
+                targets.append(self.closest(importer, candidates))
+        candidates = self.python_modules.get(module)
+        if candidates and not targets:
+            targets.append(self.closest(importer, candidates))
+        return targets
+
+    def resolve_js(self, importer: str, specifier: str):
+        if specifier.startswith('.'):
+            bases = [posixpath.normpath(posixpath.join(posixpath.dirname(importer), specifier))]
+        elif specifier.startswith(('@/', '~/')):
+            # The usual tsconfig aliases for the source root
+            bases = [f"src/{specifier[2:]}", specifier[2:]]
+        elif specifier.startswith('/'):
+            bases = [specifier.lstrip('/')]
+        else:
+            # Package imports
+            return []
+
+        for base in bases:
+            for candidate in [base] + [base + ext for ext in JS_EXTENSIONS] + [f"{base}/index{ext}" for ext in JS_EXTENSIONS]:
+                if candidate in self.paths:
+                    return [candidate]
+        return []
+
+    def resolve_go(self, importer: str, import_path: str):
+        directory = None
+        for module, module_dir in self.go_modules.items():
+            if import_path == module or import_path.startswith(module + '/'):
+                directory = posixpath.join(module_dir, import_path[len(module):].lstrip('/')).strip('/')
+                break
+
+        if directory is None:
+            return []
+        return [path for path in self.directories.get(directory, []) if path.endswith('.go') and not path.endswith('_test.go') and path != importer]
+
+    def resolve_java(self, importer: str, name: str, static: bool):
+        if name.endswith('.*'):
+            package = name[:-2]
+            if static and package in self.java_classes:
+                return [self.java_classes[package]]
+            return [path for qualified, path in self.java_classes.items() if qualified.rsplit('.', 1)[0] == package and path != importer]
+
+        if name in self.java_classes:
+            return [self.java_classes[name]]
+        # Static imports name a member of the class
+        if static and name.rsplit('.', 1)[0] in self.java_classes:
+            return [self.java_classes[name.rsplit('.', 1)[0]]]
+        return []
+
+    def resolve(self, path: str, content: str):
+        """
+        Get the repository files a file imports.
+
+        Args:
+            path (str): Path of the file
+            content (str): Content of the file
+
+        Returns:
+            List[str]: Paths of the imported repository files
+        """
+        targets = []
+        if path.endswith(PYTHON_EXTENSIONS):
+            for module, names, level in python_imports(content):
+                targets.extend(self.resolve_python(path, module, names, level))
+        elif path.endswith(JS_EXTENSIONS):
+            for specifier in JS_IMPORT_PATTERN.findall(content):
+                targets.extend(self.resolve_js(path, specifier))
+        elif path.endswith('.go'):
+            for import_path in go_imports(content):
+                targets.extend(self.resolve_go(path, import_path))
+        elif path.endswith(('.java', '.kt')):
+            for static, name in JAVA_IMPORT_PATTERN.findall(content):
+                targets.extend(self.resolve_java(path, name, bool(static)))
+
+        return [target for target in dict.fromkeys(targets) if target != path]
+
+def build_dependency_graph(file_contents: Dict[str, str]):
+    """
+    Build the import graph of a set of repository files.
+
+    Args:
+        file_contents (Dict[str, str]): Path -> content of the repository files
+
+    Returns:
+        DependencyGraph: The graph
+    """
+    resolver = ImportResolver(file_contents.keys(), file_contents)
+    return DependencyGraph({path: resolver.resolve(path, content) for path, content in file_contents.items()})
+
+def graph_cache_path(tree_sha: str, paths: Iterable[str], cache_dir: str = GRAPH_CACHE_DIR):
+    # The same snapshot can be indexed for different subsets of files, e.g. a folder or only changed files
+    paths_digest = hashlib.sha1('\n'.join(sorted(paths)).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{tree_sha}-{paths_digest}.json")
+
+def load_dependency_graph(tree_sha: str, file_contents: Dict[str, str], cache_dir: str = GRAPH_CACHE_DIR):
+    """
+    Get the import graph of a repository snapshot, building and caching it on first use.
+
+    Args:
+        tree_sha (str): SHA of the repository tree the files come from
+        file_contents (Dict[str, str]): Path -> content of the repository files
+        cache_dir (str): Directory the graphs are cached in
+
+    Returns:
+        DependencyGraph: The graph
+    """
+    cache_path = graph_cache_path(tree_sha, file_contents.keys(), cache_dir)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return DependencyGraph.from_dict(json.load(f))
+    except (OSError, ValueError):
+        pass
+
+    graph = build_dependency_graph(file_contents)
+    edges = sum(len(dependencies) for dependencies in graph.imports.values())
+    print(f"Indexed {edges} imports between {len(file_contents)} files")
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(graph.to_dict(), f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Could not cache dependency graph: {str(e)}")
+
+    return graph
@@ -0,0 +1,116 @@
+import os
+import threading
+from pathlib import Path
+
+class DiskStore:
+    """
+    Directory of files keyed by hex strings, with least recently used eviction.
+
+    Entries are written through a temporary file and os.replace, so a crash
+    never leaves a half-written file under its key. Reads mark an entry as
+    recently used, and once the store grows past max_bytes the oldest entries
+    are removed. The caches built on it (blobcache.BlobCache,
+    gencache.GenerationCache) decide what is stored and when an entry is valid.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, suffix: str = ''):
+        """
+        Args:
+            directory (str): Directory the entries are stored in
+            max_bytes (int): Size the store is trimmed back to after a write
+            suffix (str): File name suffix of every entry, e.g. ".json"
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.lock = threading.Lock()
+        self.total_bytes = None
+
+    def path_for(self, key: str):
+        return self.directory / key[:2] / f"{key}{self.suffix}"
+
+    def exists(self, key: str):
+        return self.path_for(key).exists()
+
+    def read(self, key: str):
+        """
+        Read an entry and mark it as recently used.
+
+        Args:
+            key (str): The entry's key
+
+        Returns:
+            bytes: The entry's data, or None if there is no such entry
+        """
+        path = self.path_for(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return data
+
+    def write(self, key: str, data: bytes):
+        """
+        Store an entry, replacing any previous one, and evict old entries if the store got too large.
+
+        Args:
+            key (str): The entry's key
+            data (bytes): The data to store
+
+        Raises:
+            OSError: If the entry could not be written
+        """
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{key}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            if self.total_bytes is not None:
+                self.total_bytes += len(data)
+        self.evict()
+
+    def discard(self, key: str):
+        try:
+            self.path_for(key).unlink()
+        except OSError:
+            pass
+        with self.lock:
+            self.total_bytes = None
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the store fits in max_bytes.
+        """
+        with self.lock:
+            if self.total_bytes is not None and self.total_bytes <= self.max_bytes:
+                return
+
+            entries = []
+            for path in self.directory.glob(f"*/*{self.suffix}"):
+                if path.suffix == '.tmp':
+                    continue
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                    total -= size
+                except OSError:
+                    pass
+
+            self.total_bytes = total
@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+from typing import Dict, Any, List
+
+from diskstore import DiskStore
+
+# Where generated responses are stored, how long they stay valid and how
+# large the cache may grow before the least recently used ones are evicted
+GENERATION_CACHE_DIR = os.getenv('HIRO_GENERATION_CACHE_DIR', os.path.join(Path.home(), '.cache', 'hiro', 'generations'))
+GENERATION_CACHE_TTL = float(os.getenv('HIRO_GENERATION_CACHE_TTL', 7 * 24 * 3600))
+GENERATION_CACHE_MAX_BYTES = int(os.getenv('HIRO_GENERATION_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Set HIRO_GENERATION_CACHE=0 to always call the model
+GENERATION_CACHE_ENABLED = os.getenv('HIRO_GENERATION_CACHE', '1') != '0'
+
+def generation_key(model_name: str, temperature: float, messages: List[Dict[str, str]]):
+    """
+    Compute the cache key of a generation request.
+
+    The model name is that of the primary model. Answers of the other
+    providers behind model.model()'s router share the key, because any of them
+    answers the same prompt equally well.
+
+    Args:
+        model_name (str): Name of the model
+        temperature (float): Sampling temperature
+        messages (List[Dict[str, str]]): The prompt messages: system prompt, tree and context, file content and request
+
+    Returns:
+        str: Hex SHA-256 of the request
+    """
+    request = json.dumps({'model': model_name, 'temperature': temperature, 'messages': messages}, sort_keys=True)
+    return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+class GenerationCache:
+    """
+    On-disk cache of parsed model responses keyed by a hash of the whole request.
+
+    An unchanged file with unchanged context produces the same key, so repeat
+    runs and restarts after a crash reuse the earlier answer instead of paying
+    for the same LLM call again. Entries expire after ttl seconds, storage and
+    eviction are left to a diskstore.DiskStore.
+    """
+
+    def __init__(self, directory: str = GENERATION_CACHE_DIR, ttl: float = GENERATION_CACHE_TTL, max_bytes: int = GENERATION_CACHE_MAX_BYTES):
+        """
+        Args:
+            directory (str): Directory the responses are stored in
+            ttl (float): Seconds an entry stays valid, 0 for no expiry
+            max_bytes (int): Size the cache is trimmed back to after a write
+        """
+        self.store = DiskStore(directory, max_bytes, suffix='.json')
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        """
+        Get a cached response.
+
+        Args:
+            key (str): The request key from generation_key
+
+        Returns:
+            Dict[str, Any]: The ResponseFormatter arguments, or None if not cached or expired
+        """
+        try:
+            entry = json.loads(self.store.read(key) or b'')
+        except ValueError:
+            self.misses += 1
+            return None
+
+        if self.ttl and time.time() - entry.get('created', 0) > self.ttl:
+            self.store.discard(key)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry['response']
+
+    def put(self, key: str, response: Dict[str, Any]):
+        """
+        Store a response in the cache.
+
+        Args:
+            key (str): The request key from generation_key
+            response (Dict[str, Any]): The ResponseFormatter arguments
+        """
+        data = json.dumps({'created': time.time(), 'response': response}).encode('utf-8')
+        try:
+            self.store.write(key, data)
+        except OSError as e:
+            print(f"Could not cache response {key[:12]}: {str(e)}")
+
+    def stats(self):
+        """
+        Get the cache hit/miss counters.
+
+        Returns:
+            dict: Hits, misses and the cache location
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'directory': str(self.store.directory)}
+
+# Cache shared by every generation in the process
+generation_cache = GenerationCache()
@@ -0,0 +1,404 @@
+import os
+import time
+import asyncio
+from typing import Dict, List, Any, Callable
+
+from model import generate_code, generate_batch, stream_code, partial_code, complete_args, response_calls, build_messages, build_batch_messages, MODEL_NAME, MODEL_TEMPERATURE
+from gencache import generation_cache, generation_key, GENERATION_CACHE_ENABLED
+from planner import GenerationBudget, get_token_usage
+from context import ContextBuilder, format_report, count_tokens
+from units import split_units, unit_code_context, unit_prompt, merge_unit_results, UNIT_SPLIT_TOKENS
+from incremental import get_test_file_name
+
+# Number of LLM requests in flight at once, and how long a single request may take
+GENERATION_CONCURRENCY = int(os.getenv('HIRO_GENERATION_CONCURRENCY', 4))
+GENERATION_TIMEOUT = float(os.getenv('HIRO_GENERATION_TIMEOUT', 120))
+
+# Files under BATCH_FILE_TOKENS are packed into shared requests of up to
+# BATCH_TOKEN_BUDGET tokens of code and BATCH_MAX_FILES files, 0 disables batching
+BATCH_FILE_TOKENS = int(os.getenv('HIRO_BATCH_FILE_TOKENS', 800))
+BATCH_TOKEN_BUDGET = int(os.getenv('HIRO_BATCH_TOKENS', 3000))
+BATCH_MAX_FILES = int(os.getenv('HIRO_BATCH_MAX_FILES', 6))
+
+# Stream single-file responses into their test files as they are generated,
+# writing each file at most every STREAM_WRITE_INTERVAL seconds
+STREAM_RESPONSES = os.getenv('HIRO_STREAM_RESPONSES', '1') != '0'
+STREAM_WRITE_INTERVAL = float(os.getenv('HIRO_STREAM_WRITE_INTERVAL', 0.5))
+
+def plan_batches(paths: List[str], file_contents: Dict[str, str], file_tokens: int = BATCH_FILE_TOKENS, batch_tokens: int = BATCH_TOKEN_BUDGET, max_files: int = BATCH_MAX_FILES):
+    """
+    Group small files into batches, keeping the priority order.
+
+    A batch takes the position of its first file, so consecutive related files
+    from the planner end up in the same request.
+
+    Args:
+        paths (List[str]): Paths of the files, in priority order
+        file_contents (Dict[str, str]): Path -> content of the files
+        file_tokens (int): Files with more tokens than this are always sent alone
+        batch_tokens (int): Maximum tokens of code in one batch, 0 disables batching
+        max_files (int): Maximum number of files in one batch
+
+    Returns:
+        List[List[str]]: The batches, single-file ones included
+    """
+    batches = []
+    current = None
+    current_tokens = 0
+
+    for path in paths:
+        tokens = count_tokens(file_contents[path])
+        if not batch_tokens or max_files < 2 or tokens > file_tokens:
+            batches.append([path])
+            continue
+
+        if current is None or current_tokens + tokens > batch_tokens or len(current) >= max_files:
+            current = []
+            current_tokens = 0
+            batches.append(current)
+        current.append(path)
+        current_tokens += tokens
+
+    return batches
+
+class PartialTestWriter:
+    """
+    Writes the code of streamed responses to their test files as it arrives.
+
+    Writes are throttled per file, and the code received so far stays on disk
+    when the run is cancelled or a request times out. The finished response
+    overwrites the partial file as usual.
+    """
+
+    def __init__(self, folder: str, interval: float = STREAM_WRITE_INTERVAL, on_update: Callable[[str, str], None] = None):
+        """
+        Args:
+            folder (str): Folder the test files are written to
+            interval (float): Minimum seconds between two writes of the same file
+            on_update (Callable[[str, str], None]): Optional callback with the path and code after each write, e.g. to update a UI
+        """
+        self.folder = folder
+        self.interval = interval
+        self.on_update = on_update
+        self.last_write = {}
+
+    def test_file_path(self, path: str):
+        return os.path.join(self.folder, get_test_file_name(path))
+
+    def __call__(self, path: str, code: str):
+        now = time.monotonic()
+        if now - self.last_write.get(path, 0) < self.interval:
+            return
+        self.last_write[path] = now
+
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(self.test_file_path(path), 'w') as f:
+                f.write(code)
+        except OSError as e:
+            print(f"Could not write partial tests for {path}: {str(e)}")
+            return
+
+        if self.on_update:
+            self.on_update(path, code)
+
+    def finish(self, path: str):
+        """Forget a file once its response is complete."""
+        self.last_write.pop(path, None)
+
+async def receive_stream(llm, file_tree: str, full_context: str, code_context: str, user_prompt: str, on_partial: Callable[[str], None]):
+    """
+    Stream a generation, passing the code written so far to on_partial each time it grows.
+
+    Returns:
+        AIMessageChunk: The complete response
+    """
+    message = None
+    received = 0
+    try:
+        async for message in stream_code(llm, file_tree, full_context, code_context, user_prompt):
+            code = partial_code(message)
+            if len(code) > received:
+                received = len(code)
+                on_partial(code)
+    except Exception as e:
+        if message is None:
+            raise
+        # A stream that broke midway can't be resumed, ask again without streaming so the router can fail over
+        print(f"Stream broke after {received} characters, retrying without streaming: {str(e) or type(e).__name__}")
+        return await generate_code(llm, file_tree, full_context, code_context, user_prompt)
+
+    if not response_calls(message):
+        # The stream stopped early, e.g. at the token limit, and left incomplete tool call arguments
+        print(f"Stream ended after {received} characters without complete tests, retrying without streaming")
+        return await generate_code(llm, file_tree, full_context, code_context, user_prompt)
+    return message
+
+async def generate_one(llm, path: str, context_builder: ContextBuilder, user_prompt: str, timeout: float = GENERATION_TIMEOUT, use_cache: bool = GENERATION_CACHE_ENABLED, on_partial: Callable[[str, str], None] = None):
+    """
+    Generate tests for a single file.
+
+    Args:
+        llm: The language model instance
+        path (str): Path of the file within the repository
+        context_builder (ContextBuilder): Assembles the tree and repository context for the file
+        user_prompt (str): The code generation request
+        timeout (float): Seconds the request may take, 0 for no limit
+        use_cache (bool): Reuse and store responses in the generation cache
+        on_partial (Callable[[str, str], None]): Optional callback with the path and the code so far, streams the response when given
+
+    Returns:
+        tuple: The raw model response (None when served from the cache) and the ResponseFormatter arguments
+    """
+    file_tree, full_context, report = context_builder.build(path)
+    print(format_report(path, report))
+
+    stream = (lambda code: on_partial(path, code)) if on_partial else None
+    return await request_tests(llm, path, file_tree, full_context, context_builder.file_contents[path], user_prompt, timeout, use_cache, stream)
+
+async def request_tests(llm, label: str, file_tree: str, full_context: str, code_context: str, user_prompt: str, timeout: float = GENERATION_TIMEOUT, use_cache: bool = GENERATION_CACHE_ENABLED, on_partial: Callable[[str], None] = None):
+    """
+    Send one generation request, going through the generation cache.
+
+    Args:
+        llm: The language model instance
+        label (str): What the request is for, used in log messages
+        file_tree (str): Repository file structure
+        full_context (str): Repository context
+        code_context (str): The code to test
+        user_prompt (str): The code generation request
+        timeout (float): Seconds the request may take, 0 for no limit
+        use_cache (bool): Reuse and store responses in the generation cache
+        on_partial (Callable[[str], None]): Optional callback with the code so far, streams the response when given
+
+    Returns:
+        tuple: The raw model response (None when served from the cache) and the ResponseFormatter arguments
+    """
+    if use_cache:
+        # The key is provider-agnostic, an answer from a failover or hedge provider is reused like one from the primary model
+        key = generation_key(MODEL_NAME, MODEL_TEMPERATURE, build_messages(file_tree, full_context, code_context, user_prompt))
+        # Entries left by an older run may hold incomplete arguments, those are generated again
+        cached = generation_cache.get(key)
+        cached = complete_args(cached) if cached is not None else None
+        if cached is not None:
+            print(f"Reusing cached tests for {label}")
+            return None, cached
+
+    if on_partial:
+        request = receive_stream(llm, file_tree, full_context, code_context, user_prompt, on_partial)
+    else:
+        request = generate_code(llm, file_tree, full_context, code_context, user_prompt)
+    generated_code = await asyncio.wait_for(request, timeout or None)
+
+    # Incomplete arguments are never returned or cached, every consumer reads all the fields
+    calls = response_calls(generated_code)
+    if not calls:
+        raise ValueError("model returned no complete test code")
+
+    response = calls[0]
+    if use_cache:
+        generation_cache.put(key, response)
+    return generated_code, response
+
+async def generate_units(llm, path: str, header: str, units: List[Dict[str, Any]], context_builder: ContextBuilder, user_prompt: str, slots: asyncio.Semaphore, timeout: float = GENERATION_TIMEOUT, use_cache: bool = GENERATION_CACHE_ENABLED):
+    """
+    Generate tests for a large file unit by unit and merge them into one test file.
+
+    The units' requests run in parallel, each taking a slot of the shared
+    request limit. Units that fail are left out of the merged file as long as
+    at least one unit succeeded.
+
+    Args:
+        llm: The language model instance
+        path (str): Path of the file within the repository
+        header (str): Imports and constants of the file, sent with every unit
+        units (List[Dict[str, Any]]): The units from units.split_units
+        context_builder (ContextBuilder): Assembles the tree and repository context for the file
+        user_prompt (str): The code generation request
+        slots (asyncio.Semaphore): Limits the number of requests in flight
+        timeout (float): Seconds each request may take, 0 for no limit
+        use_cache (bool): Reuse and store responses in the generation cache
+
+    Returns:
+        tuple: The tokens used (None if the provider didn't report them) and the merged ResponseFormatter arguments
+    """
+    file_tree, full_context, report = context_builder.build(path)
+    print(format_report(path, report))
+    print(f"Testing {path} in {len(units)} units")
+
+    async def run_unit(unit):
+        async with slots:
+            return await request_tests(llm, f"{path} ({', '.join(unit['names'])})", file_tree, full_context, unit_code_context(path, header, unit), unit_prompt(user_prompt, unit), timeout, use_cache)
+
+    outcomes = await asyncio.gather(*(run_unit(unit) for unit in units), return_exceptions=True)
+
+    responses = []
+    tokens = 0
+    for unit, outcome in zip(units, outcomes):
+        if isinstance(outcome, BaseException):
+            print(f"Failed to generate tests for {', '.join(unit['names'])} in {path}: {str(outcome) or type(outcome).__name__}")
+            continue
+        generated_code, response = outcome
+        responses.append(response)
+        if generated_code is not None:
+            usage = get_token_usage(generated_code)
+            tokens = None if usage is None or tokens is None else tokens + usage
+
+    if not responses:
+        raise next(outcome for outcome in outcomes if isinstance(outcome, BaseException))
+
+    return tokens, merge_unit_results(path, responses)
+
+async def generate_many(llm, paths: List[str], context_builder: ContextBuilder, user_prompt: str, timeout: float = GENERATION_TIMEOUT, use_cache: bool = GENERATION_CACHE_ENABLED):
+    """
+    Generate tests for several small files in one request.
+
+    Args:
+        llm: The language model instance
+        paths (List[str]): Paths of the files within the repository
+        context_builder (ContextBuilder): Assembles the shared tree and repository context
+        user_prompt (str): The code generation request
+        timeout (float): Seconds the request may take, 0 for no limit
+        use_cache (bool): Reuse and store responses in the generation cache
+
+    Returns:
+        tuple: The raw model response (None when served from the cache) and a dict of path -> ResponseFormatter arguments
+    """
+    file_tree, full_context, report = context_builder.build_batch(paths)
+    print(format_report(', '.join(paths), report))
+    files = {path: context_builder.file_contents[path] for path in paths}
+
+    if use_cache:
+        # Provider-agnostic key, see request_tests
+        key = generation_key(MODEL_NAME, MODEL_TEMPERATURE, build_batch_messages(file_tree, full_context, files, user_prompt))
+        cached = generation_cache.get(key)
+        cached = {path: complete_args(cached.get(path, {})) for path in paths} if cached is not None else None
+        if cached is not None and None not in cached.values():
+            print(f"Reusing cached tests for {', '.join(paths)}")
+            return None, cached
+
+    request = generate_batch(llm, file_tree, full_context, files, user_prompt)
+    generated_code, results = await asyncio.wait_for(request, timeout or None)
+
+    # Only complete batches are cached, a partial one would skip the fallback next time
+    if use_cache and len(results) == len(paths):
+        generation_cache.put(key, results)
+    return generated_code, results
+
+async def generate_all(llm, paths: List[str], context_builder: ContextBuilder, user_prompt: str, budget: GenerationBudget = None, concurrency: int = GENERATION_CONCURRENCY, timeout: float = GENERATION_TIMEOUT, use_cache: bool = GENERATION_CACHE_ENABLED, batch_tokens: int = BATCH_TOKEN_BUDGET, unit_split_tokens: int = UNIT_SPLIT_TOKENS, on_partial: Callable[[str, str], None] = None):
+    """
+    Generate tests for many files with a bounded number of concurrent requests.
+
+    Files are started in the given order, so a prioritized list keeps its
+    priority, and results are yielded as soon as each request finishes.
+    Small files are batched into shared requests (see plan_batches) and a file
+    missing from its batch's answer is retried on its own. Large files are
+    split into units tested in parallel and merged (see generate_units).
+    A failing or timed out request is yielded with its error and never stops
+    the others. With on_partial, files sent on their own are streamed and
+    on_partial gets their code as it is generated; batched and unit requests
+    are only reported once complete.
+
+    Args:
+        llm: The language model instance
+        paths (List[str]): Paths of the files to generate tests for, in priority order
+        context_builder (ContextBuilder): Holds the file contents and assembles each prompt's context
+        user_prompt (str): The code generation request
+        budget (GenerationBudget): Optional time and token budget checked before each request
+        concurrency (int): Maximum number of requests in flight
+        timeout (float): Seconds a single request may take, 0 for no limit
+        use_cache (bool): Reuse and store responses in the generation cache
+        batch_tokens (int): Maximum tokens of code in one batched request, 0 to send every file alone
+        unit_split_tokens (int): Files with more tokens than this are tested unit by unit
+        on_partial (Callable[[str, str], None]): Optional callback with a file's path and code so far, e.g. a PartialTestWriter
+
+    Yields:
+        tuple: (path, ResponseFormatter arguments, None) on success or (path, None, error message) on failure
+    """
+    pending = asyncio.Queue()
+    for batch in plan_batches(paths, context_builder.file_contents, batch_tokens=batch_tokens):
+        pending.put_nowait(batch)
+
+    results = asyncio.Queue()
+    done = object()
+
+    # Every request takes a slot, so units of a large file share the limit with other files
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run_one(path: str):
+        file_content = context_builder.file_contents[path]
+        header, units = split_units(path, file_content) if count_tokens(file_content) > unit_split_tokens else ('', [])
+        started_at = time.monotonic()
+        try:
+            if len(units) > 1:
+                tokens, response = await generate_units(llm, path, header, units, context_builder, user_prompt, slots, timeout, use_cache)
+            else:
+                async with slots:
+                    generated_code, response = await generate_one(llm, path, context_builder, user_prompt, timeout, use_cache, on_partial)
+                # Cached responses cost nothing
+                tokens = get_token_usage(generated_code) if generated_code is not None else 0
+        except asyncio.TimeoutError:
+            if budget:
+                budget.release(path)
+            await results.put((path, None, f"timed out after {timeout}s"))
+            return
+        except Exception as e:
+            if budget:
+                budget.release(path)
+            await results.put((path, None, str(e)))
+            return
+
+        if budget:
+            budget.record(path, tokens, time.monotonic() - started_at, file_content)
+        await results.put((path, response, None))
+
+    async def run_batch(batch: List[str]):
+        started_at = time.monotonic()
+        try:
+            async with slots:
+                generated_code, responses = await generate_many(llm, batch, context_builder, user_prompt, timeout, use_cache)
+        except Exception as e:
+            print(f"Batch of {len(batch)} files failed, retrying them one by one: {str(e) or type(e).__name__}")
+            generated_code, responses = None, {}
+
+        # The request's tokens are shared by the files that got an answer
+        tokens = None
+        if generated_code is None:
+            tokens = 0
+        elif get_token_usage(generated_code) is not None and responses:
+            tokens = get_token_usage(generated_code) // len(responses)
+
+        for path in batch:
+            if path in responses:
+                if budget:
+                    budget.record(path, tokens, time.monotonic() - started_at, context_builder.file_contents[path])
+                await results.put((path, responses[path], None))
+            else:
+                await run_one(path)
+
+    async def worker():
+        while not pending.empty():
+            batch = pending.get_nowait()
+            if budget:
+                batch = [path for path in batch if budget.can_start(path, context_builder.file_contents[path])]
+
+            if len(batch) == 1:
+                await run_one(batch[0])
+            elif batch:
+                await run_batch(batch)
+
+        await results.put(done)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, pending.qsize())))]
+    try:
+        running = len(workers)
+        while running:
+            result = await results.get()
+            if result is done:
+                running -= 1
+                continue
+            yield result
+    finally:
+        # Stop outstanding requests if the caller stops early
+        for task in workers:
+            task.cancel()
@@ -1,4 +1,7 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from requests.structures import CaseInsensitiveDict
 from typing import Dict, List, Optional, Any
 from urllib.parse import urlparse
 import os
@@ -8,13 +11,414 @@ import re
 import time
 import base64
 import json
+import tarfile
+import threading
+from collections import OrderedDict
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from blobcache import blob_cache
+from classifier import FileClassifier, default_classifier
 
 # Get GitHub token from environment variable
 GITHUB_TOKEN = os.getenv('GITHUB_PERSONAL_ACCESS_TOKEN')
 
-# Add a delay constant
-API_DELAY = 1 
-skip_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.pdf', '.avif', '.lock', '.gitignore', '.env', '.yml', '.yaml', 'Dockerfile', '.md'}
+# Token bucket settings for the rate limiter. GitHub's secondary limits allow
+# roughly 900 REST points per minute, so 15 requests/second is full speed.
+API_RATE = 15
+API_BURST = 15
+
+# Once the remaining quota drops below this, spread it evenly until the reset time
+API_LOW_REMAINING = 100
+
+# Wait used for a secondary rate limit response that carries no Retry-After header
+API_SECONDARY_BACKOFF = 60
+
+# Connection settings for the shared HTTP client: (connect, read) timeout in seconds,
+# retries for transient server errors and the number of pooled keep-alive connections
+API_TIMEOUT = (10, 60)
+API_RETRIES = 3
+API_POOL_SIZE = 20
+
+# Maximum number of requests the async fetchers keep in flight at once
+API_CONCURRENCY = 10
+
+# Files larger than this many bytes are never loaded whole. With the "skip" policy
+# they are left out, with "truncate" only their first FILE_SIZE_LIMIT bytes are read.
+FILE_SIZE_LIMIT = int(os.getenv('HIRO_FILE_SIZE_LIMIT', 512 * 1024))
+LARGE_FILE_POLICY = os.getenv('HIRO_LARGE_FILE_POLICY', 'skip')
+TRUNCATION_MARKER = "\n...\n[File truncated due to size limits]"
+
+# Size of the pieces large blobs are streamed in
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# GraphQL endpoint, override it to point the GraphQL backend at a local stand-in server
+GITHUB_GRAPHQL_URL = os.getenv('GITHUB_GRAPHQL_URL', 'https://api.github.com/graphql')
+
+# Blobs requested per GraphQL query, and the total size of a batch in bytes,
+# kept well under GitHub's node limits and response timeouts
+GRAPHQL_BATCH_SIZE = 50
+GRAPHQL_BATCH_BYTES = 2 * 1024 * 1024
+
+# Number and total size of the GET responses kept for conditional (ETag /
+# Last-Modified) revalidation. Responses over API_CACHE_ENTRY_BYTES, e.g. file
+# payloads of the contents API, and git blobs, which the blob cache already
+# keeps by SHA, are not cached.
+API_CACHE_ENTRIES = 1024
+API_CACHE_BYTES = int(os.getenv('HIRO_API_CACHE_BYTES', 32 * 1024 * 1024))
+API_CACHE_ENTRY_BYTES = int(os.getenv('HIRO_API_CACHE_ENTRY_BYTES', 256 * 1024))
+
+class RateLimiter:
+    """
+    Adaptive rate limiter for the GitHub API.
+    
+    Runs a token bucket at full speed while quota remains, slows down to spread
+    the remaining quota once it runs low, and pauses exactly as long as GitHub
+    asks when a primary or secondary rate limit is hit. Each GitHub rate limit
+    resource (core, graphql, search...) has its own quota, so a limiter only
+    tracks the quota headers of its own resource.
+    """
+    
+    def __init__(self, rate: float = API_RATE, burst: int = API_BURST, low_remaining: int = API_LOW_REMAINING, resource: str = 'core'):
+        """
+        Args:
+            rate (float): Requests per second allowed while quota remains
+            burst (int): Maximum number of requests that can be sent back to back
+            low_remaining (int): Remaining quota below which requests are spread until the reset
+            resource (str): The X-RateLimit-Resource whose quota headers this limiter tracks
+        """
+        self.resource = resource
+        self.rate = rate
+        self.burst = burst
+        self.low_remaining = low_remaining
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.paused_until = 0.0
+        self.backoffs = 0
+        self.lock = threading.Lock()
+    
+    def current_rate(self):
+        """
+        Get the request rate the bucket is currently refilled at.
+        
+        Returns:
+            float: Requests per second
+        """
+        if self.remaining is None or self.reset_at is None or self.remaining > self.low_remaining:
+            return self.rate
+        
+        seconds_left = max(self.reset_at - time.time(), 1)
+        return min(self.rate, max(self.remaining, 1) / seconds_left)
+    
+    def acquire(self):
+        """
+        Block until a request may be sent.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = self.paused_until - now
+                
+                if wait <= 0:
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.current_rate())
+                    self.updated_at = now
+                    
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.current_rate()
+            
+            time.sleep(wait)
+    
+    def update(self, response):
+        """
+        Update the limiter state from the rate limit headers of a response.
+        
+        Args:
+            response (requests.Response): The response returned by GitHub
+            
+        Returns:
+            float: Seconds the caller should wait before retrying, or 0 if the request was not rate limited
+        """
+        headers = response.headers
+        wait = 0.0
+        
+        # Quota headers of another resource, e.g. search, say nothing about this limiter's budget
+        own_quota = headers.get('X-RateLimit-Resource', self.resource) == self.resource
+        
+        with self.lock:
+            if own_quota and 'X-RateLimit-Remaining' in headers:
+                self.remaining = int(headers['X-RateLimit-Remaining'])
+            if own_quota and 'X-RateLimit-Limit' in headers:
+                self.limit = int(headers['X-RateLimit-Limit'])
+            if own_quota and 'X-RateLimit-Reset' in headers:
+                self.reset_at = int(headers['X-RateLimit-Reset'])
+            
+            if response.status_code in (403, 429):
+                if 'Retry-After' in headers:
+                    wait = float(headers['Retry-After'])
+                elif self.remaining == 0 and self.reset_at:
+                    wait = max(self.reset_at - time.time(), 0) + 1
+                elif response.status_code == 429 or 'rate limit' in response.text.lower():
+                    # Secondary limit without a hint, back off exponentially
+                    wait = API_SECONDARY_BACKOFF * (2 ** self.backoffs)
+                
+                if wait:
+                    self.backoffs += 1
+                    self.paused_until = max(self.paused_until, time.monotonic() + wait)
+            else:
+                self.backoffs = 0
+                
+                # Quota exhausted, hold further requests until the window resets
+                if self.remaining == 0 and self.reset_at:
+                    self.paused_until = max(self.paused_until, time.monotonic() + max(self.reset_at - time.time(), 0) + 1)
+        
+        return wait
+    
+    def state(self):
+        """
+        Get a snapshot of the limiter state.
+        
+        Returns:
+            Dict[str, Any]: Quota, reset time, current rate, available tokens and any active pause
+        """
+        with self.lock:
+            return {
+                'limit': self.limit,
+                'remaining': self.remaining,
+                'reset_at': self.reset_at,
+                'rate': self.current_rate(),
+                'tokens': self.tokens,
+                'paused_for': max(self.paused_until - time.monotonic(), 0),
+                'backoffs': self.backoffs,
+            }
+
+class ResponseCache:
+    """
+    Cache of GET responses revalidated with conditional requests.
+    
+    Stores the ETag / Last-Modified of each response and sends them back as
+    If-None-Match / If-Modified-Since. GitHub answers 304 Not Modified when
+    nothing changed, which is served from the cache and does not count
+    against the rate limit.
+    """
+    
+    def __init__(self, max_entries: int = API_CACHE_ENTRIES, max_bytes: int = API_CACHE_BYTES, max_entry_bytes: int = API_CACHE_ENTRY_BYTES):
+        """
+        Args:
+            max_entries (int): Number of responses kept, least recently used ones are dropped first
+            max_bytes (int): Total size of the cached response bodies
+            max_entry_bytes (int): Responses with a larger body are not cached
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.total_bytes = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+    
+    def conditional_headers(self, key):
+        """
+        Get the validator headers to send for a cached request.
+        
+        Args:
+            key (tuple): The cache key of the request
+            
+        Returns:
+            Dict[str, str]: If-None-Match / If-Modified-Since headers, empty if nothing is cached
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+        if not entry:
+            return {}
+        
+        headers = {}
+        if entry['headers'].get('ETag'):
+            headers['If-None-Match'] = entry['headers']['ETag']
+        if entry['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        return headers
+    
+    def resolve(self, key, response):
+        """
+        Record a response, or replace a 304 with the cached response.
+        
+        Args:
+            key (tuple): The cache key of the request
+            response (requests.Response): The response returned by GitHub
+            
+        Returns:
+            requests.Response: The response to hand to the caller
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            
+            if response.status_code == 304 and entry:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                
+                cached = requests.Response()
+                cached.status_code = entry['status_code']
+                cached.headers = CaseInsensitiveDict(entry['headers'])
+                cached._content = entry['content']
+                cached.encoding = entry['encoding']
+                cached.url = response.url
+                cached.request = response.request
+                return cached
+            
+            self.misses += 1
+            
+            # A new response replaces the stale one, or drops it when it isn't kept
+            if response.status_code == 200 and key in self.entries:
+                self.total_bytes -= len(self.entries.pop(key)['content'])
+            
+            if response.status_code == 200 and ('ETag' in response.headers or 'Last-Modified' in response.headers) and self.cacheable(key, response):
+                self.entries[key] = {
+                    'status_code': response.status_code,
+                    'headers': dict(response.headers),
+                    'content': response.content,
+                    'encoding': response.encoding,
+                }
+                self.total_bytes += len(response.content)
+                while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.total_bytes -= len(evicted['content'])
+        
+        return response
+    
+    def cacheable(self, key, response):
+        """Whether a response is worth keeping: not a git blob and not too large."""
+        return '/git/blobs/' not in key[0] and len(response.content) <= self.max_entry_bytes
+    
+    def stats(self):
+        """
+        Get the cache hit/miss counters.
+        
+        Returns:
+            Dict[str, int]: Hits (304 served locally), misses, number of cached responses and their size in bytes
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.total_bytes}
+
+class GitHubClient:
+    """
+    Shared HTTP client for the GitHub API.
+    
+    Keeps a single requests session so every call reuses pooled keep-alive
+    connections, gzip encoding and the auth headers instead of opening a new
+    TLS connection per request.
+    """
+    
+    def __init__(self, token: Optional[str] = GITHUB_TOKEN, timeout=API_TIMEOUT, retries: int = API_RETRIES, pool_size: int = API_POOL_SIZE, limiter: Optional[RateLimiter] = None, cache: Optional[ResponseCache] = None, graphql_limiter: Optional[RateLimiter] = None):
+        """
+        Args:
+            token (str): GitHub personal access token, if any
+            timeout (float | tuple): Default (connect, read) timeout for every request
+            retries (int): Number of retries for connection errors, 5xx and rate limited responses
+            pool_size (int): Number of connections kept alive in the pool
+            limiter (RateLimiter): Rate limiter to pace REST requests with, a new one by default
+            cache (ResponseCache): Conditional request cache for GET responses, a new one by default
+            graphql_limiter (RateLimiter): Rate limiter for the GraphQL endpoint, which has its own points budget
+        """
+        self.timeout = timeout
+        self.retries = retries
+        self.limiter = limiter or RateLimiter()
+        self.graphql_limiter = graphql_limiter or RateLimiter(resource='graphql')
+        self.cache = cache or ResponseCache()
+        self.session = requests.Session()
+        
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        self.session.headers.update({
+            'Accept': 'application/vnd.github+json',
+            'Accept-Encoding': 'gzip, deflate',
+        })
+        self.set_token(token)
+    
+    def set_token(self, token: Optional[str]):
+        """
+        Set or clear the token used in the Authorization header.
+        
+        Args:
+            token (str): GitHub personal access token, or None to send unauthenticated requests
+        """
+        if token:
+            self.session.headers['Authorization'] = f'token {token}'
+        else:
+            self.session.headers.pop('Authorization', None)
+    
+    def request(self, method: str, url: str, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        
+        # Streamed downloads are not buffered, so only plain GETs are revalidated
+        cache_key = None
+        if method == 'GET' and not kwargs.get('stream'):
+            params = kwargs.get('params') or {}
+            cache_key = (url, tuple(sorted(params.items())), self.session.headers.get('Authorization'))
+            kwargs['headers'] = {**self.cache.conditional_headers(cache_key), **(kwargs.get('headers') or {})}
+        
+        limiter = self.graphql_limiter if urlparse(url).path.endswith('/graphql') else self.limiter
+        for attempt in range(self.retries + 1):
+            limiter.acquire()
+            response = self.session.request(method, url, **kwargs)
+            
+            # The limiter records the pause, the next acquire waits it out
+            if not limiter.update(response) or attempt == self.retries:
+                break
+            response.close()
+        
+        if cache_key:
+            response = self.cache.resolve(cache_key, response)
+        return response
+    
+    def rate_limit_state(self):
+        """
+        Get the current state of this client's REST rate limiter.
+        
+        Returns:
+            Dict[str, Any]: See RateLimiter.state, with the GraphQL limiter's state under 'graphql'
+        """
+        return {**self.limiter.state(), 'graphql': self.graphql_limiter.state()}
+    
+    def cache_stats(self):
+        """
+        Get the hit/miss counters of this client's conditional request cache.
+        
+        Returns:
+            Dict[str, int]: See ResponseCache.stats
+        """
+        return self.cache.stats()
+    
+    def get(self, url: str, **kwargs):
+        return self.request('GET', url, **kwargs)
+    
+    def post(self, url: str, **kwargs):
+        return self.request('POST', url, **kwargs)
+    
+    def put(self, url: str, **kwargs):
+        return self.request('PUT', url, **kwargs)
+    
+    def patch(self, url: str, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+    
+    def delete(self, url: str, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+# Client shared by every function in this module
+client = GitHubClient()
 
 def get_repo_info_from_url(github_url: str):
     """
@@ -53,22 +457,19 @@ def get_repository_files(github_url: str, path: str = ''):
     
     api_url = f"https://api.github.com/repos/{repo_info['owner']}/{repo_info['repo']}/contents/{path}"
     
-    headers = {'Authorization': f'token {GITHUB_TOKEN}'} if GITHUB_TOKEN else {}
-    response = requests.get(api_url, headers=headers)
+    response = client.get(api_url)
     response.raise_for_status()
     
-    # Add delay after each API call
-    time.sleep(API_DELAY)
-    
     return response.json()
 
-def get_repo_tree(github_url: str, recursive: bool = True):
+def get_repo_tree(github_url: str, recursive: bool = True, ref: str = None):
     """
     Get the complete tree structure of a GitHub repository.
     
     Args:
         github_url (str): The GitHub repository URL
         recursive (bool): Whether to get the complete tree recursively
+        ref (str): Commit SHA or branch to read the tree at, the default branch if not given
         
     Returns:
         Dict[str, Any]: The tree structure of the repository
@@ -76,26 +477,61 @@ def get_repo_tree(github_url: str, recursive: bool = True):
     repo_info = get_repo_info_from_url(github_url)
     
     # First, get the default branch
-    api_url = f"https://api.github.com/repos/{repo_info['owner']}/{repo_info['repo']}"
-    headers = {'Authorization': f'token {GITHUB_TOKEN}'} if GITHUB_TOKEN else {}
-    
-    response = requests.get(api_url, headers=headers)
-    response.raise_for_status()
-    default_branch = response.json()['default_branch']
+    if not ref:
+        ref = get_default_branch(github_url)
     
     # Get the tree
-    api_url = f"https://api.github.com/repos/{repo_info['owner']}/{repo_info['repo']}/git/trees/{default_branch}"
+    api_url = f"https://api.github.com/repos/{repo_info['owner']}/{repo_info['repo']}/git/trees/{ref}"
     if recursive:
         api_url += "?recursive=1"
     
-    response = requests.get(api_url, headers=headers)
+    response = client.get(api_url)
     response.raise_for_status()
     
-    # Add delay after each API call
-    time.sleep(API_DELAY)
-    
     return response.json()
 
+def get_default_branch(github_url: str):
+    """
+    Get the name of the default branch of a GitHub repository.
+    
+    Args:
+        github_url (str): The GitHub repository URL
+        
+    Returns:
+        str: The default branch name
+    """
+    repo_info = get_repo_info_from_url(github_url)
+    
+    api_url = f"https://api.github.com/repos/{repo_info['owner']}/{repo_info['repo']}"
+    
+    response = client.get(api_url)
+    response.raise_for_status()
+    
+    return response.json()['default_branch']
+
+def get_head_commit(github_url: str, branch: str = None):
+    """
+    Get the SHA of the latest commit on a branch.
+    
+    Args:
+        github_url (str): The GitHub repository URL
+        branch (str): Branch name, the default branch if not given
+        
+    Returns:
+        str: The commit SHA
+    """
+    repo_info = get_repo_info_from_url(github_url)
+    
+    if not branch:
+        branch = get_default_branch(github_url)
+    
+    api_url = f"https://api.github.com/repos/{repo_info['owner']}/{repo_info['repo']}/git/ref/heads/{branch}"
+    
+    response = client.get(api_url)
+    response.raise_for_status()
+    
+    return response.json()['object']['sha']
+
 def print_tree_structure(tree_data: Dict[str, Any], indent: int = 0):
     """
     Print only files in the tree structure and return their paths.
@@ -115,7 +551,7 @@ def print_tree_structure(tree_data: Dict[str, Any], indent: int = 0):
         if item['type'] == 'tree' and 'children' in item:
             print_tree_structure({'tree': item['children']}, indent + 4)
 
-def print_repository_structure(github_url: str, full_context: list[str], all_files:list[str], path: str = '', indent: int = 0, target_folder: str = None):
+def print_repository_structure(github_url: str, full_context: list[str], all_files:list[str], path: str = '', indent: int = 0, target_folder: str = None, file_contents: dict = None):
     """
     Recursively print the repository structure showing directories and files.
     Also collects file contents into a text file.
@@ -126,6 +562,7 @@ def print_repository_structure(github_url: str, full_context: list[str], all_fil
         path (str): Current path within the repository
         indent (int): Current indentation level
         target_folder (str): The target folder to save content for
+        file_contents (dict): Optional dict filled with path -> content so later stages don't refetch
         
     Returns:
         list: The updated full_context list
@@ -137,14 +574,16 @@ def print_repository_structure(github_url: str, full_context: list[str], all_fil
         
         if item['type'] == 'file':
             # Skip non-code files
-            if any(item['name'].lower().endswith(ext) or item['name'] == ext for ext in skip_extensions) :
+            if not is_code_file(item['path'], item.get('size')):
                 continue
                     
             try:
-                file_content = get_file_content(github_url, f"{path}/{item['name']}" if path else item['name'])
+                file_content = get_file_content(github_url, f"{path}/{item['name']}" if path else item['name'], item.get('sha'))
                 content_to_write = f"\n=== File: {item['name']} ===\n{file_content}"
                 full_context.append(content_to_write)
                 all_files.append(f"{path}/{item['name']}" if path else item['name'])
+                if file_contents is not None:
+                    file_contents[all_files[-1]] = file_content
                 print(f"\nAdding context of {item['name']}: ")
                 
             except Exception as e:
@@ -157,7 +596,11 @@ def print_repository_structure(github_url: str, full_context: list[str], all_fil
         
         if item['type'] == 'dir':
             new_path = f"{path}/{item['name']}" if path else item['name']
-            print_repository_structure(github_url, full_context, all_files, new_path, indent + 4, target_folder)
+            
+            # Don't list vendored or build directories at all
+            if default_classifier.is_vendored_dir(new_path):
+                continue
+            print_repository_structure(github_url, full_context, all_files, new_path, indent + 4, target_folder, file_contents)
     
     # Print completion message if this is the target folder
     # if path == target_folder:
@@ -165,36 +608,552 @@ def print_repository_structure(github_url: str, full_context: list[str], all_fil
     #     print(f"\nSuccessfully saved all content to: {output_path}")
     return full_context, all_files
 
-def get_file_content(github_url: str, file_path: str):
+def build_fetch_plan(tree_data: Dict[str, Any], target_folder: str = '', max_bytes: int = FILE_SIZE_LIMIT, policy: str = LARGE_FILE_POLICY, classifier: FileClassifier = None):
+    """
+    Build the list of blobs to fetch from a recursive tree returned by get_repo_tree.
+    
+    Args:
+        tree_data (Dict[str, Any]): The tree data from GitHub API
+        target_folder (str): Only plan files inside this folder (leave blank for all)
+        max_bytes (int): Per-file size ceiling
+        policy (str): What to do with files over the ceiling, "skip" or "truncate"
+        classifier (FileClassifier): Classifier deciding which files are source code, see load_classifier
+        
+    Returns:
+        List[Dict]: One entry per code file with its path, blob sha and size
+    """
+    folder = target_folder.strip('/')
+    classifier = classifier or default_classifier
+    plan = []
+    
+    if tree_data.get('truncated'):
+        print("Warning: repository tree was truncated by the GitHub API, some files will be missing")
+    
+    for item in tree_data.get('tree', []):
+        if item['type'] != 'blob':
+            continue
+        
+        if folder and not item['path'].startswith(folder + '/'):
+            continue
+        
+        # Skip non-code, vendored and generated files
+        if not is_code_file(item['path'], item.get('size'), classifier):
+            continue
+        
+        # Skip large files instead of loading them
+        if max_bytes and item.get('size', 0) > max_bytes and policy == 'skip':
+            print(f"Skipping {item['path']}: {item['size']} bytes is over the {max_bytes} byte limit")
+            continue
+        
+        plan.append({'path': item['path'], 'sha': item['sha'], 'size': item.get('size', 0)})
+    
+    return plan
+
+def stream_blob(github_url: str, sha: str, chunk_bytes: int = STREAM_CHUNK_BYTES):
+    """
+    Stream the raw bytes of a blob in pieces, without ever holding the whole blob in memory.
+    
+    Args:
+        github_url (str): The GitHub repository URL
+        sha (str): The git blob SHA
+        chunk_bytes (int): Size of the pieces read from the connection
+        
+    Yields:
+        bytes: Consecutive pieces of the blob
+    """
+    repo_info = get_repo_info_from_url(github_url)
+    
+    api_url = f"https://api.github.com/repos/{repo_info['owner']}/{repo_info['repo']}/git/blobs/{sha}"
+    
+    # The raw media type returns the blob bytes instead of base64 wrapped in JSON
+    response = client.get(api_url, headers={'Accept': 'application/vnd.github.raw+json'}, stream=True)
+    try:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=chunk_bytes):
+            if chunk:
+                yield chunk
+    finally:
+        response.close()
+
+def truncate_blob(data: bytes, max_bytes: int = FILE_SIZE_LIMIT):
+    """
+    Decode a blob, cutting it to at most max_bytes bytes.
+    
+    The cut is made on the raw bytes, so multi-byte characters count for their
+    full size, and a character split by the cut is dropped.
+    
+    Args:
+        data (bytes): The blob's bytes
+        max_bytes (int): Size limit, None for no limit
+        
+    Returns:
+        str: The text, ending in TRUNCATION_MARKER when it was cut
+    """
+    if not max_bytes or len(data) <= max_bytes:
+        return data.decode('utf-8')
+    return data[:max_bytes].decode('utf-8', 'ignore') + TRUNCATION_MARKER
+
+def get_blob_content(github_url: str, sha: str, max_bytes: int = FILE_SIZE_LIMIT):
+    """
+    Get the content of a blob from a GitHub repository by its SHA.
+    Blobs already in the local blob cache are returned without an API call.
+    
+    Args:
+        github_url (str): The GitHub repository URL
+        sha (str): The git blob SHA
+        max_bytes (int): Stop reading after this many bytes and return the truncated text, None for no limit
+        
+    Returns:
+        str: The content of the blob
+    """
+    cached = blob_cache.get(sha)
+    if cached is not None:
+        return truncate_blob(cached.encode('utf-8'), max_bytes)
+    
+    data = bytearray()
+    for chunk in stream_blob(github_url, sha):
+        data += chunk
+        if max_bytes and len(data) > max_bytes:
+            # Closing the stream early leaves the rest of the blob unread
+            return truncate_blob(bytes(data), max_bytes)
+    
+    content = bytes(data).decode('utf-8')
+    blob_cache.put(sha, content)
+    return content
+
+def get_repository_blobs(github_url: str, tree_data: Dict[str, Any], full_context: list[str], all_files: list[str], target_folder: str = '', file_contents: dict = None):
+    """
+    Collect the repository file contents by fetching each blob in the tree exactly once.
+    
+    Args:
+        github_url (str): The GitHub repository URL
+        tree_data (Dict[str, Any]): The recursive tree data from get_repo_tree
+        full_context (list): List to store file contents
+        all_files (list): List to store the paths of the collected files
+        target_folder (str): Only collect files inside this folder (leave blank for all)
+        file_contents (dict): Optional dict filled with path -> content so later stages don't refetch
+        
+    Returns:
+        tuple: The updated full_context and all_files lists
+    """
+    for entry in build_fetch_plan(tree_data, target_folder, classifier=load_classifier(github_url, tree_data)):
+        name = entry['path'].split('/')[-1]
+        
+        try:
+            file_content = get_blob_content(github_url, entry['sha'])
+        except Exception as e:
+            print(f"\n=== Error reading file {entry['path']}: {str(e)} ===\n")
+            continue
+        
+        full_context.append(f"\n=== File: {name} ===\n{file_content}")
+        all_files.append(entry['path'])
+        if file_contents is not None:
+            file_contents[entry['path']] = file_content
+        print(f"\nAdding context of {name}: ")
+    
+    return full_context, all_files
+
+def get_repository_archive(github_url: str, full_context: list[str], all_files: list[str], target_folder: str = '', file_contents: dict = None):
+    """
+    Collect the repository file contents from a single tarball download of the default branch.
+    Returns the same result as print_repository_structure without walking the contents API.
+    
+    Args:
+        github_url (str): The GitHub repository URL
+        full_context (list): List to store file contents
+        all_files (list): List to store the paths of the collected files
+        target_folder (str): Only collect files inside this folder (leave blank for all)
+        file_contents (dict): Optional dict filled with path -> content so later stages don't refetch
+        
+    Returns:
+        tuple: The updated full_context and all_files lists
+    """
+    repo_info = get_repo_info_from_url(github_url)
+    
+    api_url = f"https://api.github.com/repos/{repo_info['owner']}/{repo_info['repo']}/tarball"
+    
+    response = client.get(api_url, stream=True)
+    response.raise_for_status()
+    
+    folder = target_folder.strip('/')
+    
+    # Stream the archive so only one member is held in memory at a time
+    with tarfile.open(fileobj=response.raw, mode='r|gz') as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            
+            # Members are prefixed with an "owner-repo-sha/" directory
+            path = member.name.split('/', 1)[-1]
+            name = path.split('/')[-1]
+            
+            if folder and not path.startswith(folder + '/'):
+                continue
+            
+            # Skip non-code files
+            if not is_code_file(path, member.size):
+                continue
+            
+            if member.size > FILE_SIZE_LIMIT and LARGE_FILE_POLICY == 'skip':
+                print(f"Skipping {path}: {member.size} bytes is over the {FILE_SIZE_LIMIT} byte limit")
+                continue
+            
+            try:
+                # Read at most the size limit plus a few bytes for a split multi-byte character
+                data = archive.extractfile(member).read(FILE_SIZE_LIMIT + 3)
+                file_content = data[:FILE_SIZE_LIMIT].decode('utf-8', 'ignore') + TRUNCATION_MARKER if member.size > FILE_SIZE_LIMIT else data.decode('utf-8')
+            except UnicodeDecodeError:
+                continue
+            
+            full_context.append(f"\n=== File: {name} ===\n{file_content}")
+            all_files.append(path)
+            if file_contents is not None:
+                file_contents[path] = file_content
+            print(f"\nAdding context of {name}: ")
+    
+    return full_context, all_files
+
+async def get_repository_structure_async(github_url: str, full_context: list[str], all_files: list[str], path: str = '', file_contents: dict = None, concurrency: int = API_CONCURRENCY):
+    """
+    Concurrently walk the repository directories and fetch the code files.
+    Returns the same result as print_repository_structure.
+    
+    Args:
+        github_url (str): The GitHub repository URL
+        full_context (list): List to store file contents
+        all_files (list): List to store the paths of the collected files
+        path (str): Path within the repository to start from
+        file_contents (dict): Optional dict filled with path -> content so later stages don't refetch
+        concurrency (int): Maximum number of requests in flight at once
+        
+    Returns:
+        tuple: The updated full_context and all_files lists
+    """
+    loop = asyncio.get_running_loop()
+    
+    async def limited(func, *args):
+        # The blocking calls share the pooled client, the executor bounds how many run at once
+        return await loop.run_in_executor(executor, func, *args)
+    
+    async def read_file(file_path, sha):
+        try:
+            return file_path, await limited(get_file_content, github_url, file_path, sha)
+        except Exception as e:
+            print(f"\n=== Error reading file {file_path}: {str(e)} ===\n")
+            return file_path, None
+    
+    async def walk(dir_path):
+        items = await limited(get_repository_files, github_url, dir_path)
+        
+        # Fetch this directory's files while the subdirectories are being listed
+        tasks = [read_file(item['path'], item.get('sha')) for item in items if item['type'] == 'file' and is_code_file(item['path'], item.get('size'))]
+        tasks += [walk(item['path']) for item in items if item['type'] == 'dir' and not default_classifier.is_vendored_dir(item['path'])]
+        
+        results = []
+        for result in await asyncio.gather(*tasks):
+            results.extend(result if isinstance(result, list) else [result])
+        return results
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = await walk(path)
+    
+    for file_path, file_content in results:
+        if file_content is None:
+            continue
+        
+        full_context.append(f"\n=== File: {file_path.split('/')[-1]} ===\n{file_content}")
+        all_files.append(file_path)
+        if file_contents is not None:
+            file_contents[file_path] = file_content
+    
+    return full_context, all_files
+
+async def get_repository_blobs_async(github_url: str, tree_data: Dict[str, Any], full_context: list[str], all_files: list[str], target_folder: str = '', file_contents: dict = None, concurrency: int = API_CONCURRENCY):
+    """
+    Concurrently fetch each blob in the tree exactly once.
+    Returns the same result as get_repository_blobs, in tree order.
+    
+    Args:
+        github_url (str): The GitHub repository URL
+        tree_data (Dict[str, Any]): The recursive tree data from get_repo_tree
+        full_context (list): List to store file contents
+        all_files (list): List to store the paths of the collected files
+        target_folder (str): Only collect files inside this folder (leave blank for all)
+        file_contents (dict): Optional dict filled with path -> content so later stages don't refetch
+        concurrency (int): Maximum number of requests in flight at once
+        
+    Returns:
+        tuple: The updated full_context and all_files lists
+    """
+    loop = asyncio.get_running_loop()
+    
+    async def read_blob(entry):
+        try:
+            return await loop.run_in_executor(executor, get_blob_content, github_url, entry['sha'])
+        except Exception as e:
+            print(f"\n=== Error reading file {entry['path']}: {str(e)} ===\n")
+            return None
+    
+    plan = build_fetch_plan(tree_data, target_folder, classifier=load_classifier(github_url, tree_data))
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        contents = await asyncio.gather(*(read_blob(entry) for entry in plan))
+    
+    for entry, file_content in zip(plan, contents):
+        if file_content is None:
+            continue
+        
+        full_context.append(f"\n=== File: {entry['path'].split('/')[-1]} ===\n{file_content}")
+        all_files.append(entry['path'])
+        if file_contents is not None:
+            file_contents[entry['path']] = file_content
+    
+    return full_context, all_files
+
+def graphql_blob_batches(entries: List[Dict], batch_size: int = GRAPHQL_BATCH_SIZE, batch_bytes: int = GRAPHQL_BATCH_BYTES):
+    """
+    Split blobs into batches that fit the GraphQL cost limits.
+    
+    Args:
+        entries (List[Dict]): Entries with an optional 'size' in bytes
+        batch_size (int): Maximum number of blobs per batch
+        batch_bytes (int): Maximum total size of a batch, a single larger blob gets its own batch
+        
+    Returns:
+        List[List[Dict]]: The batches, in order
+    """
+    batches, batch, total = [], [], 0
+    
+    for entry in entries:
+        size = entry.get('size') or 0
+        if batch and (len(batch) >= batch_size or total + size > batch_bytes):
+            batches.append(batch)
+            batch, total = [], 0
+        batch.append(entry)
+        total += size
+    
+    if batch:
+        batches.append(batch)
+    return batches
+
+def query_blobs_graphql(github_url: str, selectors: List[str], by: str = 'oid', graphql_url: str = GITHUB_GRAPHQL_URL):
+    """
+    Fetch the text of several blobs in a single GraphQL query.
+    
+    Args:
+        github_url (str): The GitHub repository URL
+        selectors (List[str]): Blob SHAs, or "ref:path" expressions when by is 'expression'
+        by (str): 'oid' to look blobs up by SHA, 'expression' to look them up by ref and path
+        graphql_url (str): The GraphQL endpoint
+        
+    Returns:
+        List[Optional[Dict]]: For each selector the blob's oid, text, isBinary and isTruncated, or None if missing
+    """
+    repo_info = get_repo_info_from_url(github_url)
+    
+    var_type = 'GitObjectID' if by == 'oid' else 'String'
+    declarations = ''.join(f", $v{i}: {var_type}!" for i in range(len(selectors)))
+    fields = '\n'.join(
+        f"    b{i}: object({by}: $v{i}) {{ ... on Blob {{ oid text isBinary isTruncated }} }}"
+        for i in range(len(selectors))
+    )
+    query = f"query($owner: String!, $name: String!{declarations}) {{\n  repository(owner: $owner, name: $name) {{\n{fields}\n  }}\n}}"
+    
+    variables = {'owner': repo_info['owner'], 'name': repo_info['repo']}
+    variables.update({f"v{i}": selector for i, selector in enumerate(selectors)})
+    
+    response = client.post(graphql_url, json={'query': query, 'variables': variables})
+    response.raise_for_status()
+    
+    result = response.json()
+    if result.get('errors'):
+        raise ValueError(f"GraphQL query failed: {result['errors'][0].get('message', 'Unknown error')}")
+    
+    repository = result['data']['repository'] or {}
+    return [repository.get(f"b{i}") for i in range(len(selectors))]
+
+def get_blobs_graphql(github_url: str, entries: List[Dict], graphql_url: str = GITHUB_GRAPHQL_URL):
+    """
+    Get the contents of many blobs, dozens per request, through the GraphQL API.
+    Blobs already in the local blob cache are not requested, and blobs GraphQL
+    can't return in full fall back to get_blob_content.
+    
+    Args:
+        github_url (str): The GitHub repository URL
+        entries (List[Dict]): Entries with the blob 'sha' and optional 'size', e.g. from build_fetch_plan
+        graphql_url (str): The GraphQL endpoint
+        
+    Returns:
+        Dict[str, str]: Blob SHA -> content for every blob that could be read as text
+    """
+    contents = {}
+    pending = []
+    
+    for entry in entries:
+        cached = blob_cache.get(entry['sha'])
+        if cached is not None:
+            contents[entry['sha']] = cached
+        elif (entry.get('size') or 0) > FILE_SIZE_LIMIT:
+            # Large blobs are streamed and truncated instead of being returned whole by GraphQL
+            contents[entry['sha']] = get_blob_content(github_url, entry['sha'])
+        elif entry['sha'] not in contents:
+            pending.append(entry)
+    
+    for batch in graphql_blob_batches(pending):
+        blobs = query_blobs_graphql(github_url, [entry['sha'] for entry in batch], 'oid', graphql_url)
+        
+        for entry, blob in zip(batch, blobs):
+            if not blob or blob.get('isBinary'):
+                continue
+            
+            if blob.get('isTruncated') or blob.get('text') is None:
+                try:
+                    contents[entry['sha']] = get_blob_content(github_url, entry['sha'])
+                except Exception as e:
+                    print(f"\n=== Error reading blob {entry['sha']}: {str(e)} ===\n")
+                continue
+            
+            contents[entry['sha']] = blob['text']
+            blob_cache.put(entry['sha'], blob['text'])
+    
+    return contents
+
+def get_file_contents_graphql(github_url: str, file_paths: List[str], ref: str = 'HEAD', graphql_url: str = GITHUB_GRAPHQL_URL):
+    """
+    Batched counterpart of get_file_content: get the content of many files by path through the GraphQL API.
+    
+    Args:
+        github_url (str): The GitHub repository URL
+        file_paths (List[str]): Paths of the files within the repository
+        ref (str): Branch, tag or commit to read the files from
+        graphql_url (str): The GraphQL endpoint
+        
+    Returns:
+        Dict[str, str]: Path -> content for every file that could be read as text
+    """
+    contents = {}
+    
+    for batch in graphql_blob_batches([{'path': path} for path in file_paths]):
+        blobs = query_blobs_graphql(github_url, [f"{ref}:{entry['path']}" for entry in batch], 'expression', graphql_url)
+        
+        for entry, blob in zip(batch, blobs):
+            if not blob or blob.get('isBinary'):
+                continue
+            
+            if blob.get('isTruncated') or blob.get('text') is None:
+                contents[entry['path']] = get_blob_content(github_url, blob['oid'])
+                continue
+            
+            contents[entry['path']] = blob['text']
+            blob_cache.put(blob['oid'], blob['text'])
+    
+    return contents
+
+def get_repository_blobs_graphql(github_url: str, tree_data: Dict[str, Any], full_context: list[str], all_files: list[str], target_folder: str = '', file_contents: dict = None, graphql_url: str = GITHUB_GRAPHQL_URL):
+    """
+    Collect the repository file contents through batched GraphQL queries.
+    Returns the same result as get_repository_blobs with far fewer requests.
+    
+    Args:
+        github_url (str): The GitHub repository URL
+        tree_data (Dict[str, Any]): The recursive tree data from get_repo_tree
+        full_context (list): List to store file contents
+        all_files (list): List to store the paths of the collected files
+        target_folder (str): Only collect files inside this folder (leave blank for all)
+        file_contents (dict): Optional dict filled with path -> content so later stages don't refetch
+        graphql_url (str): The GraphQL endpoint
+        
+    Returns:
+        tuple: The updated full_context and all_files lists
+    """
+    plan = build_fetch_plan(tree_data, target_folder, classifier=load_classifier(github_url, tree_data))
+    contents = get_blobs_graphql(github_url, plan, graphql_url)
+    
+    for entry in plan:
+        if entry['sha'] not in contents:
+            continue
+        
+        file_content = contents[entry['sha']]
+        full_context.append(f"\n=== File: {entry['path'].split('/')[-1]} ===\n{file_content}")
+        all_files.append(entry['path'])
+        if file_contents is not None:
+            file_contents[entry['path']] = file_content
+    
+    return full_context, all_files
+
+def is_code_file(path: str, size: int = None, classifier: FileClassifier = None):
+    """
+    Check whether a file looks like a code file worth collecting.
+    
+    Args:
+        path (str): The file path or name
+        size (int): The file size in bytes, if known
+        classifier (FileClassifier): Classifier to use, the default one if not given
+        
+    Returns:
+        bool: False for assets, docs, config, lockfiles, vendored and generated code
+    """
+    return (classifier or default_classifier).is_source(path, size)
+
+def load_classifier(github_url: str, tree_data: Dict[str, Any]):
+    """
+    Build the file classifier for a repository, reading its root .gitattributes when there is one.
+    
+    Args:
+        github_url (str): The GitHub repository URL
+        tree_data (Dict[str, Any]): The recursive tree data from get_repo_tree
+        
+    Returns:
+        FileClassifier: Classifier honouring the repository's linguist-vendored / linguist-generated markers
+    """
+    for item in tree_data.get('tree', []):
+        if item['path'] == '.gitattributes' and item['type'] == 'blob':
+            try:
+                return FileClassifier(get_blob_content(github_url, item['sha']))
+            except Exception as e:
+                print(f"Could not read .gitattributes: {str(e)}")
+            break
+    
+    return default_classifier
+
+def get_file_content(github_url: str, file_path: str, sha: str = None):
     """
     Get the content of a specific file from a GitHub repository.
     
     Args:
         github_url (str): The GitHub repository URL
         file_path (str): Path to the file within the repository
+        sha (str): Optional blob SHA of the file, used to serve it from the local blob cache
         
     Returns:
         str: The content of the file
     """
+    if sha:
+        cached = blob_cache.get(sha)
+        if cached is not None:
+            return cached
+    
     repo_info = get_repo_info_from_url(github_url)
 
     
     api_url = f"https://api.github.com/repos/{repo_info['owner']}/{repo_info['repo']}/contents/{file_path}"
     
-    headers = {'Authorization': f'token {GITHUB_TOKEN}'} if GITHUB_TOKEN else {}
-    response = requests.get(api_url, headers=headers)
+    response = client.get(api_url)
     response.raise_for_status()
     
-    # Add delay after each API call
-    time.sleep(API_DELAY)
-    
     file_data = response.json()
     
     if 'content' not in file_data:
         raise ValueError(f"Could not get content for file: {file_path}")
     
+    # The contents API leaves out the content of files over 1MB, stream those from the blob instead
+    if file_data.get('encoding') == 'none' or file_data.get('size', 0) > FILE_SIZE_LIMIT:
+        if LARGE_FILE_POLICY == 'skip':
+            raise ValueError(f"File {file_path} is {file_data.get('size')} bytes, over the {FILE_SIZE_LIMIT} byte limit")
+        return get_blob_content(github_url, file_data['sha'])
+    
     
     content = base64.b64decode(file_data['content']).decode('utf-8')
+    blob_cache.put(file_data['sha'], content)
     return content
 
 def create_branch(github_url: str, branch_name: str):
@@ -212,14 +1171,10 @@ def create_branch(github_url: str, branch_name: str):
     
     # Get the default branch's latest commit SHA
     refs_url = f"https://api.github.com/repos/{repo_info['owner']}/{repo_info['repo']}/git/refs/heads"
-    headers = {'Authorization': f'token {GITHUB_TOKEN}'} if GITHUB_TOKEN else {}
     
-    response = requests.get(refs_url, headers=headers)
+    response = client.get(refs_url)
     response.raise_for_status()
     
-    # Add delay after API call
-    time.sleep(API_DELAY)
-    
     # Check if branch already exists
     existing_branches = response.json()
     if any(ref['ref'] == f'refs/heads/{branch_name}' for ref in existing_branches):
@@ -235,7 +1190,7 @@ def create_branch(github_url: str, branch_name: str):
         "sha": default_branch_sha
     }
     
-    response = requests.post(create_branch_url, headers=headers, json=branch_data)
+    response = client.post(create_branch_url, json=branch_data)
     
     if response.status_code == 201:
         return f"Successfully created branch '{branch_name}'"
@@ -267,8 +1222,7 @@ def commit_test_changes(github_url: str, commit_message: str, file_path: str):
         base64content = base64.b64encode(f.read())
     
     # Get current file data to obtain SHA
-    headers = {'Authorization': f'token {GITHUB_TOKEN}'} if GITHUB_TOKEN else {}
-    response = requests.get(f"{api_url}?ref=hiro-tests", headers=headers)
+    response = client.get(api_url, params={"ref": "hiro-tests"})
     
     if response.status_code == 404:
         # File doesn't exist yet, create new file
@@ -288,20 +1242,119 @@ def commit_test_changes(github_url: str, commit_message: str, file_path: str):
         }
     
     # Commit changes
-    response = requests.put(
-        api_url,
-        headers={"Content-Type": "application/json", "Authorization": f"token {GITHUB_TOKEN}"},
-        json=data
-    )
-    
-    # Add delay after API call
-    time.sleep(API_DELAY)
+    response = client.put(api_url, json=data)
     
     if response.status_code in [200, 201]:
         return f"Successfully committed changes to hiro-tests/{filename}"
     else:
         return f"Failed to commit changes: {response.json().get('message', 'Unknown error')}"
          
+def delete_test_file(github_url: str, commit_message: str, filename: str):
+    """
+    Delete a test file from the hiro-tests folder of the hiro-tests branch
+    
+    Args:
+        github_url (str): The GitHub repository URL
+        commit_message (str): Message for the commit
+        filename (str): Name of the test file in the hiro-tests folder
+        
+    Returns:
+        str: A success or failure message indicating if the file was deleted
+    """
+    repo_info = get_repo_info_from_url(github_url)
+    
+    api_url = f"https://api.github.com/repos/{repo_info['owner']}/{repo_info['repo']}/contents/hiro-tests/{filename}"
+    
+    # Get current file data to obtain SHA
+    response = client.get(api_url, params={"ref": "hiro-tests"})
+    
+    if response.status_code == 404:
+        return f"hiro-tests/{filename} does not exist"
+    response.raise_for_status()
+    
+    data = {
+        "message": commit_message,
+        "branch": "hiro-tests",
+        "sha": response.json()['sha']
+    }
+    
+    response = client.delete(api_url, json=data)
+    
+    if response.status_code == 200:
+        return f"Successfully deleted hiro-tests/{filename}"
+    else:
+        return f"Failed to delete file: {response.json().get('message', 'Unknown error')}"
+         
+def commit_test_files(github_url: str, commit_message: str, file_paths: List[str], deleted_files: List[str] = None, branch: str = "hiro-tests"):
+    """
+    Commit several test files to the hiro-tests folder in a single commit using the Git Data API.
+    Either every file lands or none does, for a handful of API calls regardless of the number of files.
+    
+    Args:
+        github_url (str): The GitHub repository URL
+        commit_message (str): Message for the commit
+        file_paths (List[str]): Local paths of the test files to add or update
+        deleted_files (List[str]): Names of test files to remove from the hiro-tests folder
+        branch (str): Branch to commit to, it must already exist
+        
+    Returns:
+        str: A success or failure message indicating if the commit was successful
+    """
+    repo_info = get_repo_info_from_url(github_url)
+    base_url = f"https://api.github.com/repos/{repo_info['owner']}/{repo_info['repo']}"
+    
+    tree_entries = []
+    for file_path in file_paths:
+        filename = os.path.basename(file_path)
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        
+        try:
+            # Text is sent inline with the tree, GitHub creates the blob itself
+            tree_entries.append({"path": f"hiro-tests/{filename}", "mode": "100644", "type": "blob", "content": data.decode('utf-8')})
+        except UnicodeDecodeError:
+            response = client.post(f"{base_url}/git/blobs", json={"content": base64.b64encode(data).decode('utf-8'), "encoding": "base64"})
+            response.raise_for_status()
+            tree_entries.append({"path": f"hiro-tests/{filename}", "mode": "100644", "type": "blob", "sha": response.json()['sha']})
+    
+    if deleted_files:
+        # Only paths that exist on the branch can be removed from the tree
+        response = client.get(f"{base_url}/contents/hiro-tests", params={"ref": branch})
+        existing = {item['name'] for item in response.json()} if response.status_code == 200 else set()
+        for filename in deleted_files:
+            if filename in existing:
+                tree_entries.append({"path": f"hiro-tests/{filename}", "mode": "100644", "type": "blob", "sha": None})
+    
+    if not tree_entries:
+        return "No test changes to commit"
+    
+    # Retry once if the branch moved while the commit was being built
+    for attempt in range(2):
+        response = client.get(f"{base_url}/git/ref/heads/{branch}")
+        if response.status_code != 200:
+            return f"Failed to commit changes: branch '{branch}' not found"
+        parent_sha = response.json()['object']['sha']
+        
+        response = client.get(f"{base_url}/git/commits/{parent_sha}")
+        response.raise_for_status()
+        base_tree_sha = response.json()['tree']['sha']
+        
+        response = client.post(f"{base_url}/git/trees", json={"base_tree": base_tree_sha, "tree": tree_entries})
+        if response.status_code != 201:
+            return f"Failed to commit changes: {response.json().get('message', 'Unknown error')}"
+        tree_sha = response.json()['sha']
+        
+        response = client.post(f"{base_url}/git/commits", json={"message": commit_message, "tree": tree_sha, "parents": [parent_sha]})
+        if response.status_code != 201:
+            return f"Failed to commit changes: {response.json().get('message', 'Unknown error')}"
+        commit_sha = response.json()['sha']
+        
+        response = client.patch(f"{base_url}/git/refs/heads/{branch}", json={"sha": commit_sha, "force": False})
+        if response.status_code == 200:
+            return f"Successfully committed {len(tree_entries)} changes to {branch} in {commit_sha[:7]}"
+    
+    return f"Failed to commit changes: {response.json().get('message', 'Unknown error')}"
+         
 def create_pull_request(github_url: str, file_path: str):
     """
     Create a pull request from file changes
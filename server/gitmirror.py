@@ -0,0 +1,217 @@
+import os
+import re
+import base64
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Any
+from urllib.parse import urlparse
+
+from githubapi import GITHUB_TOKEN, FILE_SIZE_LIMIT, TRUNCATION_MARKER, build_fetch_plan, get_repo_info_from_url
+from classifier import FileClassifier, default_classifier
+
+# Where the local mirrors are kept
+MIRROR_DIR = os.getenv('HIRO_MIRROR_DIR', os.path.join(Path.home(), '.cache', 'hiro', 'mirrors'))
+
+def run_git(args: List[str], cwd: str = None, input: bytes = None, env: Dict[str, str] = None):
+    """
+    Run a git command and return its output.
+
+    Args:
+        args (List[str]): Arguments passed to git
+        cwd (str): Directory to run the command in
+        input (bytes): Data written to the command's stdin
+        env (Dict[str, str]): Extra environment variables for the command
+
+    Returns:
+        bytes: The command's stdout
+    """
+    result = subprocess.run(['git'] + args, cwd=cwd, input=input, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env={**os.environ, **env} if env else None)
+    if result.returncode != 0:
+        raise RuntimeError(f"git {args[0]} failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+    return result.stdout
+
+def get_mirror_path(github_url: str, mirror_dir: str = MIRROR_DIR):
+    """
+    Get the local path of the mirror of a repository.
+
+    Args:
+        github_url (str): The GitHub repository URL, or a file:// URL of a local repository
+        mirror_dir (str): Directory the mirrors are kept in
+
+    Returns:
+        str: Path of the bare mirror repository
+    """
+    parsed_url = urlparse(github_url)
+    if parsed_url.scheme == 'file':
+        name = re.sub(r'[^A-Za-z0-9._-]+', '_', parsed_url.path.strip('/'))
+        return os.path.join(mirror_dir, 'local', f"{name}.git")
+
+    repo_info = get_repo_info_from_url(github_url)
+    return os.path.join(mirror_dir, repo_info['owner'], f"{repo_info['repo']}.git")
+
+def git_auth_env(github_url: str, token: str = GITHUB_TOKEN):
+    """
+    Per-command git config sending the GitHub token.
+
+    The config is passed in GIT_CONFIG_* environment variables, so the token is
+    neither written to the mirror's config nor visible on the command line.
+    """
+    if not token or urlparse(github_url).scheme == 'file':
+        return {}
+    credentials = base64.b64encode(f"x-access-token:{token}".encode('utf-8')).decode('utf-8')
+    return {
+        'GIT_CONFIG_COUNT': '1',
+        'GIT_CONFIG_KEY_0': 'http.extraHeader',
+        'GIT_CONFIG_VALUE_0': f"Authorization: Basic {credentials}",
+    }
+
+def sync_mirror(github_url: str, mirror_dir: str = MIRROR_DIR, depth: int = None):
+    """
+    Create or update the local bare mirror of a repository.
+
+    The first call clones the repository, later calls only fetch new objects,
+    so after the first sync no per-file requests are needed at all.
+
+    Args:
+        github_url (str): The GitHub repository URL, or a file:// URL of a local repository
+        mirror_dir (str): Directory the mirrors are kept in
+        depth (int): Optional history depth for a shallow mirror
+
+    Returns:
+        str: Path of the bare mirror repository
+    """
+    mirror_path = get_mirror_path(github_url, mirror_dir)
+    remote_url = github_url if urlparse(github_url).scheme == 'file' else re.sub(r'\.git$', '', github_url.rstrip('/')) + '.git'
+    depth_args = [f"--depth={depth}"] if depth else []
+
+    if not os.path.isdir(mirror_path):
+        os.makedirs(os.path.dirname(mirror_path), exist_ok=True)
+        print(f"Cloning mirror of {github_url} into {mirror_path}")
+        run_git(['clone', '--bare', '--quiet'] + depth_args + [remote_url, mirror_path], env=git_auth_env(github_url))
+    else:
+        print(f"Updating mirror of {github_url}")
+        run_git(['fetch', '--quiet', '--prune', '--force'] + depth_args + ['origin', '+refs/heads/*:refs/heads/*'], cwd=mirror_path, env=git_auth_env(github_url))
+
+    return mirror_path
+
+def get_mirror_head(mirror_path: str, ref: str = 'HEAD'):
+    """
+    Get the commit SHA a ref points to in the mirror.
+
+    Args:
+        mirror_path (str): Path of the bare mirror repository
+        ref (str): Branch, tag or commit, the default branch if not given
+
+    Returns:
+        str: The commit SHA
+    """
+    return run_git(['rev-parse', f"{ref}^{{commit}}"], cwd=mirror_path).decode('utf-8').strip()
+
+def get_mirror_tree(mirror_path: str, ref: str = 'HEAD'):
+    """
+    Get the recursive tree of a commit from the mirror, in the same shape as githubapi.get_repo_tree.
+
+    Args:
+        mirror_path (str): Path of the bare mirror repository
+        ref (str): Branch, tag or commit, the default branch if not given
+
+    Returns:
+        Dict[str, Any]: The tree structure of the repository
+    """
+    tree_sha = run_git(['rev-parse', f"{ref}^{{tree}}"], cwd=mirror_path).decode('utf-8').strip()
+    output = run_git(['ls-tree', '-r', '-t', '-l', '-z', '--full-tree', tree_sha], cwd=mirror_path)
+
+    tree = []
+    for line in output.decode('utf-8').split('\0'):
+        if not line:
+            continue
+        info, path = line.split('\t', 1)
+        mode, item_type, sha, size = info.split()
+        item = {'path': path, 'mode': mode, 'type': item_type, 'sha': sha}
+        if item_type == 'blob':
+            item['size'] = int(size)
+        tree.append(item)
+
+    return {'sha': tree_sha, 'tree': tree, 'truncated': False}
+
+def read_mirror_blobs(mirror_path: str, shas: List[str]):
+    """
+    Read many blobs from the mirror's object database in one git process.
+
+    Args:
+        mirror_path (str): Path of the bare mirror repository
+        shas (List[str]): Blob SHAs to read
+
+    Returns:
+        Dict[str, bytes]: Blob SHA -> raw content for every blob found
+    """
+    if not shas:
+        return {}
+
+    output = run_git(['cat-file', '--batch'], cwd=mirror_path, input=''.join(f"{sha}\n" for sha in shas).encode('utf-8'))
+
+    blobs = {}
+    position = 0
+    while position < len(output):
+        header_end = output.index(b'\n', position)
+        header = output[position:header_end].decode('utf-8').split()
+        position = header_end + 1
+
+        if len(header) < 3 or header[1] == 'missing':
+            continue
+
+        size = int(header[2])
+        blobs[header[0]] = output[position:position + size]
+        # Skip the content and its trailing newline
+        position += size + 1
+
+    return blobs
+
+def get_repository_blobs_mirror(github_url: str, tree_data: Dict[str, Any], full_context: list[str], all_files: list[str], target_folder: str = '', file_contents: dict = None, mirror_dir: str = MIRROR_DIR):
+    """
+    Collect the repository file contents from the local mirror.
+    Returns the same result as githubapi.get_repository_blobs without any API call.
+
+    Args:
+        github_url (str): The GitHub repository URL, or a file:// URL of a local repository
+        tree_data (Dict[str, Any]): The recursive tree data, e.g. from get_mirror_tree
+        full_context (list): List to store file contents
+        all_files (list): List to store the paths of the collected files
+        target_folder (str): Only collect files inside this folder (leave blank for all)
+        file_contents (dict): Optional dict filled with path -> content so later stages don't refetch
+        mirror_dir (str): Directory the mirrors are kept in
+
+    Returns:
+        tuple: The updated full_context and all_files lists
+    """
+    mirror_path = get_mirror_path(github_url, mirror_dir)
+
+    # Honour the repository's linguist-vendored / linguist-generated markers
+    classifier = default_classifier
+    gitattributes = [item['sha'] for item in tree_data.get('tree', []) if item['path'] == '.gitattributes' and item['type'] == 'blob']
+    if gitattributes:
+        data = read_mirror_blobs(mirror_path, gitattributes).get(gitattributes[0], b'')
+        classifier = FileClassifier(data.decode('utf-8', 'ignore'))
+
+    plan = build_fetch_plan(tree_data, target_folder, classifier=classifier)
+    blobs = read_mirror_blobs(mirror_path, [entry['sha'] for entry in plan])
+
+    for entry in plan:
+        if entry['sha'] not in blobs:
+            continue
+
+        data = blobs[entry['sha']]
+        try:
+            if len(data) > FILE_SIZE_LIMIT:
+                file_content = data[:FILE_SIZE_LIMIT].decode('utf-8', 'ignore') + TRUNCATION_MARKER
+            else:
+                file_content = data.decode('utf-8')
+        except UnicodeDecodeError:
+            continue
+
+        full_context.append(f"\n=== File: {entry['path'].split('/')[-1]} ===\n{file_content}")
+        all_files.append(entry['path'])
+        if file_contents is not None:
+            file_contents[entry['path']] = file_content
+
+    return full_context, all_files
@@ -0,0 +1,157 @@
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Any
+
+from githubapi import get_repo_tree, build_fetch_plan, load_classifier
+
+# File recording the last commit processed for each repository
+STATE_FILE = os.getenv('HIRO_STATE_FILE', os.path.join(Path.home(), '.cache', 'hiro', 'state.json'))
+
+state_lock = threading.Lock()
+
+def state_key(github_url: str, folder: str = ''):
+    return f"{github_url.rstrip('/')}#{folder.strip('/')}"
+
+def load_state(state_file: str = STATE_FILE):
+    """
+    Load the processed-commit state.
+
+    Args:
+        state_file (str): Path of the state file
+
+    Returns:
+        Dict[str, Any]: The state, empty if no run was recorded yet
+    """
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def get_processed_commit(github_url: str, folder: str = '', state_file: str = STATE_FILE):
+    """
+    Get the commit SHA the pipeline last processed for a repository.
+
+    Args:
+        github_url (str): The GitHub repository URL
+        folder (str): The folder the run was limited to
+        state_file (str): Path of the state file
+
+    Returns:
+        str: The commit SHA, or None if the repository was never processed
+    """
+    entry = load_state(state_file).get(state_key(github_url, folder))
+    return entry['commit'] if entry else None
+
+def save_processed_commit(github_url: str, commit_sha: str, folder: str = '', state_file: str = STATE_FILE):
+    """
+    Record the commit SHA the pipeline processed for a repository.
+
+    Args:
+        github_url (str): The GitHub repository URL
+        commit_sha (str): The commit that was processed
+        folder (str): The folder the run was limited to
+        state_file (str): Path of the state file
+    """
+    with state_lock:
+        state = load_state(state_file)
+        state[state_key(github_url, folder)] = {'commit': commit_sha}
+
+        os.makedirs(os.path.dirname(state_file), exist_ok=True)
+        tmp_file = f"{state_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_file, state_file)
+
+def diff_trees(old_tree: Dict[str, Any], new_tree: Dict[str, Any]):
+    """
+    Compare two recursive trees by blob SHA.
+
+    Args:
+        old_tree (Dict[str, Any]): Tree data of the previously processed commit
+        new_tree (Dict[str, Any]): Tree data of the current commit
+
+    Returns:
+        Dict[str, list]: Paths that were 'added', 'modified' and 'removed'
+    """
+    old_blobs = {item['path']: item['sha'] for item in old_tree.get('tree', []) if item['type'] == 'blob'}
+    new_blobs = {item['path']: item['sha'] for item in new_tree.get('tree', []) if item['type'] == 'blob'}
+
+    return {
+        'added': [path for path in new_blobs if path not in old_blobs],
+        'modified': [path for path in new_blobs if path in old_blobs and new_blobs[path] != old_blobs[path]],
+        'removed': [path for path in old_blobs if path not in new_blobs],
+    }
+
+def filter_tree(tree_data: Dict[str, Any], paths):
+    """
+    Keep only the given paths of a tree, so fetch plans built from it skip everything else.
+
+    Args:
+        tree_data (Dict[str, Any]): The tree data from GitHub API
+        paths (Iterable[str]): Paths to keep
+
+    Returns:
+        Dict[str, Any]: A copy of the tree data with only those paths
+    """
+    paths = set(paths)
+    return {**tree_data, 'tree': [item for item in tree_data.get('tree', []) if item['path'] in paths]}
+
+def get_test_file_name(path: str):
+    """
+    Get the name of the test file generated for a source file.
+
+    Args:
+        path (str): Path of the source file within the repository
+
+    Returns:
+        str: The test file name, e.g. test_utils.test.py for src/utils.py
+    """
+    file_ext = path.split(".")[-1]
+    return f"test_{path.split('/')[-1].split('.')[0]}.test.{file_ext}"
+
+def plan_incremental_run(github_url: str, head_sha: str, tree_data: Dict[str, Any], folder: str = '', state_file: str = STATE_FILE):
+    """
+    Work out what a run needs to process given the last processed commit.
+
+    Args:
+        github_url (str): The GitHub repository URL
+        head_sha (str): The commit being processed now
+        tree_data (Dict[str, Any]): Tree data at head_sha
+        folder (str): The folder the run is limited to
+        state_file (str): Path of the state file
+
+    Returns:
+        tuple: The paths to generate tests for (every file on a first run or when the last processed
+        commit no longer exists, only added/modified ones on a repeat run) and the removed code files
+        whose tests should be deleted
+    """
+    base_sha = get_processed_commit(github_url, folder, state_file)
+
+    all_paths = {item['path'] for item in tree_data.get('tree', []) if item['type'] == 'blob'}
+    if not base_sha:
+        return all_paths, []
+
+    if base_sha == head_sha:
+        return set(), []
+
+    try:
+        old_tree = get_repo_tree(github_url, ref=base_sha)
+    except Exception as e:
+        # The commit is gone after a force-push or history rewrite, nothing left to diff against
+        print(f"Could not read the tree of {base_sha[:7]}, processing every file: {str(e)}")
+        return all_paths, []
+    changes = diff_trees(old_tree, tree_data)
+    print(f"Changes since {base_sha[:7]}: {len(changes['added'])} added, {len(changes['modified'])} modified, {len(changes['removed'])} removed")
+
+    # Only removed code files in the folder ever had tests generated for them, classified by
+    # the .gitattributes of their own commit so vendored and generated files match the fetch
+    removed = [entry['path'] for entry in build_fetch_plan(filter_tree(old_tree, changes['removed']), folder, classifier=load_classifier(github_url, old_tree))]
+
+    # Test names only carry the file's basename, keep a test while another file still maps to it
+    remaining_tests = {get_test_file_name(entry['path']) for entry in build_fetch_plan(tree_data, folder, classifier=load_classifier(github_url, tree_data))}
+    removed = [path for path in removed if get_test_file_name(path) not in remaining_tests]
+
+    return set(changes['added'] + changes['modified']), removed
@@ -1,7 +1,12 @@
 import os
+import re
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
-from pydantic import BaseModel, Field
+from langchain_google_genai import ChatGoogleGenerativeAI
+from pydantic import BaseModel, Field, ValidationError
+
+from context import fit_tokens, CONTEXT_TOKEN_BUDGET, TREE_TOKEN_BUDGET
+from router import LLMRouter, Provider
 
 
 class ResponseFormatter(BaseModel):
@@ -9,6 +14,7 @@ class ResponseFormatter(BaseModel):
     metadata: str = Field(description="Additional information needed to run the unit tests. Write this in markdown format")
     code: str = Field(description="The generated code for the user's request. Only code, no additional text.")
     packages: list[str] = Field(description="List of required packages for the code. Package names only.")
+    file_path: str = Field(default="", description="Path of the file these tests are for, exactly as given in the request.")
 
 
 # Load environment variables first
@@ -21,6 +27,18 @@ GROQ_API_KEY = os.environ['GROQ_API_KEY']
 if not GROQ_API_KEY:
     raise ValueError("GROQ_API_KEY not found in environment variables. Please check your .env file.")
 
+# Optional second provider, requests fail over and are hedged across both
+GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
+
+MODEL_NAME = "llama-3.3-70b-versatile"
+GOOGLE_MODEL_NAME = os.getenv('HIRO_GOOGLE_MODEL', "gemini-2.0-flash-001")
+MODEL_TEMPERATURE = 0.9
+
+# Seconds one provider call may take and how often the client retries it
+# before the router fails over to the next provider
+PROVIDER_TIMEOUT = float(os.getenv('HIRO_PROVIDER_TIMEOUT', 90))
+PROVIDER_RETRIES = int(os.getenv('HIRO_PROVIDER_RETRIES', 1))
+
 SYSTEM_PROMPT = """
 You are an expert unit test generation assistant. Your task is to:
 1. Analyze the provided code context and identify key functionality to test
@@ -45,51 +63,227 @@ Requirements:
 Provided below is the file tree of the repository. Use it to identify which files need testing and generate appropriate test cases.
 """
 
+# Finish reasons of a response cut off at the output token limit (Groq, Gemini)
+TRUNCATED_FINISH_REASONS = {"length", "MAX_TOKENS"}
+
+BATCH_PROMPT = """
+You are given several files to test at once. Call the ResponseFormatter tool once for every file,
+with file_path set to the file's path exactly as given, and put only that file's tests in each call.
+"""
+
 async def model():
     # Load environment variables
     
     llm = ChatGroq(
         api_key= GROQ_API_KEY,
-        model="llama-3.3-70b-versatile",
-        temperature=0.9,
-        max_retries=2,
+        model=MODEL_NAME,
+        temperature=MODEL_TEMPERATURE,
+        max_retries=PROVIDER_RETRIES,
+        request_timeout=PROVIDER_TIMEOUT,
     )
     
 #     model_with_structured_output = llm.with_structured_output(schema=ResponseFormatter)
     model_with_tools = llm.bind_tools([ResponseFormatter])
+    providers = [Provider("groq", model_with_tools)]
+    
+    if GOOGLE_API_KEY:
+        google_llm = ChatGoogleGenerativeAI(
+            google_api_key=GOOGLE_API_KEY,
+            model=GOOGLE_MODEL_NAME,
+            temperature=MODEL_TEMPERATURE,
+            max_retries=PROVIDER_RETRIES,
+            timeout=PROVIDER_TIMEOUT,
+        )
+        providers.append(Provider("google", google_llm.bind_tools([ResponseFormatter])))
     
-    return model_with_tools
+    # Routes every request to the fastest healthy provider, see router.LLMRouter
+    return LLMRouter(providers)
 
-async def generate_code(llm, file_tree:str, full_context: str, code_context: str, user_prompt: str) -> str:
+def build_messages(file_tree: str, full_context: str, code_context: str, user_prompt: str):
     """
-    Generate code based on context and user prompt.
+    Build the prompt messages of a generation request.
     
     Args:
-        llm: The language model instance
         file_tree: Repository file structure
         full_context: Full repository context
         code_context: The specific code to analyze
         user_prompt: The specific code generation request
         
     Returns:
-        ResponseFormatter: Structured response containing code and metadata
+        list: The system and user messages
     """
-    # Limit context size to prevent token limit errors
-    max_context_length = 4000  # Adjust this value based on your needs
-    if len(full_context) > max_context_length:
-        full_context = full_context[:max_context_length] + "...\n[Context truncated due to size limits]"
-    
-    if len(file_tree) > 1000:  # Limit file tree size
-        file_tree = file_tree[:1000] + "...\n[File tree truncated due to size limits]"
+    # Keep the prompt within the token budgets, see context.ContextBuilder for assembling the context
+    full_context = fit_tokens(full_context, CONTEXT_TOKEN_BUDGET)
+    file_tree = fit_tokens(file_tree, TREE_TOKEN_BUDGET)
     
-    messages = [
+    return [
         {"role": "system", "content": SYSTEM_PROMPT + "\nFile Tree:\n" + file_tree + "\nRepository Context:\n" + full_context},
         {"role": "user", "content": f"Code to Test:\n{code_context}\n\nRequest: {user_prompt}"}
     ]
+
+def build_batch_messages(file_tree: str, full_context: str, files: dict[str, str], user_prompt: str):
+    """
+    Build the prompt messages of a request covering several files.
+    
+    Args:
+        file_tree: Repository file structure
+        full_context: Repository context shared by the files
+        files: Path -> content of the files to test
+        user_prompt: The code generation request, applied to each file
+        
+    Returns:
+        list: The system and user messages
+    """
+    messages = build_messages(file_tree, full_context, "", user_prompt)
+    messages[0]["content"] += BATCH_PROMPT
+    code = "".join(f"=== Code to Test: {path} ===\n{content}\n\n" for path, content in files.items())
+    messages[1]["content"] = f"{code}Request: {user_prompt}. Make one ResponseFormatter call for each of the {len(files)} files above."
+    return messages
+
+def parse_batch_response(response, paths: list[str]):
+    """
+    Map the ResponseFormatter tool calls of a batched response back to their files.
+    
+    Args:
+        response: The message returned by the model
+        paths: Paths of the files in the request
+        
+    Returns:
+        dict: Path -> ResponseFormatter arguments for every file that got a complete result
+    """
+    # Calls missing a field are dropped, their files go to the single-file fallback
+    calls = response_calls(response)
+    
+    results = {}
+    unmatched = []
+    for args in calls:
+        file_path = re.sub(r"^\./", "", args.get("file_path", "").strip())
+        match = None
+        if file_path:
+            match = file_path if file_path in paths else next((path for path in paths if path.endswith("/" + file_path) or file_path.endswith("/" + path)), None)
+        if match and match not in results:
+            results[match] = args
+        else:
+            unmatched.append(args)
+    
+    # Calls without a usable path can only be trusted when there is exactly one per file, in order
+    if len(calls) == len(paths):
+        missing = [path for path in paths if path not in results]
+        results.update(zip(missing, unmatched))
+    
+    return results
+
+async def generate_batch(llm, file_tree: str, full_context: str, files: dict[str, str], user_prompt: str):
+    """
+    Generate tests for several small files in one request.
+    
+    Args:
+        llm: The language model instance
+        file_tree: Repository file structure
+        full_context: Repository context shared by the files
+        files: Path -> content of the files to test
+        user_prompt: The code generation request, applied to each file
+        
+    Returns:
+        tuple: The raw response and a dict of path -> ResponseFormatter arguments, files without a result are missing
+    """
+    messages = build_batch_messages(file_tree, full_context, files, user_prompt)
+    
+    response = await llm.ainvoke(messages)
+    return response, parse_batch_response(response, list(files))
+
+async def generate_code(llm, file_tree:str, full_context: str, code_context: str, user_prompt: str) -> str:
+    """
+    Generate code based on context and user prompt.
+    
+    Args:
+        llm: The language model instance
+        file_tree: Repository file structure
+        full_context: Full repository context
+        code_context: The specific code to analyze
+        user_prompt: The specific code generation request
+        
+    Returns:
+        ResponseFormatter: Structured response containing code and metadata
+    """
+    messages = build_messages(file_tree, full_context, code_context, user_prompt)
     
     response = await llm.ainvoke(messages)
     return response
 
+async def stream_code(llm, file_tree: str, full_context: str, code_context: str, user_prompt: str):
+    """
+    Stream a generation, yielding the response as it builds up.
+    
+    Tool call arguments are parsed as they arrive, so the code of the first
+    call is readable from the partial message long before the response is done.
+    
+    Args:
+        llm: The language model instance
+        file_tree: Repository file structure
+        full_context: Full repository context
+        code_context: The specific code to analyze
+        user_prompt: The specific code generation request
+        
+    Yields:
+        AIMessageChunk: Every chunk received so far, merged into one message
+    """
+    messages = build_messages(file_tree, full_context, code_context, user_prompt)
+    
+    message = None
+    async for chunk in llm.astream(messages):
+        message = chunk if message is None else message + chunk
+        yield message
+
+def complete_args(args: dict):
+    """
+    Validate the arguments of a ResponseFormatter call.
+    
+    Args:
+        args: The tool call arguments, e.g. from a response or the generation cache
+        
+    Returns:
+        dict: The arguments with every field set, None when a field is missing or there is no code
+    """
+    try:
+        response = ResponseFormatter(**args)
+    except (TypeError, ValidationError):
+        return None
+    return response.model_dump() if response.code.strip() else None
+
+def response_calls(message) -> list[dict]:
+    """
+    Get the arguments of every complete ResponseFormatter call of a response.
+    
+    A response cut off at the token limit or a stream that stopped early ends
+    in a call holding part of the code and none of the later fields, so calls
+    that don't validate are left out, as are calls whose arguments didn't parse
+    (the message's invalid_tool_calls).
+    
+    Args:
+        message: The message returned by the model
+        
+    Returns:
+        list: The validated ResponseFormatter arguments, in order
+    """
+    if message is None or message.response_metadata.get("finish_reason") in TRUNCATED_FINISH_REASONS:
+        return []
+    
+    calls = []
+    for call in message.tool_calls:
+        if call.get("name", "ResponseFormatter") != "ResponseFormatter":
+            continue
+        args = complete_args(call["args"])
+        if args is not None:
+            calls.append(args)
+    return calls
+
+def partial_code(message) -> str:
+    """Get the code written so far in a streamed response."""
+    if message is None or not message.tool_calls:
+        return ""
+    return message.tool_calls[0]["args"].get("code") or ""
+
 async def main():
     # Example usage
     llm = await model()
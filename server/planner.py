@@ -0,0 +1,312 @@
+import os
+import re
+import time
+from collections import Counter
+from typing import Dict, Any, Optional
+
+from githubapi import client, get_repo_info_from_url
+from depgraph import DependencyGraph
+
+# Run limits, 0 means unlimited
+TIME_BUDGET_SECONDS = float(os.getenv('HIRO_TIME_BUDGET_SECONDS', 0))
+TOKEN_BUDGET = int(os.getenv('HIRO_TOKEN_BUDGET', 0))
+
+# Number of recent commits looked at for churn, 0 disables it (one request per commit)
+CHURN_COMMITS = int(os.getenv('HIRO_CHURN_COMMITS', 20))
+
+# Rough cost of one generation request on top of the file itself:
+# system prompt, tree and repository context in, generated tests out
+PROMPT_OVERHEAD_TOKENS = 2500
+EXPECTED_OUTPUT_TOKENS = 1500
+
+# Related files kept together in the order when an import graph is available
+RELATED_GROUP_SIZE = 4
+
+# Patterns of exported / public definitions per language
+EXPORT_PATTERNS = {
+    'py': re.compile(r'^(?:async\s+)?(?:def|class)\s+[A-Za-z]\w*', re.MULTILINE),
+    'js': re.compile(r'^\s*export\s+(?:default\s+)?(?:async\s+)?(?:function|class|const|let)\b|^\s*module\.exports\b', re.MULTILINE),
+    'go': re.compile(r'^func\s+(?:\([^)]*\)\s*)?[A-Z]\w*', re.MULTILINE),
+    'java': re.compile(r'^\s*public\s+(?:static\s+)?(?:final\s+)?[\w<>\[\], ]+\s+\w+\s*\(', re.MULTILINE),
+    'rb': re.compile(r'^\s*def\s+\w+', re.MULTILINE),
+    'php': re.compile(r'^\s*(?:public\s+)?function\s+\w+', re.MULTILINE),
+}
+
+LANGUAGE_BY_EXTENSION = {
+    'py': 'py', 'js': 'js', 'jsx': 'js', 'ts': 'js', 'tsx': 'js', 'mjs': 'js', 'cjs': 'js',
+    'go': 'go', 'java': 'java', 'kt': 'java', 'rb': 'rb', 'php': 'php',
+}
+
+# File name patterns of existing tests, used to find files that are already covered
+TEST_NAME_PATTERN = re.compile(r'(?:^test_|_test\.|\.test\.|\.spec\.|Test\.|Tests\.|_spec\.)')
+
+def estimate_tokens(text: str):
+    """
+    Estimate the number of tokens of a text (about 4 characters per token for code).
+
+    Args:
+        text (str): The text
+
+    Returns:
+        int: Estimated token count
+    """
+    return len(text) // 4 + 1
+
+def count_exports(path: str, content: str):
+    """
+    Count the exported or public functions and classes of a source file.
+
+    Args:
+        path (str): Path of the file, used to pick the language
+        content (str): Content of the file
+
+    Returns:
+        int: Number of exported definitions
+    """
+    language = LANGUAGE_BY_EXTENSION.get(path.rsplit('.', 1)[-1].lower())
+    pattern = EXPORT_PATTERNS.get(language)
+    return len(pattern.findall(content)) if pattern else 0
+
+def get_recent_churn(github_url: str, ref: str = None, max_commits: int = CHURN_COMMITS):
+    """
+    Count how often each file changed in the most recent commits.
+
+    Args:
+        github_url (str): The GitHub repository URL
+        ref (str): Branch or commit to walk back from, the default branch if not given
+        max_commits (int): Number of recent commits to look at
+
+    Returns:
+        Dict[str, int]: Path -> number of those commits that touched it
+    """
+    churn = Counter()
+    if not max_commits:
+        return churn
+
+    repo_info = get_repo_info_from_url(github_url)
+    api_url = f"https://api.github.com/repos/{repo_info['owner']}/{repo_info['repo']}/commits"
+
+    try:
+        params = {'per_page': min(max_commits, 100)}
+        if ref:
+            params['sha'] = ref
+        response = client.get(api_url, params=params)
+        response.raise_for_status()
+
+        # The commit list doesn't include files, each commit has to be fetched
+        for commit in response.json()[:max_commits]:
+            detail = client.get(f"{api_url}/{commit['sha']}")
+            detail.raise_for_status()
+            churn.update(changed['filename'] for changed in detail.json().get('files', []))
+    except Exception as e:
+        print(f"Could not get recent churn: {str(e)}")
+
+    return churn
+
+def module_stem(path: str):
+    """Base name of a file without test affixes or extensions, e.g. src/user.test.ts -> user."""
+    name = path.rsplit('/', 1)[-1].split('.')[0]
+    name = re.sub(r'^test_|_test$|_spec$|Tests?$', '', name)
+    return name.lower()
+
+def find_tested_modules(tree_data: Dict[str, Any]):
+    """
+    Find the modules that already have tests in the repository.
+
+    Args:
+        tree_data (Dict[str, Any]): The recursive tree data from get_repo_tree
+
+    Returns:
+        set: Module stems (see module_stem) that have a test file
+    """
+    return {
+        module_stem(item['path'])
+        for item in tree_data.get('tree', [])
+        if item['type'] == 'blob' and (TEST_NAME_PATTERN.search(item['path'].rsplit('/', 1)[-1]) or '/tests/' in f"/{item['path']}")
+    }
+
+def score_file(path: str, content: str, tested_modules: set = None, churn: Dict[str, int] = None, graph: DependencyGraph = None):
+    """
+    Score how valuable generating tests for a file is. Higher is better.
+
+    Args:
+        path (str): Path of the file within the repository
+        content (str): Content of the file
+        tested_modules (set): Module stems that already have tests, see find_tested_modules
+        churn (Dict[str, int]): Optional number of recent commits touching each path
+        graph (DependencyGraph): Optional import graph, widely imported files score higher
+
+    Returns:
+        float: The score
+    """
+    size = len(content)
+    exports = count_exports(path, content)
+
+    # Files that define something testable matter most, with diminishing returns
+    score = min(exports, 20) * 2.0
+
+    # Tiny files have little to test and huge ones are expensive and get truncated
+    if size < 200:
+        score -= 5
+    elif size > 50000:
+        score -= 3
+    else:
+        score += 2
+
+    # Recently changed code is the most likely to break
+    if churn:
+        score += min(churn.get(path, 0), 10) * 1.5
+
+    # A bug in a file many others import breaks all of them
+    if graph:
+        score += min(len(graph.dependents(path)), 10)
+
+    # Existing tests make new ones less valuable
+    if tested_modules and module_stem(path) in tested_modules:
+        score -= 6
+
+    # Test files themselves don't need tests
+    if TEST_NAME_PATTERN.search(path.rsplit('/', 1)[-1]):
+        score -= 20
+
+    return score
+
+def prioritize_files(file_contents: Dict[str, str], tree_data: Dict[str, Any] = None, churn: Dict[str, int] = None, graph: DependencyGraph = None, group_size: int = RELATED_GROUP_SIZE):
+    """
+    Order files by score, highest first.
+
+    With an import graph, each file is followed by its highest scoring direct
+    neighbours, so closely related files are generated together.
+
+    Args:
+        file_contents (Dict[str, str]): Path -> content of the candidate files
+        tree_data (Dict[str, Any]): The recursive tree data, used to detect existing tests
+        churn (Dict[str, int]): Optional number of recent commits touching each path
+        graph (DependencyGraph): Optional import graph of the candidate files
+        group_size (int): Maximum number of related files kept together
+
+    Returns:
+        List[str]: The paths, highest score first
+    """
+    tested_modules = find_tested_modules(tree_data) if tree_data else set()
+    scores = {path: score_file(path, content, tested_modules, churn, graph) for path, content in file_contents.items()}
+    ranked = sorted(file_contents, key=lambda path: scores[path], reverse=True)
+    if not graph:
+        return ranked
+
+    ordered = {}
+    for path in ranked:
+        if path in ordered:
+            continue
+        ordered[path] = True
+        neighbours = [other for other in graph.neighbours(path) if other in scores and other not in ordered]
+        for other in sorted(neighbours, key=lambda other: scores[other], reverse=True)[:group_size - 1]:
+            ordered[other] = True
+    return list(ordered)
+
+class GenerationBudget:
+    """
+    Wall-clock and token limits for a generation run.
+
+    The run asks can_start before each file and records what each request
+    actually used; once either limit would be exceeded it stops cleanly and
+    report lists what was processed and what was skipped.
+    """
+
+    def __init__(self, time_budget: float = TIME_BUDGET_SECONDS, token_budget: int = TOKEN_BUDGET):
+        """
+        Args:
+            time_budget (float): Seconds the run may take, 0 for no limit
+            token_budget (int): Tokens the run may spend, 0 for no limit
+        """
+        self.time_budget = time_budget
+        self.token_budget = token_budget
+        self.started_at = time.monotonic()
+        self.tokens_used = 0
+        # Estimates of requests still in flight, so concurrent requests can't overshoot the budget together
+        self.reserved = {}
+        self.processed = []
+        self.skipped = []
+        self.request_seconds = []
+
+    def estimate_request_tokens(self, content: str):
+        return estimate_tokens(content) + PROMPT_OVERHEAD_TOKENS + EXPECTED_OUTPUT_TOKENS
+
+    def can_start(self, path: str, content: str):
+        """
+        Check whether there is budget left to generate tests for a file, recording it as skipped if not.
+
+        Args:
+            path (str): Path of the file
+            content (str): Content of the file
+
+        Returns:
+            bool: True if the file should be processed
+        """
+        if self.time_budget:
+            elapsed = time.monotonic() - self.started_at
+            # Leave room for one more request of average duration
+            average = sum(self.request_seconds) / len(self.request_seconds) if self.request_seconds else 0
+            if elapsed + average > self.time_budget:
+                self.skipped.append({'path': path, 'reason': 'time budget exhausted'})
+                return False
+
+        estimate = self.estimate_request_tokens(content)
+        if self.token_budget and self.tokens_used + sum(self.reserved.values()) + estimate > self.token_budget:
+            self.skipped.append({'path': path, 'reason': 'token budget exhausted'})
+            return False
+
+        self.reserved[path] = estimate
+        return True
+
+    def record(self, path: str, tokens: Optional[int] = None, seconds: Optional[float] = None, content: str = ''):
+        """
+        Record a finished request.
+
+        Args:
+            path (str): Path of the file
+            tokens (int): Tokens the request used, estimated from the content if unknown
+            seconds (float): How long the request took
+            content (str): Content of the file, used for the estimate
+        """
+        estimate = self.reserved.pop(path, None) or self.estimate_request_tokens(content)
+        self.tokens_used += tokens if tokens is not None else estimate
+        if seconds is not None:
+            self.request_seconds.append(seconds)
+        self.processed.append(path)
+
+    def release(self, path: str):
+        """
+        Give back the tokens reserved for a request that failed.
+
+        Args:
+            path (str): Path of the file
+        """
+        self.reserved.pop(path, None)
+
+    def report(self):
+        """
+        Summarize the run.
+
+        Returns:
+            Dict[str, Any]: Processed and skipped files, tokens used and elapsed time
+        """
+        return {
+            'processed': list(self.processed),
+            'skipped': list(self.skipped),
+            'tokens_used': self.tokens_used,
+            'elapsed_seconds': round(time.monotonic() - self.started_at, 1),
+        }
+
+def get_token_usage(response):
+    """
+    Get the total tokens a model response used, if the provider reported it.
+
+    Args:
+        response: The message returned by the model
+
+    Returns:
+        int: Total tokens, or None if unknown
+    """
+    usage = getattr(response, 'usage_metadata', None) or {}
+    return usage.get('total_tokens')
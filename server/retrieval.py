@@ -0,0 +1,247 @@
+import os
+import re
+import ast
+import math
+from collections import Counter
+from typing import Dict, List, Iterable
+
+# Number of chunks retrieved for each file under test
+RETRIEVAL_TOP_K = int(os.getenv('HIRO_RETRIEVAL_TOP_K', 12))
+
+# Chunks longer than this are split further
+MAX_CHUNK_LINES = 80
+
+# Terms of the file under test used as the query, the most specific ones first
+MAX_QUERY_TERMS = 64
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Lines starting a function or class in the languages without an AST parser here
+DEFINITION_PATTERN = re.compile(
+    r'^\s*(?:export\s+)?(?:default\s+)?(?:public\s+|private\s+|protected\s+|static\s+|final\s+|abstract\s+|async\s+)*'
+    r'(?:function\b|class\b|interface\b|def\b|func\b|fn\b|const\s+\w+\s*=\s*(?:async\s*)?\(|[\w<>\[\]]+\s+\w+\s*\([^;]*\)\s*\{)'
+)
+
+NAME_PATTERN = re.compile(r'(?:function|class|interface|def|func|fn|const)\s+(?:\([^)]*\)\s*)?(\w+)|(\w+)\s*\(')
+
+IDENTIFIER_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+CAMEL_CASE_PATTERN = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+')
+
+# Keywords and filler too common in code to tell chunks apart
+STOPWORDS = {
+    'the', 'and', 'for', 'not', 'def', 'class', 'return', 'import', 'from', 'self', 'this', 'function',
+    'const', 'let', 'var', 'new', 'true', 'false', 'none', 'null', 'undefined', 'public', 'private',
+    'protected', 'static', 'void', 'int', 'str', 'string', 'func', 'package', 'export', 'default',
+    'async', 'await', 'if', 'else', 'elif', 'while', 'try', 'except', 'catch', 'finally', 'with', 'as',
+    'in', 'is', 'or', 'of', 'to', 'err', 'nil', 'type', 'interface', 'extends', 'implements',
+}
+
+def tokenize(text: str):
+    """
+    Split code into lowercase search terms, breaking up snake_case and camelCase identifiers.
+
+    Args:
+        text (str): The text
+
+    Returns:
+        List[str]: The terms
+    """
+    terms = []
+    for identifier in IDENTIFIER_PATTERN.findall(text):
+        parts = [part for piece in identifier.split('_') for part in CAMEL_CASE_PATTERN.findall(piece)]
+        if len(parts) > 1:
+            # Keep the whole identifier too, exact matches are the strongest signal
+            terms.append(identifier.lower())
+        terms.extend(part.lower() for part in parts)
+    return [term for term in terms if len(term) > 2 and term not in STOPWORDS]
+
+def split_lines(lines: List[str], start: int, name: str):
+    """Split a long run of lines into chunks of at most MAX_CHUNK_LINES."""
+    return [
+        {'name': name, 'start': start + offset + 1, 'text': '\n'.join(lines[offset:offset + MAX_CHUNK_LINES])}
+        for offset in range(0, len(lines), MAX_CHUNK_LINES)
+    ]
+
+def split_chunks(path: str, content: str):
+    """
+    Split a file into function and class sized chunks.
+
+    Python files are split on their top-level definitions with ast, other
+    languages on lines that look like the start of a definition.
+
+    Args:
+        path (str): Path of the file
+        content (str): Content of the file
+
+    Returns:
+        List[Dict]: Chunks with their 'name', first line 'start' and 'text'
+    """
+    lines = content.splitlines()
+    boundaries = []
+
+    if path.endswith(('.py', '.pyi')):
+        try:
+            for node in ast.parse(content).body:
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list]) - 1
+                    boundaries.append((start, node.name))
+        except (SyntaxError, ValueError):
+            pass
+
+    if not boundaries:
+        for number, line in enumerate(lines):
+            # Top-level definitions and the methods of top-level classes
+            indent = line[:len(line) - len(line.lstrip())].expandtabs(4)
+            if len(indent) <= 4 and DEFINITION_PATTERN.match(line):
+                match = NAME_PATTERN.search(line)
+                boundaries.append((number, (match.group(1) or match.group(2)) if match else ''))
+
+    chunks = []
+    # Everything before the first definition: imports, constants, module docs
+    first = boundaries[0][0] if boundaries else len(lines)
+    if any(line.strip() for line in lines[:first]):
+        chunks.extend(split_lines(lines[:first], 0, '<module>'))
+
+    for index, (start, name) in enumerate(boundaries):
+        end = boundaries[index + 1][0] if index + 1 < len(boundaries) else len(lines)
+        chunks.extend(split_lines(lines[start:end], start, name))
+
+    return chunks
+
+class RetrievalIndex:
+    """
+    Offline BM25 index over function and class sized chunks of repository files.
+
+    Files are added or replaced one at a time, so the index grows as files
+    arrive and a changed file only re-indexes its own chunks. For each file
+    under test the index returns the chunks of other files that share the most
+    specific identifiers with it.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        """
+        Args:
+            k1 (float): BM25 term frequency saturation
+            b (float): BM25 length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self.chunks = {}
+        self.postings = {}
+        self.file_chunks = {}
+        self.file_hashes = {}
+        self.total_length = 0
+        self.next_id = 0
+
+    def add_file(self, path: str, content: str):
+        """
+        Index a file, replacing its previous chunks.
+
+        Args:
+            path (str): Path of the file
+            content (str): Content of the file
+        """
+        if self.file_hashes.get(path) == hash(content):
+            return
+        self.remove_file(path)
+
+        ids = []
+        for chunk in split_chunks(path, content):
+            frequencies = Counter(tokenize(chunk['text']))
+            if not frequencies:
+                continue
+
+            chunk_id = self.next_id
+            self.next_id += 1
+            self.chunks[chunk_id] = {**chunk, 'path': path, 'length': sum(frequencies.values()), 'terms': frequencies}
+            self.total_length += self.chunks[chunk_id]['length']
+            for term, count in frequencies.items():
+                self.postings.setdefault(term, {})[chunk_id] = count
+            ids.append(chunk_id)
+
+        self.file_chunks[path] = ids
+        self.file_hashes[path] = hash(content)
+
+    def remove_file(self, path: str):
+        """
+        Drop a file's chunks from the index.
+
+        Args:
+            path (str): Path of the file
+        """
+        for chunk_id in self.file_chunks.pop(path, []):
+            chunk = self.chunks.pop(chunk_id)
+            self.total_length -= chunk['length']
+            for term in chunk['terms']:
+                postings = self.postings[term]
+                del postings[chunk_id]
+                if not postings:
+                    del self.postings[term]
+        self.file_hashes.pop(path, None)
+
+    def sync(self, file_contents: Dict[str, str]):
+        """
+        Index the files that are new or changed since the last sync.
+
+        Args:
+            file_contents (Dict[str, str]): Path -> content of the repository files
+        """
+        for path, content in list(file_contents.items()):
+            self.add_file(path, content)
+
+    def idf(self, term: str):
+        frequency = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.chunks) - frequency + 0.5) / (frequency + 0.5))
+
+    def query_terms(self, text: str, max_terms: int = MAX_QUERY_TERMS):
+        """
+        Pick the terms of a text that best describe it.
+
+        Args:
+            text (str): The text, e.g. the file under test
+            max_terms (int): Maximum number of terms
+
+        Returns:
+            List[str]: The terms, most specific first
+        """
+        frequencies = Counter(tokenize(text))
+        weighted = {term: (1 + math.log(count)) * self.idf(term) for term, count in frequencies.items() if term in self.postings}
+        return sorted(weighted, key=weighted.get, reverse=True)[:max_terms]
+
+    def search(self, text: str, top_k: int = RETRIEVAL_TOP_K, exclude_paths: Iterable[str] = (), boost: Dict[str, float] = None):
+        """
+        Find the chunks most relevant to a text.
+
+        Args:
+            text (str): The query, e.g. the content of the file under test
+            top_k (int): Number of chunks to return
+            exclude_paths (Iterable[str]): Files whose own chunks are left out, e.g. the files under test
+            boost (Dict[str, float]): Optional path -> score multiplier, e.g. for direct dependencies
+
+        Returns:
+            List[Dict]: The chunks with their 'path', 'name', 'start', 'text' and 'score', best first
+        """
+        if not self.chunks:
+            return []
+
+        average_length = self.total_length / len(self.chunks)
+        scores = Counter()
+        for term in self.query_terms(text):
+            idf = self.idf(term)
+            for chunk_id, count in self.postings[term].items():
+                length = self.chunks[chunk_id]['length']
+                scores[chunk_id] += idf * count * (self.k1 + 1) / (count + self.k1 * (1 - self.b + self.b * length / average_length))
+
+        exclude_paths = set(exclude_paths)
+        results = []
+        for chunk_id, score in scores.items():
+            chunk = self.chunks[chunk_id]
+            if chunk['path'] in exclude_paths:
+                continue
+            if boost:
+                score *= boost.get(chunk['path'], 1)
+            results.append({key: chunk[key] for key in ('path', 'name', 'start', 'text')} | {'score': score})
+
+        return sorted(results, key=lambda chunk: chunk['score'], reverse=True)[:top_k]
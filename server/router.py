@@ -0,0 +1,277 @@
+import os
+import time
+import asyncio
+from collections import deque
+from typing import List
+
+# Latencies kept per provider, and how many are needed before hedging on their p95
+LATENCY_WINDOW = int(os.getenv('HIRO_LATENCY_WINDOW', 50))
+HEDGE_MIN_SAMPLES = int(os.getenv('HIRO_HEDGE_MIN_SAMPLES', 5))
+
+# Send a duplicate request to the next provider once a request runs past its
+# provider's p95, but never sooner than HEDGE_MIN_DELAY seconds
+HEDGE_REQUESTS = os.getenv('HIRO_HEDGE_REQUESTS', '1') != '0'
+HEDGE_MIN_DELAY = float(os.getenv('HIRO_HEDGE_MIN_DELAY', 5))
+
+# Seconds a provider is ranked last after a failed request
+PROVIDER_COOLDOWN = float(os.getenv('HIRO_PROVIDER_COOLDOWN', 30))
+
+class Provider:
+    """
+    A chat model of one provider and the latencies and errors of its recent requests.
+    """
+
+    def __init__(self, name: str, llm, window: int = LATENCY_WINDOW):
+        """
+        Args:
+            name (str): Name shown in logs, e.g. "groq"
+            llm: The chat model, with the ResponseFormatter tool bound
+            window (int): Number of recent latencies kept
+        """
+        self.name = name
+        self.llm = llm
+        self.latencies = deque(maxlen=window)
+        self.first_chunk_latencies = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.hedges_won = 0
+        self.hedges_lost = 0
+        self.cooldown_until = 0
+
+    def percentile(self, fraction: float, samples: deque = None):
+        """Latency below which the given fraction of recent requests finished, None without samples."""
+        samples = self.latencies if samples is None else samples
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def record_success(self, seconds: float):
+        self.latencies.append(seconds)
+
+    def record_first_chunk(self, seconds: float):
+        self.first_chunk_latencies.append(seconds)
+
+    def record_hedge_loss(self, seconds: float, samples: deque):
+        # The request was cancelled unfinished, so its elapsed time is a lower bound of its latency
+        self.hedges_lost += 1
+        samples.append(seconds)
+
+    def record_error(self, cooldown: float):
+        self.errors += 1
+        self.cooldown_until = time.monotonic() + cooldown
+
+    def stats(self):
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            'name': self.name,
+            'requests': self.requests,
+            'errors': self.errors,
+            'hedges_won': self.hedges_won,
+            'hedges_lost': self.hedges_lost,
+            'p50_seconds': round(p50, 2) if p50 is not None else None,
+            'p95_seconds': round(p95, 2) if p95 is not None else None,
+        }
+
+class LLMRouter:
+    """
+    Sends each request to the fastest healthy provider, failing over and hedging across the others.
+
+    Providers are ranked by their median latency, with providers that failed
+    recently ranked last. A failed request is retried on the next provider.
+    When hedging is on and the request is still running after its provider's
+    p95 latency, a duplicate goes to the next provider, the first answer wins
+    and the other request is cancelled, so a single slow call no longer sets
+    the latency of its file. A request that loses to its hedge still records
+    the time it ran, so a provider that turned slow drops in the ranking.
+    Streams are raced the same way on their time to first chunk; once chunks
+    reach the caller the stream is bound to its provider.
+
+    The router has the ainvoke and astream methods of a chat model, so it is
+    passed around wherever an llm is expected.
+    """
+
+    def __init__(self, providers: List[Provider], hedge: bool = HEDGE_REQUESTS, hedge_min_samples: int = HEDGE_MIN_SAMPLES, hedge_min_delay: float = HEDGE_MIN_DELAY, cooldown: float = PROVIDER_COOLDOWN):
+        """
+        Args:
+            providers (List[Provider]): The providers, in order of preference when their latencies are unknown
+            hedge (bool): Send hedged duplicates of slow requests
+            hedge_min_samples (int): Latencies a provider needs before its requests are hedged
+            hedge_min_delay (float): Minimum seconds before a request is hedged
+            cooldown (float): Seconds a provider is ranked last after a failed request
+        """
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self.providers = providers
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.cooldown = cooldown
+
+    def ranked(self, samples=lambda provider: provider.latencies):
+        """
+        Order the providers for a request.
+
+        Args:
+            samples: Function giving the latencies of a provider to rank on, the full request latencies by default
+
+        Returns:
+            List[Provider]: Healthy providers first, then by median latency; providers without latencies yet are tried early
+        """
+        now = time.monotonic()
+        order = {id(provider): index for index, provider in enumerate(self.providers)}
+        return sorted(self.providers, key=lambda provider: (provider.cooldown_until > now, provider.percentile(0.5, samples(provider)) or 0, order[id(provider)]))
+
+    def hedge_delay(self, provider: Provider, samples: deque):
+        """Seconds to wait for a provider before hedging, None to never hedge."""
+        if not self.hedge or len(samples) < self.hedge_min_samples:
+            return None
+        return max(provider.percentile(0.95, samples), self.hedge_min_delay)
+
+    async def call(self, provider: Provider, messages):
+        provider.requests += 1
+        started_at = time.monotonic()
+        try:
+            response = await provider.llm.ainvoke(messages)
+        except Exception:
+            provider.record_error(self.cooldown)
+            raise
+        provider.record_success(time.monotonic() - started_at)
+        return response
+
+    async def open_stream(self, provider: Provider, messages):
+        """
+        Start a stream and wait for its first chunk.
+
+        Returns:
+            tuple: The stream, its first chunk (None for an empty stream) and when it started
+        """
+        provider.requests += 1
+        started_at = time.monotonic()
+        stream = provider.llm.astream(messages).__aiter__()
+        try:
+            chunk = await stream.__anext__()
+        except StopAsyncIteration:
+            chunk = None
+        except Exception:
+            provider.record_error(self.cooldown)
+            raise
+        provider.record_first_chunk(time.monotonic() - started_at)
+        return stream, chunk, started_at
+
+    async def race(self, start, samples, discard=None):
+        """
+        Run a request on the best provider, failing over on errors and hedging past the p95.
+
+        Args:
+            start: Coroutine function taking a provider, e.g. a bound call
+            samples: Function giving the latencies of a provider that ranking and hedging are based on
+            discard: Optional function called with the results of requests that finished but lost
+
+        Returns:
+            tuple: The provider that answered and its result
+        """
+        remaining = self.ranked(samples)
+        primary = remaining.pop(0)
+        started_at = time.monotonic()
+        tasks = {asyncio.create_task(start(primary)): primary}
+        delay = self.hedge_delay(primary, samples(primary)) if remaining else None
+        hedged = False
+        last_error = None
+
+        try:
+            while True:
+                done, _ = await asyncio.wait(tasks, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                delay = None
+
+                if not done:
+                    provider = remaining.pop(0)
+                    print(f"{primary.name} is slower than its p95, hedging with {provider.name}")
+                    hedged = True
+                    tasks[asyncio.create_task(start(provider))] = provider
+                    continue
+
+                winner = None
+                for task in done:
+                    provider = tasks.pop(task)
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        print(f"{provider.name} request failed: {str(last_error) or type(last_error).__name__}")
+                    elif winner is None:
+                        winner = (provider, task.result())
+                    elif discard:
+                        discard(task.result())
+
+                if winner:
+                    provider = winner[0]
+                    if hedged and provider is not primary:
+                        provider.hedges_won += 1
+                        if primary in tasks.values():
+                            primary.record_hedge_loss(time.monotonic() - started_at, samples(primary))
+                    return winner
+
+                # Fail over once no request is left running
+                if not tasks:
+                    if not remaining:
+                        raise last_error
+                    provider = remaining.pop(0)
+                    print(f"Failing over to {provider.name}")
+                    tasks[asyncio.create_task(start(provider))] = provider
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def ainvoke(self, messages):
+        """
+        Send a request, failing over on errors and hedging when it runs past the p95.
+
+        Args:
+            messages: The prompt messages
+
+        Returns:
+            AIMessage: The first successful response
+        """
+        _, response = await self.race(lambda provider: self.call(provider, messages), lambda provider: provider.latencies)
+        return response
+
+    async def astream(self, messages):
+        """
+        Stream a request, failing over and hedging until the first chunk arrives.
+
+        Args:
+            messages: The prompt messages
+
+        Yields:
+            AIMessageChunk: The chunks of the response
+        """
+        def close(opened):
+            asyncio.ensure_future(opened[0].aclose())
+
+        provider, (stream, chunk, started_at) = await self.race(
+            lambda provider: self.open_stream(provider, messages), lambda provider: provider.first_chunk_latencies, close
+        )
+        if chunk is None:
+            provider.record_success(time.monotonic() - started_at)
+            return
+
+        try:
+            yield chunk
+            async for chunk in stream:
+                yield chunk
+        except Exception:
+            # Chunks already went to the caller, another provider can't continue them
+            provider.record_error(self.cooldown)
+            raise
+        finally:
+            await stream.aclose()
+
+        provider.record_success(time.monotonic() - started_at)
+
+    def stats(self):
+        """
+        Get the request, error, hedge and latency counters of every provider.
+
+        Returns:
+            List[dict]: One entry per provider
+        """
+        return [provider.stats() for provider in self.providers]
@@ -1,13 +1,21 @@
 import streamlit as st
 import os
-import requests
 from dotenv import load_dotenv
 import json
 from datetime import datetime
 
-from  githubapi import  get_repo_tree, create_branch, get_file_content, commit_test_changes, print_tree_structure, print_repository_structure
-from model import model, generate_code, ResponseFormatter
-from githubapi import get_repository_files
+from  githubapi import  get_repo_tree, print_tree_structure, get_repository_blobs_async, get_head_commit
+from commitstage import CommitStage
+from incremental import plan_incremental_run, save_processed_commit, get_test_file_name
+from model import model, ResponseFormatter
+from planner import GenerationBudget, prioritize_files, get_recent_churn, TIME_BUDGET_SECONDS, TOKEN_BUDGET
+from context import ContextBuilder
+from retrieval import RetrievalIndex
+from treerender import render_tree
+from depgraph import load_dependency_graph
+from generation import generate_all, GENERATION_CONCURRENCY, PartialTestWriter, STREAM_RESPONSES
+from gencache import GENERATION_CACHE_ENABLED
+from githubapi import get_repository_files, client, GitHubClient
 
 import asyncio
 import time
@@ -216,6 +224,18 @@ def main():
                     value=True,
                     help="Generate tests for edge cases and error conditions"
                 )
+                
+                use_cache = st.checkbox(
+                    "Reuse Cached Responses",
+                    value=GENERATION_CACHE_ENABLED,
+                    help="Reuse earlier AI responses for files and context that haven't changed"
+                )
+                
+                stream_responses = st.checkbox(
+                    "Stream Responses",
+                    value=STREAM_RESPONSES,
+                    help="Show and save the tests of each file while they are being generated"
+                )
             
             with col2:
                 test_timeout = st.number_input(
@@ -231,6 +251,25 @@ def main():
                     value=True,
                     help="Run tests in parallel when possible"
                 )
+            
+            col3, col4 = st.columns(2)
+            
+            with col3:
+                time_budget = st.number_input(
+                    "Time Budget (minutes)",
+                    min_value=0,
+                    value=int(TIME_BUDGET_SECONDS // 60),
+                    help="Stop generating once the run has taken this long (0 for no limit)"
+                )
+            
+            with col4:
+                token_budget = st.number_input(
+                    "Token Budget",
+                    min_value=0,
+                    value=TOKEN_BUDGET,
+                    step=10000,
+                    help="Stop generating once this many LLM tokens are spent (0 for no limit)"
+                )
         
         # Generate tests button
         # Check if repository has been validated
@@ -265,7 +304,11 @@ def main():
                     max_tests_per_file,
                     include_edge_cases,
                     test_timeout,
-                    parallel_tests
+                    parallel_tests,
+                    time_budget * 60,
+                    token_budget,
+                    use_cache,
+                    stream_responses
                 ))
                 
                 if result.get("success"):
@@ -295,6 +338,14 @@ GROQ_API_KEY={groq_api_key}
     except Exception as e:
         st.error(f"❌ Error saving configuration: {str(e)}")
 
+def session_client(github_token):
+    """GitHub client of this browser session, so one user's token never authenticates another's requests"""
+    if st.session_state.get('github_client_token') != github_token:
+        # The response cache is keyed by the Authorization header, so sessions can share it
+        st.session_state.github_client = GitHubClient(github_token, cache=client.cache)
+        st.session_state.github_client_token = github_token
+    return st.session_state.github_client
+
 def validate_repository(repo_url, github_token):
     """Validate if the repository is accessible"""
     if not repo_url or not github_token:
@@ -311,12 +362,9 @@ def validate_repository(repo_url, github_token):
         
         # GitHub API endpoint
         url = f"https://api.github.com/repos/{owner}/{repo}"
-        headers = {
-            "Authorization": f"token {github_token}",
-            "Accept": "application/vnd.github.v3+json"
-        }
         
-        response = requests.get(url, headers=headers)
+        # Reruns revalidate with ETags instead of spending quota
+        response = session_client(github_token).get(url)
         print(response.json())
         return response.status_code == 200
     
@@ -324,9 +372,12 @@ def validate_repository(repo_url, github_token):
         return False
 
 async def generate_tests(repo_url, github_token, groq_api_key, test_framework, test_coverage, 
-                  test_folder, max_tests_per_file, include_edge_cases, test_timeout, parallel_tests):
+                  test_folder, max_tests_per_file, include_edge_cases, test_timeout, parallel_tests,
+                  time_budget=TIME_BUDGET_SECONDS, token_budget=TOKEN_BUDGET, use_cache=GENERATION_CACHE_ENABLED,
+                  stream_responses=STREAM_RESPONSES):
     """Generate tests using the Hiro backend"""
     start_time = time.time()
+    budget = GenerationBudget(time_budget, token_budget)
     try:
         # Initialize llm
         st.info("🔄 Initializing AI model...")
@@ -334,47 +385,92 @@ async def generate_tests(repo_url, github_token, groq_api_key, test_framework, t
         
         repo_name = repo_url.split('/')[-1]
     
+        # Pin the run to the current head commit
+        head_sha = get_head_commit(repo_url)
+        
         # Get and print the tree structure
         st.info("📂 Fetching repository tree structure...")
-        tree_data = get_repo_tree(repo_url)
+        tree_data = get_repo_tree(repo_url, ref=head_sha)
         # print_tree_structure(tree_data)
         
         folder = test_folder
         
+        # Only files added or modified since the last processed commit get new tests
+        changed_paths, removed_files = plan_incremental_run(repo_url, head_sha, tree_data, folder)
+        
+        # Every file is fetched for the prompt context, unchanged ones come from the blob cache
         # print("\nRepository Structure with Content:")
         st.info("📄 Gathering repository file contents...")
-        full_context, all_files = [], []
-        full_context, all_files = print_repository_structure(repo_url, full_context, all_files, folder)
-        st.success(f"✅ All files acquired: {len(all_files)} files found.")
+        full_context, all_files, file_contents = [], [], {}
+        full_context, all_files = await get_repository_blobs_async(repo_url, tree_data, full_context, all_files, folder, file_contents)
+        st.success(f"✅ All files acquired: {len(all_files)} files, {sum(1 for path in file_contents if path in changed_paths)} changed.")
         
-        # Join all content with newlines
-        full_context_str = "\n".join(full_context)
+        # Which fetched files import which, cached per tree
+        graph = load_dependency_graph(tree_data['sha'], file_contents)
+        
+        # Each prompt gets the code chunks most relevant to its target, within the token budget
+        context_builder = ContextBuilder(file_contents, render_tree(tree_data), graph=graph, index=RetrievalIndex())
         
         # Progress tracking
-        total_files = len(all_files)
+        total_files = sum(1 for path in file_contents if path in changed_paths)
         processed_files = 0
         
-        for path in all_files:
-            user_prompt = "Generate a test function for this file"
-            
-            file_content = get_file_content(repo_url, f"{path}")
-            
-            file_ext = path.split(".")[-1]
+        test_files_folder = f'server/hiro-tests/{repo_name}'
+        metadata_file_path = os.path.join(test_files_folder, 'metadata.md')
+        generated_files = []
         
+        # Push finished tests in batches while generation continues
+        st.info("🌱 Creating 'hiro-tests' branch in the repository...")
+        committer = CommitStage(repo_url, extra_files=[metadata_file_path])
+        await committer.start()
+        
+        # Drop the tests of files deleted since the last run
+        for path in removed_files:
+            test_file_name = get_test_file_name(path)
+            test_file_path = os.path.join(test_files_folder, test_file_name)
+            if os.path.exists(test_file_path):
+                os.remove(test_file_path)
+            committer.delete(test_file_name)
+        
+        # Most valuable files first, within the run's time and token budget
+        churn = get_recent_churn(repo_url, head_sha)
+        
+        user_prompt = "Generate a test function for this file"
+        failed_files = []
+        
+        # Tests in progress, one live code view per streaming file
+        live_view = st.container()
+        live_files = {}
+        
+        def show_partial(path, code):
+            if path not in live_files:
+                live_files[path] = live_view.empty()
+            with live_files[path].container():
+                st.caption(f"✍️ Writing tests for `{path}`...")
+                st.code(code, language=None)
+        
+        # Test files fill up while their responses stream in, an interrupted run keeps what was generated
+        partial_writer = PartialTestWriter(test_files_folder, on_update=show_partial) if stream_responses else None
+        
+        # Requests run concurrently, each finished test is written as soon as it arrives
+        st.info(f"🤖 Generating tests for {total_files} files, {GENERATION_CONCURRENCY} at a time...")
+        target_files = [path for path in prioritize_files(file_contents, tree_data, churn, graph) if path in changed_paths]
+        async for path, response, error in generate_all(llm, target_files, context_builder, user_prompt, budget, use_cache=use_cache, on_partial=partial_writer):
             processed_files += 1
-            st.info(f"🤖 Generating tests for `{path}`... ({processed_files}/{total_files})")
-            generated_code = await generate_code(llm, str(tree_data), full_context_str, file_content, user_prompt)
-            
-            response = generated_code.tool_calls[0]["args"]
+            if path in live_files:
+                live_files.pop(path).empty()
+            if error:
+                st.error(f"❌ Failed to generate tests for `{path}`: {error} ({processed_files}/{total_files})")
+                failed_files.append(path)
+                continue
             
+            st.info(f"🤖 Generated tests for `{path}` ({processed_files}/{total_files})")
             #  print("Generated Code:", response['code'])
             st.info(f"📝 Metadata for `{path}`: {response['metadata']}")
             st.info(f"📦 Required Packages for `{path}`: {response['packages']}")
             
-            test_files_folder = f'server/hiro-tests/{repo_name}'
-            
             # Create test file with appropriate extension
-            test_file_name = f"test_{path.split('/')[-1].split('.')[0]}.test.{file_ext}"
+            test_file_name = get_test_file_name(path)
             test_file_path = os.path.join(test_files_folder, test_file_name)
             
             # Create tests directory if it doesn't exist
@@ -383,10 +479,12 @@ async def generate_tests(repo_url, github_token, groq_api_key, test_framework, t
             # Write generated test code to file
             with open(test_file_path, 'w') as f:
                 f.write(response['code'])
+            if partial_writer:
+                partial_writer.finish(path)
+            generated_files.append(test_file_path)
             st.success(f"✅ Test file created: `{test_file_path}`")
                 
             # Write metadata to markdown file
-            metadata_file_path = os.path.join(test_files_folder, 'metadata.md')
             mode = 'a' if os.path.exists(metadata_file_path) else 'w'
             with open(metadata_file_path, mode) as f:
                 f.write(response['metadata'])
@@ -394,15 +492,25 @@ async def generate_tests(repo_url, github_token, groq_api_key, test_framework, t
                 for package in response['packages']:
                     f.write(f"- {package}\n")
                 st.info(f"🗒️ Metadata file updated: `{metadata_file_path}`")
+            
+            # Queue the finished test for the next batch commit
+            committer.add(test_file_path)
                 
-        st.info("🌱 Creating 'hiro-tests' branch in the repository...")
-        create_branch(repo_url, "hiro-tests")
+        # Commit whatever is still queued
+        st.info("📤 Committing the remaining tests...")
+        commit_results = await committer.close()
+        for result in commit_results:
+            st.info(f"📤 {result}")
         
-        # Loop through all files in the test folder and commit each one
-        for filename in os.listdir(test_files_folder):
-            file_path = os.path.join(test_files_folder, filename)
-            if os.path.isfile(file_path):
-                commit_test_changes(repo_url, f"generated test cases for {filename}", file_path)
+        report = budget.report()
+        for entry in llm.stats():
+            st.info(f"📡 {entry['name']}: {entry['requests']} requests, {entry['errors']} errors, {entry['hedges_won']} hedges won, {entry['hedges_lost']} lost, p95 {entry['p95_seconds']}s")
+        if report['skipped']:
+            st.warning(f"⏱️ Budget reached, skipped {len(report['skipped'])} of {total_files} files")
+        
+        # Skipped and failed files must be picked up again by the next run
+        if not report['skipped'] and not failed_files and not any(result.startswith("Failed") for result in commit_results):
+            save_processed_commit(repo_url, head_sha, folder)
         
         st.success("🚀 Done! Committed changes to GitHub.")
         
@@ -425,9 +533,12 @@ async def generate_tests(repo_url, github_token, groq_api_key, test_framework, t
         return {
             "success": True,
             "repository": repo_name,
-            "files_processed": len(all_files),
-            "tests_generated": len(os.listdir(test_files_folder)),
-            "test_files": all_files,
+            "files_processed": len(report['processed']),
+            "tests_generated": len(generated_files),
+            "test_files": report['processed'],
+            "skipped_files": report['skipped'],
+            "failed_files": failed_files,
+            "tokens_used": report['tokens_used'],
             "coverage_percentage": 85,
             "execution_time": execution_time_str,
             "branch_created": "hiro-tests",
@@ -456,11 +567,26 @@ def display_results(result):
     with col3:
         st.metric("Execution Time", result["execution_time"])
     
+    with col4:
+        st.metric("Tokens Used", result["tokens_used"])
+    
     # Test files
     st.subheader("📄 Generated Test Files")
     for test_file in result["test_files"]:
         st.markdown(f"• `{test_file}`")
     
+    # Files the time or token budget left out
+    if result["skipped_files"]:
+        st.subheader("⏭️ Skipped Files")
+        for entry in result["skipped_files"]:
+            st.markdown(f"• `{entry['path']}`: {entry['reason']}")
+    
+    # Files whose generation failed or timed out
+    if result["failed_files"]:
+        st.subheader("⚠️ Failed Files")
+        for path in result["failed_files"]:
+            st.markdown(f"• `{path}`")
+    
     # Actions
     st.subheader("🚀 Next Steps")
     
@@ -0,0 +1,10 @@
+"""
+Shared setup of the server tests: the server modules are imported as top-level modules, as app.py does.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# model.py reads the key on import, the tests never call the provider
+os.environ.setdefault('GROQ_API_KEY', 'test')
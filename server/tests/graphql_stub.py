@@ -0,0 +1,138 @@
+"""
+Local stand-in for the GitHub GraphQL API, serving blobs from a directory.
+
+Answers the blob queries built by githubapi.query_blobs_graphql, looking blobs
+up either by git blob SHA or by "ref:path" expression (the ref is ignored).
+
+Run it on its own and point the GraphQL backend at it:
+
+    python tests/graphql_stub.py path/to/checkout --port 8765
+    GITHUB_GRAPHQL_URL=http://localhost:8765/graphql python app.py
+
+or run it with --check to fetch the directory through the GraphQL backend once.
+tests/test_graphql_stub.py runs the backend against it on a temporary checkout.
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blobcache import git_blob_sha
+
+FIELD_PATTERN = re.compile(r'(\w+): object\((oid|expression): \$(\w+)\)')
+
+
+def load_blobs(directory: str):
+    """Read every file under directory, keyed by both path and blob SHA."""
+    by_path, by_oid = {}, {}
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if d != '.git']
+        for name in files:
+            full_path = os.path.join(root, name)
+            with open(full_path, 'rb') as f:
+                data = f.read()
+            path = os.path.relpath(full_path, directory).replace(os.sep, '/')
+            blob = {'oid': git_blob_sha(data), 'data': data, 'path': path}
+            by_path[path] = blob
+            by_oid[blob['oid']] = blob
+    return by_path, by_oid
+
+
+def blob_node(blob):
+    try:
+        text = blob['data'].decode('utf-8')
+        binary = False
+    except UnicodeDecodeError:
+        text, binary = None, True
+    return {'oid': blob['oid'], 'text': text, 'isBinary': binary, 'isTruncated': False}
+
+
+def make_handler(directory: str):
+    by_path, by_oid = load_blobs(directory)
+
+    class GraphQLHandler(BaseHTTPRequestHandler):
+        requests_served = 0
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            variables = body.get('variables', {})
+            GraphQLHandler.requests_served += 1
+
+            repository = {}
+            for alias, by, var in FIELD_PATTERN.findall(body['query']):
+                value = variables.get(var, '')
+                if by == 'oid':
+                    blob = by_oid.get(value)
+                else:
+                    blob = by_path.get(value.split(':', 1)[-1])
+                repository[alias] = blob_node(blob) if blob else None
+
+            payload = json.dumps({'data': {'repository': repository}}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return GraphQLHandler
+
+
+def serve(directory: str, port: int = 0):
+    """Start the stand-in server in a background thread and return it."""
+    handler = make_handler(directory)
+    server = ThreadingHTTPServer(('localhost', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check(directory: str):
+    """Fetch every file in directory through the GraphQL backend and compare it with the disk."""
+    from githubapi import get_repository_blobs_graphql
+    from blobcache import blob_cache
+
+    # Force every blob through the stand-in server
+    blob_cache.get = lambda sha: None
+    blob_cache.put = lambda sha, content: None
+
+    server = serve(directory)
+    handler = server.RequestHandlerClass
+    by_path, _ = load_blobs(directory)
+
+    tree_data = {'tree': [
+        {'type': 'blob', 'path': path, 'sha': blob['oid'], 'size': len(blob['data'])}
+        for path, blob in by_path.items()
+    ]}
+    file_contents = {}
+    url = f"http://localhost:{server.server_address[1]}/graphql"
+    _, all_files = get_repository_blobs_graphql('https://github.com/local/stub', tree_data, [], [], '', file_contents, url)
+    server.shutdown()
+
+    mismatched = [path for path in all_files if file_contents[path].encode('utf-8') != by_path[path]['data']]
+    print(f"Fetched {len(all_files)} files in {handler.requests_served} requests, {len(mismatched)} mismatched")
+    return not mismatched
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--check', action='store_true')
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check(args.directory) else 1)
+
+    server = serve(args.directory, args.port)
+    print(f"Serving {args.directory} at http://localhost:{args.port}/graphql")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
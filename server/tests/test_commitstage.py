@@ -0,0 +1,99 @@
+"""
+Queues tests on a CommitStage with the GitHub calls replaced, to check when batches are committed.
+
+    python -m pytest tests/test_commitstage.py
+"""
+import asyncio
+
+import pytest
+
+import commitstage
+from commitstage import CommitStage
+
+
+@pytest.fixture
+def commits(monkeypatch):
+    """The (files, deletes) of every commit made, and a list whose entries each fail one commit."""
+    made = []
+    failures = []
+
+    def commit_test_files(github_url, message, files, deletes, branch):
+        if failures:
+            failures.pop(0)
+            return "Failed to commit changes: 502"
+        made.append((list(files), list(deletes)))
+        return f"Committed {len(files)} files"
+
+    monkeypatch.setattr(commitstage, 'create_branch', lambda github_url, branch: f"Created {branch}")
+    monkeypatch.setattr(commitstage, 'commit_test_files', commit_test_files)
+    return made, failures
+
+
+def test_full_batch_commits_right_away(commits):
+    made, _ = commits
+
+    async def scenario():
+        stage = CommitStage('https://github.com/owner/repo', batch_size=2, flush_seconds=60)
+        await stage.start()
+        stage.add('tests/test_a.py')
+        stage.add('tests/test_b.py')
+        await asyncio.sleep(0.05)
+        committed = list(made)
+        await stage.close()
+        return committed
+
+    assert asyncio.run(scenario()) == [(['tests/test_a.py', 'tests/test_b.py'], [])]
+
+
+def test_lone_file_commits_after_flush_seconds(commits):
+    made, _ = commits
+
+    async def scenario():
+        stage = CommitStage('https://github.com/owner/repo', batch_size=10, flush_seconds=0.1)
+        await stage.start()
+        stage.add('tests/test_a.py')
+        await asyncio.sleep(0.03)
+        before = list(made)
+        await asyncio.sleep(0.2)
+        after = list(made)
+        await stage.close()
+        return before, after
+
+    before, after = asyncio.run(scenario())
+    assert before == []
+    assert after == [(['tests/test_a.py'], [])]
+
+
+def test_close_commits_the_rest_and_deletes(commits):
+    made, _ = commits
+
+    async def scenario():
+        stage = CommitStage('https://github.com/owner/repo', batch_size=10, flush_seconds=60)
+        await stage.start()
+        stage.add('tests/test_a.py')
+        stage.add('tests/test_a.py')
+        stage.delete('test_old.test.py')
+        results = await stage.close()
+        return stage, results
+
+    stage, results = asyncio.run(scenario())
+    assert made == [(['tests/test_a.py'], ['test_old.test.py'])]
+    assert results == ["Committed 1 files"] and stage.committed_files == 1
+
+
+def test_failed_commit_keeps_its_files_queued(commits):
+    made, failures = commits
+    failures.append('fail')
+
+    async def scenario():
+        stage = CommitStage('https://github.com/owner/repo', batch_size=10, flush_seconds=60)
+        await stage.start()
+        stage.add('tests/test_a.py')
+        await stage.flush()
+        stage.add('tests/test_b.py')
+        return stage, await stage.close()
+
+    stage, results = asyncio.run(scenario())
+    assert results[0].startswith("Failed")
+    assert made == [(['tests/test_a.py', 'tests/test_b.py'], [])]
+    assert stage.committed_files == 2
@@ -0,0 +1,177 @@
+"""
+Runs the generation pipeline against a fake model to check batching, streaming and their fallbacks.
+
+    python -m pytest tests/test_generation.py
+"""
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+import generation
+from context import ContextBuilder
+from gencache import GenerationCache
+from generation import generate_all, request_tests
+from model import parse_batch_response
+
+FILES = {
+    'src/a.py': "def a():\n    return 1\n",
+    'src/b.py': "def b():\n    return 2\n",
+    'src/c.py': "def c():\n    return 3\n",
+}
+
+
+def call(code, file_path='', **fields):
+    args = {'code': code, 'metadata': 'Run with pytest', 'packages': ['pytest'], 'file_path': file_path}
+    args.update(fields)
+    return {'name': 'ResponseFormatter', 'args': {key: value for key, value in args.items() if value is not None}, 'id': code}
+
+
+def message(*calls):
+    return AIMessage(content='', tool_calls=list(calls))
+
+
+class FakeModel:
+    """Answers batched requests with batch_answer and single-file requests with a complete call."""
+
+    def __init__(self, batch_answer):
+        self.batch_answer = batch_answer
+        self.single_requests = []
+
+    async def ainvoke(self, messages):
+        if 'ResponseFormatter call for each' in messages[1]['content']:
+            return self.batch_answer
+        path = next(path for path in FILES if FILES[path] in messages[1]['content'])
+        self.single_requests.append(path)
+        return message(call(f"def test_{path[4]}_alone(): pass"))
+
+
+def run(llm, paths):
+    builder = ContextBuilder(FILES, '\n'.join(FILES))
+
+    async def collect():
+        return {path: (response, error) async for path, response, error in generate_all(llm, paths, builder, 'Write tests', use_cache=False, batch_tokens=1000)}
+
+    return asyncio.run(collect())
+
+
+def test_batch_calls_are_matched_by_path():
+    response = message(call('def test_b(): pass', './src/b.py'), call('def test_a(): pass', 'a.py'))
+
+    results = parse_batch_response(response, ['src/a.py', 'src/b.py'])
+
+    assert results['src/a.py']['code'] == 'def test_a(): pass'
+    assert results['src/b.py']['code'] == 'def test_b(): pass'
+
+
+def test_unlabelled_calls_are_matched_in_order_only_when_one_per_file():
+    one_per_file = message(call('def test_a(): pass'), call('def test_b(): pass'))
+    one_short = message(call('def test_a(): pass'))
+
+    assert parse_batch_response(one_per_file, ['src/a.py', 'src/b.py'])['src/b.py']['code'] == 'def test_b(): pass'
+    assert parse_batch_response(one_short, ['src/a.py', 'src/b.py']) == {}
+
+
+def test_batch_call_missing_a_field_is_dropped():
+    response = message(call('def test_a(): pass', 'src/a.py'), call('def test_b(): pass', 'src/b.py', metadata=None))
+
+    assert list(parse_batch_response(response, ['src/a.py', 'src/b.py'])) == ['src/a.py']
+
+
+def test_files_without_a_complete_answer_fall_back_to_single_requests():
+    llm = FakeModel(message(
+        call('def test_a(): pass', 'src/a.py'),
+        call('def test_b(): pass', 'src/b.py', packages=None),
+    ))
+
+    results = run(llm, list(FILES))
+
+    assert sorted(llm.single_requests) == ['src/b.py', 'src/c.py']
+    assert results['src/a.py'] == ({'code': 'def test_a(): pass', 'metadata': 'Run with pytest', 'packages': ['pytest'], 'file_path': 'src/a.py'}, None)
+    assert results['src/b.py'][0]['code'] == 'def test_b_alone(): pass'
+    assert all(error is None and set(response) >= {'code', 'metadata', 'packages'} for response, error in results.values())
+
+
+def test_failed_batch_retries_every_file_alone():
+    class BrokenBatch(FakeModel):
+        async def ainvoke(self, messages):
+            if 'ResponseFormatter call for each' in messages[1]['content']:
+                raise RuntimeError('context length exceeded')
+            return await super().ainvoke(messages)
+
+    llm = BrokenBatch(None)
+
+    results = run(llm, list(FILES))
+
+    assert sorted(llm.single_requests) == sorted(FILES)
+    assert all(error is None for _, error in results.values())
+
+
+def test_requests_are_bounded_and_a_slow_file_never_stops_the_others():
+    class SlowModel:
+        def __init__(self):
+            self.running = 0
+            self.peak = 0
+
+        async def ainvoke(self, messages):
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            try:
+                await asyncio.sleep(5 if FILES['src/a.py'] in messages[1]['content'] else 0.05)
+            finally:
+                self.running -= 1
+            return message(call('def test_x(): pass'))
+
+    llm = SlowModel()
+    builder = ContextBuilder(FILES, '\n'.join(FILES))
+
+    async def collect():
+        return [result async for result in generate_all(llm, list(FILES), builder, 'Write tests', concurrency=2, timeout=0.3, use_cache=False, batch_tokens=0)]
+
+    results = asyncio.run(collect())
+
+    assert llm.peak == 2
+    assert [path for path, _, _ in results][-1] == 'src/a.py'
+    assert {path: error for path, _, error in results} == {'src/a.py': 'timed out after 0.3s', 'src/b.py': None, 'src/c.py': None}
+
+
+class CutOffStream(FakeModel):
+    """Streams a call that stops inside its code, then answers the non-streamed retry with retry_answer."""
+
+    def __init__(self, retry_answer):
+        super().__init__(None)
+        self.retry_answer = retry_answer
+
+    async def astream(self, messages):
+        for part in ('{"code": "def test_a():', '\\n    assert'):
+            yield AIMessageChunk(content='', tool_call_chunks=[{'name': None, 'args': part, 'id': None, 'index': 0}])
+
+    async def ainvoke(self, messages):
+        return self.retry_answer
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = GenerationCache(str(tmp_path))
+    monkeypatch.setattr(generation, 'generation_cache', cache)
+    return cache
+
+
+def test_cut_off_stream_is_retried_without_streaming(cache):
+    llm = CutOffStream(message(call('def test_a(): pass')))
+    partial = []
+
+    _, response = asyncio.run(request_tests(llm, 'src/a.py', '', '', FILES['src/a.py'], 'Write tests', on_partial=partial.append))
+
+    assert partial == ['def test_a():', 'def test_a():\n    assert']
+    assert response['code'] == 'def test_a(): pass' and response['metadata'] == 'Run with pytest'
+    assert cache.stats()['misses'] == 1 and len(list(cache.store.directory.glob('*/*.json'))) == 1
+
+
+def test_incomplete_answer_is_never_cached(cache):
+    llm = CutOffStream(message(call('def test_a():\n    assert', metadata=None, packages=None)))
+
+    with pytest.raises(ValueError):
+        asyncio.run(request_tests(llm, 'src/a.py', '', '', FILES['src/a.py'], 'Write tests', on_partial=lambda code: None))
+
+    assert not list(cache.store.directory.glob('*/*.json'))
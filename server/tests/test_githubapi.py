@@ -0,0 +1,135 @@
+"""
+Sends requests through a GitHubClient whose HTTP session is replaced by canned responses.
+
+    python -m pytest tests/test_githubapi.py
+"""
+import time
+
+import requests
+
+from githubapi import GitHubClient, RateLimiter, ResponseCache
+
+API_URL = 'https://api.github.com/repos/owner/repo'
+
+
+def response(status_code=200, body=b'{}', headers=None, url=API_URL):
+    reply = requests.Response()
+    reply.status_code = status_code
+    reply._content = body
+    reply._content_consumed = True
+    reply.headers.update(headers or {})
+    reply.url = url
+    return reply
+
+
+class FakeSession:
+    """Answers requests with the queued responses, in order, and records the headers sent."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent = []
+        self.headers = {}
+
+    def request(self, method, url, **kwargs):
+        self.sent.append(kwargs.get('headers') or {})
+        return self.responses.pop(0)
+
+
+def client_with(*responses, limiter=None, cache=None):
+    client = GitHubClient(token=None, retries=2, limiter=limiter, cache=cache)
+    client.session = FakeSession(*responses)
+    return client
+
+
+def test_not_modified_is_served_from_the_cache():
+    client = client_with(
+        response(body=b'{"name": "repo"}', headers={'ETag': '"v1"'}),
+        response(304),
+    )
+
+    first = client.get(API_URL)
+    second = client.get(API_URL)
+
+    assert client.session.sent[1]['If-None-Match'] == '"v1"'
+    assert second.status_code == 200 and second.json() == first.json() == {'name': 'repo'}
+    assert client.cache_stats()['hits'] == 1
+
+
+def test_changed_response_replaces_the_cached_one():
+    client = client_with(
+        response(body=b'{"v": 1}', headers={'ETag': '"v1"'}),
+        response(body=b'{"v": 2}', headers={'ETag': '"v2"'}),
+        response(304),
+    )
+
+    client.get(API_URL)
+    client.get(API_URL)
+
+    assert client.get(API_URL).json() == {'v': 2}
+    assert client.cache_stats()['entries'] == 1
+
+
+def test_blobs_and_large_bodies_are_not_cached():
+    cache = ResponseCache(max_entry_bytes=10)
+    client = client_with(
+        response(body=b'x' * 5, headers={'ETag': '"blob"'}, url=f"{API_URL}/git/blobs/abc"),
+        response(body=b'x' * 50, headers={'ETag': '"big"'}),
+        cache=cache,
+    )
+
+    client.get(f"{API_URL}/git/blobs/abc")
+    client.get(API_URL)
+
+    assert cache.stats()['entries'] == 0 and cache.stats()['bytes'] == 0
+
+
+def test_cache_is_bounded_by_bytes():
+    cache = ResponseCache(max_bytes=25)
+    client = client_with(*(response(body=b'x' * 10, headers={'ETag': f'"{number}"'}) for number in range(3)), cache=cache)
+
+    for number in range(3):
+        client.get(f"{API_URL}/{number}")
+
+    assert cache.stats()['entries'] == 2 and cache.stats()['bytes'] == 20
+
+
+def test_too_many_requests_waits_retry_after_and_retries():
+    client = client_with(
+        response(429, headers={'Retry-After': '0.2'}),
+        response(body=b'{"ok": true}'),
+    )
+
+    started_at = time.monotonic()
+    reply = client.get(API_URL)
+
+    assert reply.json() == {'ok': True}
+    assert time.monotonic() - started_at >= 0.2
+    assert len(client.session.sent) == 2
+
+
+def test_secondary_limit_backs_off_exponentially():
+    limiter = RateLimiter()
+
+    first = limiter.update(response(429))
+    second = limiter.update(response(429))
+    limiter.update(response(200))
+
+    assert second == 2 * first > 0
+    assert limiter.backoffs == 0
+
+
+def test_exhausted_quota_pauses_until_the_reset():
+    limiter = RateLimiter()
+
+    wait = limiter.update(response(200, headers={'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(time.time()) + 30)}))
+
+    assert wait == 0
+    assert limiter.paused_until - time.monotonic() > 25
+
+
+def test_quota_of_another_resource_is_ignored():
+    limiter = RateLimiter()
+
+    limiter.update(response(200, headers={'X-RateLimit-Resource': 'search', 'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(time.time()) + 30)}))
+
+    assert limiter.remaining is None and limiter.paused_until == 0
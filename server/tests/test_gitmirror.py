@@ -0,0 +1,79 @@
+"""
+Syncs a temporary local repository through the git mirror backend, offline over file://.
+
+    python -m pytest tests/test_gitmirror.py
+"""
+import pytest
+
+from gitmirror import run_git, sync_mirror, get_mirror_head, get_mirror_tree, get_repository_blobs_mirror, git_auth_env
+
+FILES = {
+    'src/app.py': "def main():\n    return 'app'\n",
+    'src/util/strings.js': "export const upper = (s) => s.toUpperCase();\n",
+    'vendor/lib.js': "module.exports = {};\n",
+    'README.md': "# Readme\n",
+    '.gitattributes': "src/generated.py linguist-generated\n",
+    'src/generated.py': "GENERATED = True\n",
+}
+
+GIT_IDENTITY = ['-c', 'user.name=Hiro', '-c', 'user.email=hiro@example.com']
+
+
+def commit(repo, files, message):
+    for path, content in files.items():
+        full_path = repo / path
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        full_path.write_text(content)
+    run_git(['add', '-A'], cwd=str(repo))
+    run_git(GIT_IDENTITY + ['commit', '--quiet', '-m', message], cwd=str(repo))
+    return run_git(['rev-parse', 'HEAD'], cwd=str(repo)).decode('utf-8').strip()
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = tmp_path / 'repo'
+    repo.mkdir()
+    run_git(['init', '--quiet'], cwd=str(repo))
+    commit(repo, FILES, 'initial')
+    return repo
+
+
+def fetch(url, mirror_dir, folder=''):
+    mirror_path = sync_mirror(url, str(mirror_dir))
+    tree_data = get_mirror_tree(mirror_path)
+    file_contents = {}
+    _, all_files = get_repository_blobs_mirror(url, tree_data, [], [], folder, file_contents, str(mirror_dir))
+    return mirror_path, all_files, file_contents
+
+
+def test_clone_skips_vendored_generated_and_non_code_files(repo, tmp_path):
+    _, all_files, file_contents = fetch(repo.as_uri(), tmp_path / 'mirrors')
+
+    assert sorted(all_files) == ['src/app.py', 'src/util/strings.js']
+    assert file_contents == {path: FILES[path] for path in all_files}
+
+
+def test_folder_limits_the_blobs_read(repo, tmp_path):
+    _, all_files, _ = fetch(repo.as_uri(), tmp_path / 'mirrors', folder='src/util')
+
+    assert all_files == ['src/util/strings.js']
+
+
+def test_resync_picks_up_new_commits(repo, tmp_path):
+    mirror_dir = tmp_path / 'mirrors'
+    fetch(repo.as_uri(), mirror_dir)
+    head = commit(repo, {'src/app.py': "def main():\n    return 'changed'\n", 'src/new.py': "X = 1\n"}, 'change')
+
+    mirror_path, all_files, file_contents = fetch(repo.as_uri(), mirror_dir)
+
+    assert get_mirror_head(mirror_path) == head
+    assert 'src/new.py' in all_files
+    assert file_contents['src/app.py'] == "def main():\n    return 'changed'\n"
+
+
+def test_token_is_passed_in_the_environment():
+    env = git_auth_env('https://github.com/owner/repo', token='secret-token')
+
+    assert env['GIT_CONFIG_KEY_0'] == 'http.extraHeader'
+    assert env['GIT_CONFIG_VALUE_0'].startswith('Authorization: Basic ')
+    assert git_auth_env('file:///tmp/repo', token='secret-token') == {}
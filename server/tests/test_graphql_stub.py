@@ -0,0 +1,73 @@
+"""
+Fetches a temporary checkout through the GraphQL backend and the local stand-in server.
+
+    python -m pytest tests/test_graphql_stub.py
+"""
+import pytest
+
+import graphql_stub
+from blobcache import blob_cache
+from githubapi import get_repository_blobs_graphql
+
+FILES = {
+    'src/app.py': "def main():\n    return 'app'\n",
+    'src/util/strings.js': "export const upper = (s) => s.toUpperCase();\n",
+    'lib/helpers.go': "package lib\n\nfunc Double(x int) int { return 2 * x }\n",
+    'README.md': "# Readme\n",
+    'docs/guide.md': "# Guide\n",
+    'node_modules/left-pad/index.js': "module.exports = () => {};\n",
+}
+
+
+@pytest.fixture
+def checkout(tmp_path):
+    for path, content in FILES.items():
+        full_path = tmp_path / path
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        full_path.write_text(content)
+    return tmp_path
+
+
+@pytest.fixture
+def stub(checkout, monkeypatch):
+    # Every blob has to come through the stand-in server
+    monkeypatch.setattr(blob_cache, 'get', lambda sha: None)
+    monkeypatch.setattr(blob_cache, 'put', lambda sha, content: None)
+
+    server = graphql_stub.serve(str(checkout))
+    server.RequestHandlerClass.requests_served = 0
+    yield server
+    server.shutdown()
+
+
+def fetch(checkout, server, folder=''):
+    by_path, _ = graphql_stub.load_blobs(str(checkout))
+    tree_data = {'tree': [
+        {'type': 'blob', 'path': path, 'sha': blob['oid'], 'size': len(blob['data'])}
+        for path, blob in by_path.items()
+    ]}
+    file_contents = {}
+    url = f"http://localhost:{server.server_address[1]}/graphql"
+    _, all_files = get_repository_blobs_graphql('https://github.com/local/stub', tree_data, [], [], folder, file_contents, url)
+    return all_files, file_contents
+
+
+def test_fetches_only_code_files(checkout, stub):
+    all_files, file_contents = fetch(checkout, stub)
+
+    assert sorted(all_files) == ['lib/helpers.go', 'src/app.py', 'src/util/strings.js']
+    assert file_contents == {path: FILES[path] for path in all_files}
+
+
+def test_limits_fetch_to_folder(checkout, stub):
+    all_files, file_contents = fetch(checkout, stub, folder='src')
+
+    assert sorted(all_files) == ['src/app.py', 'src/util/strings.js']
+    assert set(file_contents) == set(all_files)
+
+
+def test_batches_blobs_into_one_request(checkout, stub):
+    all_files, _ = fetch(checkout, stub)
+
+    assert len(all_files) == 3
+    assert stub.RequestHandlerClass.requests_served == 1
@@ -0,0 +1,104 @@
+"""
+Routes requests across fake providers to check ranking, failover and hedging.
+
+    python -m pytest tests/test_router.py
+"""
+import asyncio
+
+import pytest
+
+from router import LLMRouter, Provider
+
+
+class FakeModel:
+    """Answers with its name after a delay, or fails when given an error."""
+
+    def __init__(self, name, delay=0.0, error=None):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return self.name
+
+    async def astream(self, messages):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        for part in (self.name, '-', 'done'):
+            yield part
+
+
+def fake_provider(name, latencies=(), **kwargs):
+    provider = Provider(name, FakeModel(name, **kwargs))
+    provider.latencies.extend(latencies)
+    provider.first_chunk_latencies.extend(latencies)
+    return provider
+
+
+def test_fastest_provider_answers():
+    slow, fast = fake_provider('slow', [2.0] * 5), fake_provider('fast', [0.5] * 5)
+    router = LLMRouter([slow, fast], hedge=False)
+
+    assert asyncio.run(router.ainvoke([])) == 'fast'
+    assert slow.llm.calls == 0
+
+
+def test_failed_request_fails_over_and_cools_down():
+    broken, backup = fake_provider('broken', error=RuntimeError('503')), fake_provider('backup')
+    router = LLMRouter([broken, backup], hedge=False, cooldown=60)
+
+    assert asyncio.run(router.ainvoke([])) == 'backup'
+    assert broken.errors == 1
+    # Ranked last while cooling down, even with no latencies to compare
+    assert router.ranked()[0] is backup
+
+
+def test_all_providers_failing_raises_the_last_error():
+    router = LLMRouter([fake_provider('a', error=RuntimeError('a down')), fake_provider('b', error=RuntimeError('b down'))], hedge=False)
+
+    with pytest.raises(RuntimeError, match='b down'):
+        asyncio.run(router.ainvoke([]))
+
+
+def test_slow_request_is_hedged_and_cancelled():
+    stuck = fake_provider('stuck', [0.01] * 5, delay=5)
+    hedge = fake_provider('hedge', [0.02] * 5)
+    router = LLMRouter([stuck, hedge], hedge_min_samples=5, hedge_min_delay=0.05)
+
+    assert asyncio.run(router.ainvoke([])) == 'hedge'
+    assert hedge.hedges_won == 1
+    assert stuck.hedges_lost == 1 and stuck.llm.cancelled == 1
+    # The time the cancelled request ran counts against its provider
+    assert max(stuck.latencies) >= 0.05
+
+
+def test_no_hedging_without_enough_samples():
+    slow, other = fake_provider('slow', [0.01] * 2, delay=0.2), fake_provider('other', [0.5] * 5)
+    router = LLMRouter([slow, other], hedge_min_samples=5, hedge_min_delay=0.05)
+
+    assert asyncio.run(router.ainvoke([])) == 'slow'
+    assert other.llm.calls == 0
+
+
+def test_stream_fails_over_before_the_first_chunk():
+    broken, backup = fake_provider('broken', error=RuntimeError('reset')), fake_provider('backup')
+    router = LLMRouter([broken, backup], hedge=False)
+
+    async def collect():
+        return [chunk async for chunk in router.astream([])]
+
+    assert asyncio.run(collect()) == ['backup', '-', 'done']
+    assert broken.errors == 1
+    assert len(backup.first_chunk_latencies) == 1 and len(backup.latencies) == 1
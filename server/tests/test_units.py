@@ -0,0 +1,75 @@
+"""
+Splits large files into units and merges the units' generated tests back into one file.
+
+    python -m pytest tests/test_units.py
+"""
+import ast
+
+from units import split_units, merge_unit_results
+
+LARGE_MODULE = "import os\n\nLIMIT = 3\n\n" + "\n\n".join(
+    f"def step_{number}(x):\n" + "    x = x + LIMIT\n" * 60 + "    return x\n" for number in range(4)
+) + "\n\nclass Runner:\n    def run(self):\n        return step_0(1)\n"
+
+
+def unit(code, metadata='Run with the default test runner', packages=()):
+    return {'code': code, 'metadata': metadata, 'packages': list(packages)}
+
+
+def test_split_keeps_every_definition_in_order():
+    header, units = split_units('pkg/steps.py', LARGE_MODULE, max_tokens=400)
+
+    assert header == "import os\n\nLIMIT = 3"
+    assert len(units) > 1
+    assert [name for piece in units for name in piece['names']] == ['step_0', 'step_1', 'step_2', 'step_3', 'Runner']
+    for piece in units:
+        assert all(f"{name}(" in piece['text'] or f"class {name}:" in piece['text'] for name in piece['names'])
+
+
+def test_split_stays_under_the_unit_limit():
+    _, units = split_units('pkg/steps.py', LARGE_MODULE, max_tokens=1, max_units=2)
+
+    assert len(units) <= 2
+
+
+def test_python_merge_dedupes_imports_and_renames_clashing_helpers():
+    merged = merge_unit_results('pkg/steps.py', [
+        unit("import pytest\nfrom pkg.steps import step_0\n\ndef helper():\n    return 1\n\ndef test_step():\n    assert step_0(helper())\n", packages=['pytest']),
+        unit("import pytest\nfrom pkg.steps import step_1\n\ndef helper():\n    return 2\n\ndef test_step():\n    assert step_1(helper())\n", packages=['pytest', 'hypothesis']),
+    ])
+
+    code = merged['code']
+    assert code.count('import pytest') == 1
+    assert 'def helper_2():' in code and 'assert step_1(helper_2())' in code
+    assert 'def test_step_2():' in code
+    names = [node.name for node in ast.parse(code).body if isinstance(node, ast.FunctionDef)]
+    assert len(names) == len(set(names))
+    assert merged['packages'] == ['pytest', 'hypothesis']
+    assert merged['metadata'] == 'Run with the default test runner'
+
+
+def test_go_merge_builds_one_import_block():
+    merged = merge_unit_results('pkg/steps.go', [
+        unit('package pkg\n\nimport "testing"\n\nfunc TestStep(t *testing.T) {}\n\nfunc init() {}\n'),
+        unit('package pkg\n\nimport (\n\t"fmt"\n\t"testing"\n)\n\nfunc TestStep(t *testing.T) { fmt.Println() }\n\nfunc init() {}\n'),
+    ])
+
+    code = merged['code']
+    assert code.startswith('package pkg\nimport (\n\t"testing"\n\t"fmt"\n)')
+    assert 'import "testing"' not in code
+    assert 'func TestStep_2(' in code
+    # Go allows several init functions, they are not renamed
+    assert code.count('func init()') == 2
+
+
+def test_java_merge_joins_units_into_the_first_class():
+    merged = merge_unit_results('src/Steps.java', [
+        unit('import org.junit.jupiter.api.Test;\n\npublic class StepsTest {\n    private int value = 1;\n\n    @Test\n    void stepOne() {}\n}\n'),
+        unit('import org.junit.jupiter.api.Test;\n\npublic class StepsSecondTest {\n    private int value = 2;\n\n    @Test\n    void stepTwo() { new StepsSecondTest(); }\n}\n'),
+    ])
+
+    code = merged['code']
+    assert code.count('class ') == 1 and 'public class StepsTest {' in code
+    assert 'new StepsTest()' in code
+    assert 'private int value = 1;' in code and 'private int value_2 = 2;' in code
+    assert code.rstrip().endswith('}')
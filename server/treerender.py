@@ -0,0 +1,116 @@
+from collections import Counter
+from typing import Dict, Any
+
+from classifier import FileClassifier, default_classifier
+from context import count_tokens, fit_tokens, TREE_TOKEN_BUDGET
+
+# Levels of detail tried in turn until the tree fits its budget:
+# (deepest level whose files are listed, files listed per directory)
+DETAIL_LEVELS = [(None, None), (None, 30), (None, 15), (6, 10), (4, 8), (3, 5), (2, 5), (1, 5), (0, 0)]
+
+INDENT = '  '
+
+# Rendered trees by (tree SHA, token budget)
+rendered_trees = {}
+
+def build_trie(tree_data: Dict[str, Any], classifier: FileClassifier = default_classifier):
+    """
+    Build a nested dict of the files of a tree, leaving out vendored and built directories.
+
+    Args:
+        tree_data (Dict[str, Any]): The recursive tree data from get_repo_tree
+        classifier (FileClassifier): Decides which directories are vendored
+
+    Returns:
+        Dict[str, Any]: Directory name -> sub-trie, file name -> None
+    """
+    trie = {}
+    for item in tree_data.get('tree', []):
+        if item['type'] != 'blob':
+            continue
+        parts = item['path'].split('/')
+        if len(parts) > 1 and classifier.is_vendored_dir('/'.join(parts[:-1])):
+            continue
+
+        node = trie
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = None
+    return trie
+
+def count_files(node: Dict[str, Any]):
+    return sum(1 if child is None else count_files(child) for child in node.values())
+
+def file_extensions(node: Dict[str, Any], extensions: Counter = None):
+    extensions = Counter() if extensions is None else extensions
+    for name, child in node.items():
+        if child is None:
+            extensions['.' + name.rsplit('.', 1)[-1] if '.' in name[1:] else name] += 1
+        else:
+            file_extensions(child, extensions)
+    return extensions
+
+def render_node(node: Dict[str, Any], depth: int, max_depth: int, max_files: int, lines: list):
+    """Append the lines of a trie node, directories first."""
+    directories = sorted(name for name, child in node.items() if child is not None)
+    files = sorted(name for name, child in node.items() if child is None)
+
+    for name in directories:
+        child = node[name]
+        # Collapse chains of directories holding a single directory, e.g. src/main/java/com/acme/
+        label = name
+        while len(child) == 1 and next(iter(child.values())) is not None:
+            sub_name, child = next(iter(child.items()))
+            label = f"{label}/{sub_name}"
+
+        total = count_files(child)
+        files_label = f"{total} file" if total == 1 else f"{total} files"
+        if max_depth is not None and depth >= max_depth:
+            kinds = ', '.join(f"{count} {extension}" for extension, count in file_extensions(child).most_common(3))
+            lines.append(f"{INDENT * depth}{label}/ ({files_label}: {kinds})")
+            continue
+
+        lines.append(f"{INDENT * depth}{label}/ ({files_label})")
+        render_node(child, depth + 1, max_depth, max_files, lines)
+
+    shown = files if max_files is None else files[:max_files]
+    lines.extend(f"{INDENT * depth}{name}" for name in shown)
+    if len(files) > len(shown):
+        lines.append(f"{INDENT * depth}... {len(files) - len(shown)} more files")
+
+def render_tree(tree_data: Dict[str, Any], max_tokens: int = TREE_TOKEN_BUDGET, classifier: FileClassifier = default_classifier):
+    """
+    Render a repository tree as a compact indented listing that fits a token budget.
+
+    Directories show how many files they hold and single-directory chains are
+    collapsed into one line. When the full listing is too long, files per
+    directory and then depth are cut until it fits; directories below the cut
+    are summarized by their most common file types. The result is memoized
+    per tree SHA and budget, so it is rendered once per snapshot.
+
+    Args:
+        tree_data (Dict[str, Any]): The recursive tree data from get_repo_tree
+        max_tokens (int): Token budget of the rendered tree
+        classifier (FileClassifier): Decides which directories are vendored
+
+    Returns:
+        str: The rendered tree
+    """
+    key = (tree_data.get('sha'), max_tokens)
+    if key[0] and key in rendered_trees:
+        return rendered_trees[key]
+
+    trie = build_trie(tree_data, classifier)
+    rendered = ''
+    for max_depth, max_files in DETAIL_LEVELS:
+        lines = []
+        render_node(trie, 0, max_depth, max_files, lines)
+        rendered = '\n'.join(lines)
+        if count_tokens(rendered) <= max_tokens:
+            break
+    else:
+        rendered = fit_tokens(rendered, max_tokens)
+
+    if key[0]:
+        rendered_trees[key] = rendered
+    return rendered
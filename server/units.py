@@ -0,0 +1,352 @@
+import os
+import re
+import ast
+from typing import Dict, List, Any
+
+from context import count_tokens
+from retrieval import split_chunks
+
+# Files over UNIT_SPLIT_TOKENS are tested unit by unit, with units of about
+# UNIT_TOKEN_BUDGET tokens and at most MAX_UNITS_PER_FILE requests per file
+UNIT_SPLIT_TOKENS = int(os.getenv('HIRO_UNIT_SPLIT_TOKENS', 3000))
+UNIT_TOKEN_BUDGET = int(os.getenv('HIRO_UNIT_TOKENS', 1500))
+MAX_UNITS_PER_FILE = int(os.getenv('HIRO_MAX_UNITS_PER_FILE', 12))
+
+# Lines of the module header (imports, constants) sent along with every unit
+MAX_HEADER_LINES = 60
+
+# Top-level definitions of generated tests, renamed when two units define the same name
+DEFINITION_PATTERNS = {
+    'python': re.compile(r'^(?:async\s+def|def|class)\s+(\w+)', re.MULTILINE),
+    'go': re.compile(r'^(?:func|type|var|const)\s+(\w+)', re.MULTILINE),
+    'js': re.compile(r'^(?:export\s+)?(?:default\s+)?(?:async\s+)?(?:function\*?|class|const|let|var)\s+(\w+)', re.MULTILINE),
+}
+
+# Go allows several of these per package
+GO_REPEATABLE_NAMES = {'init', '_'}
+
+# The test class of a Java or Kotlin unit, with its annotations and modifiers
+JVM_CLASS_PATTERN = re.compile(r'^(?:@[\w.]+(?:\([^)]*\))?\s*)*(?:(?:public|final|abstract|open|internal)\s+)*class\s+(\w+)[^{]*\{', re.MULTILINE)
+
+# Fields and methods declared directly in a Java or Kotlin class body
+JVM_MEMBER_PATTERN = re.compile(
+    r'^\s*(?:(?:public|protected|private|internal|static|final|abstract|synchronized|override|lateinit|open|suspend)\s+)*'
+    r'(?:(?:fun|val|var)\s+(?:<[^>]+>\s*)?(\w+)|(?:<[^>]+>\s+)?[\w.<>\[\],?]+\s+(\w+)\s*(?:\(|=[^;]*;|;))'
+)
+
+def python_definitions(content: str, max_tokens: int):
+    """
+    Split a Python module into its top-level definitions, splitting large classes by method.
+
+    Args:
+        content (str): Content of the module
+        max_tokens (int): Classes over this size are split into method groups
+
+    Returns:
+        tuple: The module header and a list of (name, start line, text) definitions
+    """
+    lines = content.splitlines()
+    tree = ast.parse(content)
+
+    definitions = []
+    header_end = len(lines)
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+
+        start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list]) - 1
+        header_end = min(header_end, start)
+        text = '\n'.join(lines[start:node.end_lineno])
+
+        methods = [child for child in node.body if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))] if isinstance(node, ast.ClassDef) else []
+        if not methods or count_tokens(text) <= max_tokens:
+            definitions.append((node.name, start + 1, text))
+            continue
+
+        # Each method group repeats the class line and body up to the first method
+        first_method = min([methods[0].lineno] + [decorator.lineno for decorator in methods[0].decorator_list]) - 1
+        class_header = '\n'.join(lines[start:first_method])
+        for method in methods:
+            method_start = min([method.lineno] + [decorator.lineno for decorator in method.decorator_list]) - 1
+            method_text = '\n'.join(lines[method_start:method.end_lineno])
+            definitions.append((f"{node.name}.{method.name}", method_start + 1, f"{class_header}\n    ...\n{method_text}"))
+
+    header = '\n'.join(lines[:header_end])
+    return header, definitions
+
+def split_units(path: str, content: str, max_tokens: int = UNIT_TOKEN_BUDGET, max_units: int = MAX_UNITS_PER_FILE):
+    """
+    Split a large file into units of functions and classes to test separately.
+
+    Python files are split with ast, other languages with the definition
+    parser of the retrieval index. Small neighbouring definitions are grouped
+    so no unit is much smaller than max_tokens.
+
+    Args:
+        path (str): Path of the file
+        content (str): Content of the file
+        max_tokens (int): Target size of a unit in tokens
+        max_units (int): Maximum number of units, units grow past max_tokens to stay under it
+
+    Returns:
+        tuple: The module header (imports and constants) and the units, each with 'names', 'start' and 'text'
+    """
+    header, definitions = '', []
+    if path.endswith(('.py', '.pyi')):
+        try:
+            header, definitions = python_definitions(content, max_tokens)
+        except (SyntaxError, ValueError):
+            pass
+
+    if not definitions:
+        for chunk in split_chunks(path, content):
+            if chunk['name'] == '<module>' and not definitions:
+                header += ('\n' if header else '') + chunk['text']
+            else:
+                definitions.append((chunk['name'], chunk['start'], chunk['text']))
+
+    header = '\n'.join(header.splitlines()[:MAX_HEADER_LINES])
+
+    # Grow the units if the file would need too many requests
+    definitions = [(name, start, text, count_tokens(text)) for name, start, text in definitions]
+    total = sum(tokens for _, _, _, tokens in definitions)
+    max_tokens = max(max_tokens, total // max(max_units, 1) + 1)
+    units = group_definitions(definitions, max_tokens)
+    while len(units) > max(max_units, 1):
+        # Greedy grouping leaves gaps at unit ends, so the even share can still take an extra unit
+        max_tokens += max_tokens // 4 + 1
+        units = group_definitions(definitions, max_tokens)
+
+    return header, units
+
+def group_definitions(definitions: List[tuple], max_tokens: int):
+    """
+    Group consecutive definitions into units of about max_tokens tokens.
+
+    Args:
+        definitions (List[tuple]): (name, start line, text, tokens) of each definition, in file order
+        max_tokens (int): A unit is closed once the next definition would take it past this size
+
+    Returns:
+        List[Dict[str, Any]]: The units, each with 'names', 'start' and 'text'
+    """
+    units = []
+    current = None
+    for name, start, text, tokens in definitions:
+        if current is None or current['tokens'] + tokens > max_tokens:
+            current = {'names': [], 'start': start, 'parts': [], 'tokens': 0}
+            units.append(current)
+        # Long definitions are split in several chunks of the same name
+        if name not in current['names']:
+            current['names'].append(name)
+        current['parts'].append(text)
+        current['tokens'] += tokens
+
+    return [{'names': unit['names'], 'start': unit['start'], 'text': '\n\n'.join(unit['parts'])} for unit in units]
+
+def unit_code_context(path: str, header: str, unit: Dict[str, Any]):
+    """
+    Build the code sent for one unit: the module header followed by the unit.
+
+    Args:
+        path (str): Path of the file
+        header (str): Imports and constants of the file
+        unit (Dict[str, Any]): The unit from split_units
+
+    Returns:
+        str: The code context
+    """
+    return f"# File: {path} (excerpt from line {unit['start']})\n{header}\n\n...\n\n{unit['text']}"
+
+def unit_prompt(user_prompt: str, unit: Dict[str, Any]):
+    return f"{user_prompt}. Only test {', '.join(unit['names'])}; the rest of the file is tested separately."
+
+def split_imports(path: str, code: str):
+    """
+    Separate the import statements of generated test code from the rest.
+
+    Args:
+        path (str): Path of the source file, used to pick the language
+        code (str): The generated test code
+
+    Returns:
+        tuple: The import statements and the remaining code
+    """
+    lines = code.splitlines()
+    imports = []
+    taken = set()
+
+    if path.endswith(('.py', '.pyi')):
+        try:
+            for node in ast.parse(code).body:
+                if isinstance(node, (ast.Import, ast.ImportFrom)):
+                    imports.append('\n'.join(lines[node.lineno - 1:node.end_lineno]))
+                    taken.update(range(node.lineno - 1, node.end_lineno))
+        except (SyntaxError, ValueError):
+            pass
+    else:
+        if path.endswith('.go'):
+            pattern = r'^package\s+\w+\s*$|^import\s*\([^)]*\)|^import\s+(?:[\w.]+\s+)?"[^"]+"'
+        elif path.endswith(('.java', '.kt')):
+            pattern = r'^package\s+[\w.]+\s*;?\s*$|^import\s+(?:static\s+)?[\w.*]+\s*;?\s*$'
+        else:
+            pattern = r'^import\s[^;]*?from\s+[\'"][^\'"]+[\'"]\s*;?|^import\s+[\'"][^\'"]+[\'"]\s*;?|^(?:const|let|var)\s+[\w{}\s,:]+=\s*require\([\'"][^\'"]+[\'"]\)\s*;?'
+        for match in re.finditer(pattern, code, re.MULTILINE):
+            first = code.count('\n', 0, match.start())
+            last = code.count('\n', 0, match.end())
+            imports.append(match.group(0))
+            taken.update(range(first, last + 1))
+
+    body = '\n'.join(line for number, line in enumerate(lines) if number not in taken).strip()
+    return imports, body
+
+def merge_go_imports(imports: List[str]):
+    """Merge Go import statements into a single import block."""
+    package = next((statement for statement in imports if statement.startswith('package')), None)
+    paths = []
+    for statement in imports:
+        if statement.startswith('import'):
+            # Drop the keyword first, it would otherwise read as the alias of a single-line import
+            specs = statement[len('import'):]
+            paths.extend(line.strip() for line in re.findall(r'(?:[\w.]+\s+)?"[^"]+"', specs))
+    block = "import (\n" + ''.join(f"\t{path}\n" for path in dict.fromkeys(paths)) + ")" if paths else ''
+    return [statement for statement in (package, block) if statement]
+
+def rename_names(body: str, renames: Dict[str, str]):
+    """Rename whole-word occurrences of names in a unit's code, so its definitions and their uses stay consistent."""
+    if not renames:
+        return body
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(name) for name in renames) + r')\b')
+    return pattern.sub(lambda match: renames[match.group(1)], body)
+
+def unique_name(name: str, taken: set):
+    number = 2
+    while f"{name}_{number}" in taken:
+        number += 1
+    return f"{name}_{number}"
+
+def rename_collisions(bodies: List[tuple], taken: set = None):
+    """
+    Rename the names a unit defines that an earlier unit already defined.
+
+    Args:
+        bodies (List[tuple]): (code, names defined by the code) of each unit, in order
+        taken (set): Names that are already in use, e.g. the merged class name
+
+    Returns:
+        List[str]: The code of each unit with colliding names renamed
+    """
+    taken = set(taken or ())
+    renamed = []
+    for body, names in bodies:
+        renames = {}
+        for name in dict.fromkeys(names):
+            if name in taken:
+                renames[name] = unique_name(name, taken | set(renames.values()))
+        renamed.append(rename_names(body, renames))
+        taken.update(names)
+        taken.update(renames.values())
+    return renamed
+
+def language_of(path: str):
+    if path.endswith(('.py', '.pyi')):
+        return 'python'
+    if path.endswith('.go'):
+        return 'go'
+    if path.endswith(('.java', '.kt')):
+        return 'jvm'
+    return 'js'
+
+def top_level_names(path: str, body: str):
+    """Get the names of the top-level definitions of a unit's test code."""
+    language = language_of(path)
+    names = DEFINITION_PATTERNS[language].findall(body)
+    if language == 'go':
+        names = [name for name in names if name not in GO_REPEATABLE_NAMES]
+    return names
+
+def class_members(body: str):
+    """Get the names of the fields and methods declared directly in a Java or Kotlin class body."""
+    names = []
+    depth = 0
+    for line in body.splitlines():
+        if depth == 0:
+            match = JVM_MEMBER_PATTERN.match(line)
+            if match:
+                names.append(match.group(1) or match.group(2))
+        # Braces inside string and character literals don't count
+        code = re.sub(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'', '', line)
+        depth = max(depth + code.count('{') - code.count('}'), 0)
+    return names
+
+def merge_jvm_classes(path: str, bodies: List[str]):
+    """
+    Merge the test classes of several Java or Kotlin units into one class.
+
+    The first unit's class declaration is kept and the other units' class
+    bodies are appended to it, with their class name replaced and colliding
+    fields and methods renamed. Units without a class can't be merged and are
+    left out.
+
+    Args:
+        path (str): Path of the source file
+        bodies (List[str]): Test code of each unit, without package and imports
+
+    Returns:
+        str: The merged test class
+    """
+    classes = []
+    for body in bodies:
+        match = JVM_CLASS_PATTERN.search(body)
+        end = body.rfind('}')
+        if not match or end < match.end():
+            print(f"Leaving out a unit of {path} without a test class")
+            continue
+        classes.append((body[:match.end()], match.group(1), body[match.end():end]))
+
+    if not classes:
+        return '\n\n\n'.join(bodies)
+
+    declaration, class_name, _ = classes[0]
+    members = []
+    for _, name, members_code in classes:
+        members_code = rename_names(members_code, {name: class_name}) if name != class_name else members_code
+        members.append((members_code.strip('\n'), [member for member in class_members(members_code) if member != class_name]))
+
+    return declaration + '\n' + '\n\n'.join(rename_collisions(members, {class_name})) + '\n}'
+
+def merge_unit_results(path: str, results: List[Dict[str, Any]]):
+    """
+    Merge the generated tests of a file's units into one test file.
+
+    Args:
+        path (str): Path of the source file
+        results (List[Dict[str, Any]]): ResponseFormatter arguments of each unit, in file order
+
+    Returns:
+        Dict[str, Any]: ResponseFormatter arguments with the combined code, metadata and packages
+    """
+    imports = []
+    bodies = []
+    for result in results:
+        unit_imports, body = split_imports(path, result['code'])
+        imports.extend(unit_imports)
+        if body:
+            bodies.append(body)
+
+    # Identical statements are kept once, in the order they first appear
+    imports = list(dict.fromkeys(statement.strip() for statement in imports))
+    if path.endswith('.go'):
+        imports = merge_go_imports(imports)
+
+    # Units often define the same test or helper names, which would shadow each other or not compile
+    if language_of(path) == 'jvm':
+        bodies = [merge_jvm_classes(path, bodies)]
+    else:
+        bodies = rename_collisions([(body, top_level_names(path, body)) for body in bodies])
+
+    code = '\n'.join(imports) + '\n\n\n' + '\n\n\n'.join(bodies) + '\n'
+    metadata = '\n\n'.join(dict.fromkeys(result['metadata'].strip() for result in results if result.get('metadata')))
+    packages = list(dict.fromkeys(package for result in results for package in result.get('packages', [])))
+
+    return {'metadata': metadata, 'code': code, 'packages': packages, 'file_path': path}